@@ -1,13 +1,9 @@
 import streamlit as st
-from PyPDF2 import PdfReader
-from document_qa import query_document
-import re
-import pandas as pd
-import os
-from study_planner import study_planner_ui
-from focus_timer import focus_timer
-from books import book_recommendation_ui
-from summarizer import document_summarizer_ui
+from text_cleaning import clean_text
+
+# Page modules and their heavy dependencies (langchain, FAISS, OpenAI, sklearn, PyPDF2)
+# are imported inside the branch of the page that needs them, so opening Home or the
+# Focus Timer never pays for them. Python caches them after the first import.
 
 # Streamlit app configuration - must be the first command
 st.set_page_config(page_title="Smart Study Planner", layout="wide")
@@ -24,22 +20,15 @@ options = ["Home",
            "Focus Timer", 
            "Book Recommender",
            "Document Summarizer"]
+# Tracing diagnostics stay out of the menu unless the page is opened with ?diagnostics=1
+if st.query_params.get("diagnostics") == "1":
+    options.append("Diagnostics")
 selected_option = st.sidebar.radio("Go to", options)
 st.session_state.selected_option = selected_option
 
 # Helper function to clean and format PDF text
 def clean_pdf_text(raw_text):
-    text = re.sub(r'\n+', '\n', raw_text)
-    lines = text.splitlines()
-    cleaned_lines = []
-    for line in lines:
-        if line.strip():
-            if cleaned_lines and not line.endswith(('.', '!', '?')):
-                cleaned_lines[-1] += " " + line.strip()
-            else:
-                cleaned_lines.append(line.strip())
-    formatted_text = "\n\n".join(cleaned_lines)
-    return formatted_text
+    return clean_text(raw_text)
 
 # Helper function to display the header image
 def display_header_image(page_name):
@@ -79,28 +68,47 @@ elif st.session_state.selected_option == "Document Q&A":
     uploaded_file = st.file_uploader("Upload a PDF", type="pdf")
 
     if uploaded_file:
-        reader = PdfReader(uploaded_file)
-        raw_text = ""
-        for page in reader.pages:
-            raw_text += page.extract_text()
-
-        # Clean and format extracted text
-        cleaned_text = clean_pdf_text(raw_text)
+        import pandas as pd
+        from document_qa import query_document_stream
+        from embedding_cache import content_hash
+        from llm_cache import get_response_cache
+        from pdf_extract import extract_clean_text_with_preview
+        from qa_history import get_history
+        from tracing import span
+
+        # Extract, clean and format the text page by page
+        cleaned_text = extract_clean_text_with_preview(uploaded_file)
         st.text_area("Document Content", cleaned_text, height=300)
 
         # User input for question
         user_query = st.text_input("Ask a Question about the document:")
+        retrieval_labels = {
+            "Embeddings": "dense",
+            "Keywords (BM25, fast, works offline)": "bm25",
+            "Keywords, then embeddings": "hybrid",
+        }
+        retrieval = st.radio("Find relevant passages with", list(retrieval_labels), horizontal=True)
 
         if user_query:
             try:
-                # Get answer using LangChain
-                with st.spinner("Processing your query..."):
-                    answer, relevant_text = query_document(cleaned_text, user_query)
-                
-                # Display the result
-                st.subheader("Answer:")
-                st.write(f"**Question:** {user_query}")
-                st.write(f"**Answer:** {answer}")
+                # One trace per question, covering retrieval and the streamed answer
+                with span("document_qa", retrieval=retrieval_labels[retrieval]):
+                    # Get answer using LangChain
+                    with st.spinner("Processing your query..."):
+                        answer, relevant_text, cached = query_document_stream(
+                            cleaned_text, user_query, retrieval_labels[retrieval]
+                        )
+
+                    # Display the result, streaming the answer as it arrives
+                    st.subheader("Answer:")
+                    st.write(f"**Question:** {user_query}")
+                    st.write("**Answer:**")
+                    st.write_stream(answer)
+                if cached:
+                    hit_rate = get_response_cache().stats()["namespaces"]["qa"]["hit_rate"]
+                    st.caption(f"⚡ Cached answer, returned in {answer.total_seconds * 1000:.0f} ms (Q&A cache hit rate {hit_rate:.0%})")
+                else:
+                    st.caption(f"First words after {answer.first_token_seconds:.2f} s, complete in {answer.total_seconds:.2f} s")
 
                 # Render relevant text with markdown to properly display bold keywords
                 st.subheader("Relevant Text from Document:")
@@ -109,28 +117,106 @@ elif st.session_state.selected_option == "Document Q&A":
             except Exception as e:
                 st.error(f"An error occurred while processing your query: {str(e)}")
         
-        # Display Q&A history from the CSV file
-        if os.path.exists('qa_log.csv'):
-            qa_df = pd.read_csv('qa_log.csv')
+        # Display Q&A history one page at a time, newest first
+        history = get_history()
+        only_this_document = st.checkbox("Only questions about this document")
+        document_hash = content_hash(cleaned_text) if only_this_document else None
+        total = history.count(document_hash)
+        if total:
             st.subheader("Q&A History")
+            page_size = 20
+            pages = (total + page_size - 1) // page_size
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1) - 1
+            rows = history.page(page, page_size, document_hash)
+            qa_df = pd.DataFrame({
+                "Asked": pd.to_datetime([row["asked_at"] for row in rows], unit="s").floor("s"),
+                "Question": [row["question"] for row in rows],
+                "Answer": [row["answer"] for row in rows],
+                "Relevant Text": [row["relevant_text"] for row in rows],
+            })
             st.dataframe(qa_df)
 
+        # Keep this document for questions across the whole course
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            course = st.text_input("Course", placeholder="e.g. Biology 101")
+        with col2:
+            st.write("")
+            if st.button("Add to the course library"):
+                from document_qa import add_to_corpus
+                try:
+                    with st.spinner("Indexing the document..."):
+                        add_to_corpus(cleaned_text, uploaded_file.name, {"course": course.strip() or "Uncategorized"})
+                    st.success(f"Added {uploaded_file.name} to the library.")
+                except Exception as e:
+                    st.error(f"An error occurred while indexing the document: {str(e)}")
+
+    # Questions across every document added to the library
+    st.subheader("📚 Course Library")
+    from document_qa import get_library, query_corpus_stream
+    from tracing import span
+
+    library = get_library()
+    documents = library.documents()
+    if not documents:
+        st.info("Add documents to the library to ask questions across all of them.")
+    else:
+        courses = st.multiselect("Courses", library.metadata_values("course"),
+                                 placeholder="All courses")
+        library_query = st.text_input(f"Ask a Question about the library ({len(documents)} documents):")
+        if library_query:
+            try:
+                with span("corpus_qa", courses=len(courses)):
+                    with st.spinner("Searching the library..."):
+                        answer, relevant_text, cached, hits = query_corpus_stream(
+                            library_query, {"course": courses} if courses else None
+                        )
+                    if not hits:
+                        st.warning("No documents in the selected courses.")
+                    else:
+                        st.write("**Answer:**")
+                        st.write_stream(answer)
+                if hits:
+                    st.caption("Sources: " + ", ".join(dict.fromkeys(hit["name"] for hit in hits)))
+                    st.markdown(relevant_text)
+            except Exception as e:
+                st.error(f"An error occurred while processing your query: {str(e)}")
+
+        with st.expander(f"Documents in the library ({len(documents)})"):
+            for document in documents:
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    st.write(f"**{document['name']}** · {document['metadata'].get('course', '')} · "
+                             f"{document['chunks']} passages")
+                with col2:
+                    st.button("Remove", key=f"remove_document_{document['id']}",
+                              on_click=library.remove, args=(document["id"],))
+
 elif st.session_state.selected_option == "Study Planner":
     display_header_image("Study Planner")
     st.title("📅 Study Planner")
+    from study_planner import study_planner_ui
     study_planner_ui()
 
 elif st.session_state.selected_option == "Focus Timer":
     display_header_image("Focus Timer")
     st.title("⏳ Focus Timer")
+    from focus_timer import focus_timer
     focus_timer()
 
 elif st.session_state.selected_option == "Book Recommender":
     display_header_image("Book Recommender")
     st.title("📚 Book Recommendation")
+    from books import book_recommendation_ui
     book_recommendation_ui()
     
 elif st.session_state.selected_option == "Document Summarizer":
     display_header_image("Document Summarizer")
     st.title("📄 Document Summarizer")
+    from summarizer import document_summarizer_ui
     document_summarizer_ui()
+
+elif st.session_state.selected_option == "Diagnostics":
+    st.title("🩺 Diagnostics")
+    from diagnostics import diagnostics_ui
+    diagnostics_ui()
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Documents whose summary and questions are sent to the LLM at the same time
+MAX_CONCURRENT_DOCUMENTS = 4
+
+# Checkpoint of a run, next to the per-document results in the output directory
+MANIFEST_NAME = "manifest.json"
+
+# Every document's result in one file, rewritten at the end of each run
+RESULTS_NAME = "results.jsonl"
+
+# PDFs under a directory, in a stable order
+def find_pdfs(input_dir):
+    found = []
+    for folder, _, names in os.walk(input_dir):
+        found += [os.path.join(folder, name) for name in names if name.lower().endswith(".pdf")]
+    return sorted(found)
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Extract and clean one PDF (runs in worker processes); returns (text, pages, seconds)
+def extract_document(path):
+    # The summarizer's extract_text_from_pdf and clean_text wrap these; importing them here keeps Streamlit out of the workers
+    from pdf_extract import iter_pages
+    from text_cleaning import clean_text
+    start = time.perf_counter()
+    pages = list(iter_pages(path, parallel=False))
+    return clean_text("".join(pages)), len(pages), time.perf_counter() - start
+
+# Answer one question about a document; returns (answer, relevant text, whether the answer was cached)
+def answer_question(text, question, retrieval):
+    from document_qa import query_document_stream
+    from tracing import span
+    with span("query_document", retrieval=retrieval):
+        answer, relevant_text, cached = query_document_stream(text, question, retrieval)
+        return "".join(answer).strip(), relevant_text, cached
+
+def write_json(path, payload):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(payload, file, indent=2)
+    os.replace(temp_path, path)
+
+def load_json(path, default):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return default
+
+class BatchRun:
+    """
+    One pass of the pipeline over a directory of PDFs. Each document's result
+    (summary, answers to the preset questions, timings) is saved as JSON in
+    output_dir/documents as soon as it is complete, and the manifest records
+    which documents are done, for which PDF content and settings. A run that
+    is interrupted or has failures picks up where it stopped: finished
+    documents are skipped, and a partly processed one keeps the steps it
+    already completed.
+    """
+
+    def __init__(self, input_dir, output_dir, questions=(), summary_length="Medium", retrieval="dense",
+                 concurrency=MAX_CONCURRENT_DOCUMENTS, workers=None):
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.questions = list(questions)
+        self.summary_length = summary_length
+        self.retrieval = retrieval
+        self.concurrency = concurrency
+        # A document is done for these settings; adding a question later only asks that question
+        self.settings = {"summary_length": summary_length, "retrieval": retrieval, "questions": self.questions}
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        os.makedirs(os.path.join(output_dir, "documents"), exist_ok=True)
+        self.manifest = load_json(self.manifest_path, {"documents": {}})
+
+    def result_path(self, name):
+        return os.path.join(self.output_dir, "documents", name.replace(os.sep, "__") + ".json")
+
+    def save_manifest(self):
+        self.manifest["updated_at"] = time.time()
+        write_json(self.manifest_path, self.manifest)
+
+    # The saved, possibly partial, result of a document made from the same PDF with the same summary settings
+    def previous_result(self, name, digest):
+        result = load_json(self.result_path(name), None)
+        if result and result.get("pdf_hash") == digest and result.get("summary_length") == self.summary_length \
+                and result.get("retrieval") == self.retrieval:
+            return result
+        return None
+
+    # The result of a document the manifest lists as done for this PDF content and these settings
+    def finished_result(self, name, digest):
+        entry = self.manifest["documents"].get(name)
+        if entry and entry["status"] == "done" and entry["pdf_hash"] == digest and entry.get("settings") == self.settings:
+            return load_json(self.result_path(name), None)
+        return None
+
+    # Summarize and answer the questions for one document, saving after every step
+    async def process(self, name, digest, extraction, limit):
+        from summarizer import summarize_with_gpt35
+
+        result = self.previous_result(name, digest) or {
+            "source": name, "pdf_hash": digest, "summary_length": self.summary_length,
+            "retrieval": self.retrieval, "summary": None, "answers": {}, "seconds": {},
+        }
+        # Answers to questions dropped since the last run are not part of this run's result
+        result["answers"] = {question: answer for question, answer in result["answers"].items()
+                             if question in self.questions}
+        entry = self.manifest["documents"].setdefault(name, {})
+        entry.update({"pdf_hash": digest, "status": "running", "result": os.path.relpath(
+            self.result_path(name), self.output_dir)})
+        try:
+            text, pages, seconds = await extraction
+            result.update({"pages": pages, "characters": len(text)})
+            result["seconds"]["extract"] = round(seconds, 3)
+            async with limit:
+                if result["summary"] is None:
+                    start = time.perf_counter()
+                    result["summary"] = await asyncio.to_thread(summarize_with_gpt35, text, self.summary_length)
+                    result["seconds"]["summary"] = round(time.perf_counter() - start, 3)
+                    write_json(self.result_path(name), result)
+                for question in self.questions:
+                    if question in result["answers"]:
+                        continue
+                    start = time.perf_counter()
+                    answer, relevant_text, cached = await asyncio.to_thread(
+                        answer_question, text, question, self.retrieval)
+                    result["answers"][question] = {"answer": answer, "relevant_text": relevant_text, "cached": cached,
+                                                   "seconds": round(time.perf_counter() - start, 3)}
+                    write_json(self.result_path(name), result)
+            entry.update({"status": "done", "error": None, "settings": self.settings, "finished_at": time.time()})
+        except Exception as error:
+            entry.update({"status": "failed", "error": f"{type(error).__name__}: {error}"})
+        self.save_manifest()
+        return result if entry["status"] == "done" else None
+
+    async def run_async(self, progress=None):
+        pending, skipped = [], []
+        for path in find_pdfs(self.input_dir):
+            name = os.path.relpath(path, self.input_dir)
+            digest = file_hash(path)
+            previous = self.finished_result(name, digest)
+            if previous is not None:
+                skipped.append(previous)
+            else:
+                pending.append((name, path, digest))
+
+        loop = asyncio.get_running_loop()
+        limit = asyncio.Semaphore(self.concurrency)
+        finished, completed = [], 0
+        if pending:
+            # Spawned like the PDF extraction pool, so workers never inherit the parent's threads
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending)),
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                # Every PDF is queued for extraction at once; LLM work on a document starts as soon as its text is ready
+                tasks = [asyncio.create_task(self.process(
+                    name, digest, loop.run_in_executor(executor, extract_document, path), limit))
+                    for name, path, digest in pending]
+                for task in asyncio.as_completed(tasks):
+                    result = await task
+                    completed += 1
+                    if result is not None:
+                        finished.append(result)
+                    if progress is not None:
+                        progress(completed, len(pending))
+
+        results = sorted(skipped + finished, key=lambda result: result["source"])
+        with open(os.path.join(self.output_dir, RESULTS_NAME), "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(result) + "\n" for result in results)
+        documents = self.manifest["documents"]
+        failures = {name: documents[name]["error"] for name, _, _ in pending if documents[name]["status"] == "failed"}
+        return {"processed": len(finished), "skipped": len(skipped), "failed": failures,
+                "results": os.path.join(self.output_dir, RESULTS_NAME)}
+
+# Summarize every PDF under input_dir and answer the questions about each; returns the run's counts
+def run_batch(input_dir, output_dir, questions=(), summary_length="Medium", retrieval="dense",
+              concurrency=MAX_CONCURRENT_DOCUMENTS, workers=None, progress=None):
+    run = BatchRun(input_dir, output_dir, questions, summary_length, retrieval, concurrency, workers)
+    return asyncio.run(run.run_async(progress))
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a directory of PDFs and answer preset questions "
+                                                 "about each, without the Streamlit UI. Re-running resumes.")
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--question", "-q", action="append", default=[], help="ask this about every document")
+    parser.add_argument("--questions-file", help="one question per line")
+    parser.add_argument("--summary-length", choices=["Short", "Medium", "Long"], default="Medium")
+    parser.add_argument("--retrieval", choices=["dense", "bm25", "hybrid"], default="dense")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_DOCUMENTS,
+                        help="documents sent to the LLM at the same time")
+    parser.add_argument("--workers", type=int, help="PDF extraction processes (default: CPUs - 1)")
+    parser.add_argument("--mock", action="store_true", help="use the local mock LLM and embeddings (no API key)")
+    args = parser.parse_args()
+
+    questions = list(args.question)
+    if args.questions_file:
+        with open(args.questions_file, encoding="utf-8") as file:
+            questions += [line.strip() for line in file if line.strip()]
+    if args.mock:
+        os.environ["LLM_PROVIDER"] = "mock"
+        os.environ["EMBEDDINGS_PROVIDER"] = "local"
+
+    summary = run_batch(args.input_dir, args.output_dir, questions, args.summary_length, args.retrieval,
+                        args.concurrency, args.workers,
+                        progress=lambda done, total: print(f"{done}/{total} documents", file=sys.stderr))
+    print(json.dumps(summary, indent=2))
+    sys.exit(1 if summary["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
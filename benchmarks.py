@@ -0,0 +1,845 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+# Where generated inputs are written
+BENCH_DIR = "bench_data"
+
+# Resident set size of the current process in MB
+def resident_memory_mb():
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Write a synthetic catalog shaped like cleaned_books.csv
+def make_catalog(rows, path, seed=0):
+    rng = np.random.default_rng(seed)
+    authors = np.array([f"Author {i}" for i in range(max(rows // 20, 1))], dtype=object)
+    publishers = np.array([f"Publisher {i}" for i in range(max(rows // 200, 1))], dtype=object)
+    languages = np.array(["eng", "en-US", "spa", "fre", "ger", "jpn"], dtype=object)
+    books = pd.DataFrame({
+        "bookID": np.arange(1, rows + 1),
+        "title": [f"Synthetic Book {i}" for i in range(rows)],
+        "authors": authors[rng.integers(len(authors), size=rows)],
+        "average_rating": rng.uniform(1, 5, size=rows).round(2),
+        "isbn": [f"{i:010d}" for i in range(rows)],
+        "isbn13": 9780000000000 + np.arange(rows),
+        "language_code": languages[rng.integers(len(languages), size=rows)],
+        "ratings_count": rng.integers(0, 100000, size=rows),
+        "text_reviews_count": rng.integers(0, 5000, size=rows),
+        "publication_date": "1/1/2000",
+        "publisher": publishers[rng.integers(len(publishers), size=rows)],
+    })
+    books.to_csv(path, index=False)
+    return path
+
+# Time one way of loading a catalog inside this process
+def measure_load(method, csv_path):
+    before = resident_memory_mb()
+    start = time.perf_counter()
+    if method == "read_csv":
+        books = pd.read_csv(csv_path)
+    else:
+        from book_store import load_books
+        books = load_books(csv_path, store_dir=os.path.join(BENCH_DIR, "store"))
+    elapsed = time.perf_counter() - start
+    return {"method": method, "rows": len(books), "seconds": round(elapsed, 4),
+            "rss_delta_mb": round(resident_memory_mb() - before, 1)}
+
+# Run measure_load in a fresh interpreter so caches and memory start cold
+def measure_load_isolated(method, csv_path):
+    output = subprocess.run(
+        [sys.executable, __file__, "measure-load", method, csv_path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+# Compare pd.read_csv against the converted store: first load converts, second memory-maps
+def bench_load_data(rows_list=(11123, 5_000_000)):
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    results = []
+    for rows in rows_list:
+        csv_path = make_catalog(rows, os.path.join(BENCH_DIR, f"catalog_{rows}.csv"))
+        store = os.path.join(BENCH_DIR, "store")
+        for name in os.listdir(store) if os.path.isdir(store) else []:
+            os.remove(os.path.join(store, name))
+        for label, method in (("read_csv", "read_csv"), ("store_convert", "store"), ("store_mmap", "store")):
+            result = measure_load_isolated(method, csv_path)
+            result["method"] = label
+            results.append(result)
+    return results
+
+# Embedding throughput against the local provider with simulated request latency
+def bench_embeddings(chunks=2000, latency=0.05, concurrency_levels=(1, 4, 8)):
+    import tempfile
+    from embedding_cache import CachedEmbeddings, EmbeddingStore, LocalEmbeddings
+
+    # Every fifth chunk repeats an earlier one, like boilerplate pages and overlaps
+    ids = [i if i % 5 else i // 5 for i in range(chunks)]
+    texts = [f"chunk {j} about topic {j % 37} and section {j % 11}" for j in ids]
+    results = []
+    for concurrency in concurrency_levels:
+        with tempfile.TemporaryDirectory() as tmp:
+            embeddings = CachedEmbeddings(
+                LocalEmbeddings(latency=latency), EmbeddingStore(os.path.join(tmp, "e.sqlite")),
+                namespace="bench", max_concurrency=concurrency,
+            )
+            start = time.perf_counter()
+            embeddings.embed_documents(texts)
+            elapsed = time.perf_counter() - start
+        results.append({"concurrency": concurrency, "chunks": chunks, "unique": len(set(texts)),
+                        "seconds": round(elapsed, 3), "chunks_per_second": round(chunks / elapsed, 1)})
+    return results
+
+# The original quadratic clean_pdf_text / clean_text, kept as the reference output
+def legacy_clean_text(raw_text):
+    text = re.sub(r'\n+', '\n', raw_text)
+    lines = text.splitlines()
+    cleaned_lines = []
+    for line in lines:
+        if line.strip():
+            if cleaned_lines and not line.endswith(('.', '!', '?')):
+                cleaned_lines[-1] += " " + line.strip()
+            else:
+                cleaned_lines.append(line.strip())
+    return "\n\n".join(cleaned_lines)
+
+# Synthetic extracted PDF text: prose with sentence endings, or table/OCR rows without any
+def make_pdf_text(megabytes, kind="prose", seed=0, vocabulary=0):
+    rng = np.random.default_rng(seed)
+    words = ["cell", "energy", "process", "system", "value", "table", "result", "data", "model", "page"]
+    words += [f"term{i}" for i in range(vocabulary)]
+    lines, size = [], 0
+    while size < megabytes * 2**20:
+        line = " ".join(rng.choice(words, size=rng.integers(4, 14)))
+        if kind == "prose" and rng.random() < 0.3:
+            line += "."
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+# Compare the streaming cleaner with the original implementation on multi-megabyte inputs
+def bench_clean_text(sizes_mb=(1, 2, 4), kinds=("prose", "table")):
+    from text_cleaning import clean_text
+    results = []
+    for kind in kinds:
+        for megabytes in sizes_mb:
+            raw_text = make_pdf_text(megabytes, kind)
+            start = time.perf_counter()
+            expected = legacy_clean_text(raw_text)
+            legacy_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            cleaned = clean_text(raw_text)
+            seconds = time.perf_counter() - start
+            results.append({"kind": kind, "megabytes": megabytes, "legacy_seconds": round(legacy_seconds, 3),
+                            "seconds": round(seconds, 3), "identical": cleaned == expected})
+    return results
+
+# The original single-keyword extract_relevant_text, kept as the reference for timing
+def legacy_extract_relevant_text(document_text, user_query):
+    keyword = re.escape(user_query.lower())
+    sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s', document_text)
+    relevant_sentences = [sentence for sentence in sentences if re.search(r'\b' + keyword + r'\b', sentence.lower())]
+    highlighted_sentences = [
+        re.sub(r'\b' + keyword + r'\b', lambda match: f"**{match.group(0)}**", sentence, flags=re.IGNORECASE)
+        for sentence in relevant_sentences
+    ]
+    return " ".join(highlighted_sentences)
+
+# Highlighting over large retrieved contexts, one query after another on the same document
+def bench_extract_relevant_text(sizes_mb=(1, 4), queries=("What does term17 say about term256?",
+                                                         "How is term1024 related to the term9 value", "term4096")):
+    from text_highlight import highlight_relevant_text, sentence_index
+    results = []
+    for megabytes in sizes_mb:
+        context = make_pdf_text(megabytes, "prose", vocabulary=5000).replace("\n", " ")
+        sentence_index.cache_clear()
+        start = time.perf_counter()
+        for query in queries:
+            legacy_extract_relevant_text(context, query)
+        legacy_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        found = [len(highlight_relevant_text(context, query)) for query in queries]
+        seconds = time.perf_counter() - start
+        results.append({"megabytes": megabytes, "queries": len(queries), "legacy_seconds": round(legacy_seconds, 3),
+                        "seconds": round(seconds, 3), "highlighted_chars": found})
+    return results
+
+# Time to first token and total time, blocking vs streaming, against the local stand-in API server
+def bench_streaming(runs=5, words=200, first_token_delay=0.3, token_delay=0.01):
+    from llm_client import OpenAIChat, TimedStream
+    from mock_llm_server import serve
+
+    server, api_base = serve(first_token_delay=first_token_delay, token_delay=token_delay)
+    llm = OpenAIChat(api_key="local", api_base=api_base)
+    messages = [{"role": "user", "content": "Answer:\n\n" + " ".join(f"word{i}" for i in range(words))}]
+    max_tokens = int(words / 0.75) + 1
+    blocking, first_tokens, streamed = [], [], []
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            llm.complete(messages, max_tokens=max_tokens)
+            blocking.append(time.perf_counter() - start)
+            stream = TimedStream(llm.stream(messages, max_tokens=max_tokens))
+            for _ in stream:
+                pass
+            first_tokens.append(stream.first_token_seconds)
+            streamed.append(stream.total_seconds)
+    finally:
+        server.shutdown()
+    return {"runs": runs, "words": words,
+            "blocking_first_token_p50": round(float(np.median(blocking)), 3),
+            "streaming_first_token_p50": round(float(np.median(first_tokens)), 3),
+            "blocking_total_p50": round(float(np.median(blocking)), 3),
+            "streaming_total_p50": round(float(np.median(streamed)), 3)}
+
+# Synthetic document with one fact line per question, scattered among filler lines
+def make_qa_document(facts=200, filler_lines=4000, seed=0):
+    rng = np.random.default_rng(seed)
+    adjectives = ["average", "maximum", "minimum", "typical", "measured", "expected", "nominal", "peak"]
+    nouns = ["temperature", "pressure", "velocity", "density", "voltage", "frequency", "yield", "mass"]
+    filler = make_pdf_text(filler_lines * 60 / 2**20, "prose", seed=seed, vocabulary=2000).splitlines()
+    lines, questions = list(filler), []
+    for i in range(facts):
+        adjective, noun = adjectives[i % len(adjectives)], nouns[(i // len(adjectives)) % len(nouns)]
+        topic = f"specimen{i}"
+        lines.insert(int(rng.integers(len(lines) + 1)), f"The {adjective} {noun} of {topic} is {rng.integers(1000)} units.")
+        questions.append((f"What is the {adjective} {noun} of {topic}?", f"of {topic} is"))
+    return "\n".join(lines), questions
+
+# Retrieval latency and quality of BM25, hybrid and FAISS on questions with a known answer chunk
+def bench_retrieval(facts=200, filler_lines=4000):
+    """
+    The dense path uses the offline LocalEmbeddings unless EMBEDDINGS_PROVIDER
+    says otherwise. recall_at_3 counts questions whose fact line is in a
+    retrieved chunk; overlap_with_dense is the mean share of top-3 chunks a
+    mode has in common with the FAISS path.
+    """
+    import tempfile
+    os.environ.setdefault("EMBEDDINGS_PROVIDER", "local")
+    import document_qa
+
+    document, questions = make_qa_document(facts, filler_lines)
+    results, dense_top = [], None
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            for mode in ("dense", "bm25", "hybrid"):
+                timings, hits, retrieved = [], 0, []
+                for question, answer in questions:
+                    start = time.perf_counter()
+                    chunks = document_qa.retrieve_chunks(document, question, mode, k=3)
+                    timings.append(time.perf_counter() - start)
+                    hits += any(answer in chunk for chunk in chunks)
+                    retrieved.append(chunks)
+                if mode == "dense":
+                    dense_top = retrieved
+                overlap = np.mean([len(set(a) & set(b)) / 3 for a, b in zip(retrieved, dense_top)])
+                results.append({"mode": mode, "questions": len(questions),
+                                "first_query_ms": round(timings[0] * 1000, 1),
+                                "query_p50_ms": round(float(np.median(timings[1:])) * 1000, 2),
+                                "recall_at_3": round(hits / len(questions), 3),
+                                "overlap_with_dense": round(float(overlap), 3)})
+        finally:
+            os.chdir(cwd)
+    return results
+
+# Hundreds of concurrent focus timers: the old sleeping loop against deadline-based refreshes
+def bench_focus_timer(sessions=500, seconds=5):
+    """
+    legacy runs one thread per session that sleeps a second and decrements a
+    counter, like the old while loop did in the script thread; drift is how far
+    the counter fell behind the clock. engine evaluates every session's status
+    once a second, as the one-second fragment reruns do, from a single thread,
+    and saves and reloads every timer through the store as a reconnect would.
+    """
+    import tempfile
+    import threading
+    import timer_engine
+
+    results = []
+    counters, stop = [seconds * 10] * sessions, threading.Event()
+
+    def legacy_session(i):
+        while not stop.is_set() and counters[i] > 0:
+            time.sleep(1)
+            sum(range(2000))  # Rendering work done on every tick
+            counters[i] -= 1
+
+    threads = [threading.Thread(target=legacy_session, args=(i,), daemon=True) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    peak_threads = threading.active_count()
+    time.sleep(seconds)
+    wall, snapshot = time.perf_counter() - start, list(counters)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    # Seconds of real time the displayed countdown is behind by
+    drift = [wall - (seconds * 10 - counter) for counter in snapshot]
+    results.append({"engine": "legacy", "sessions": sessions, "threads_held": peak_threads - 1,
+                    "max_drift_s": round(max(drift), 3), "mean_drift_s": round(float(np.mean(drift)), 3)})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = timer_engine.TimerStore(os.path.join(tmp, "timers.sqlite"))
+        now = time.time()
+        timers = [timer_engine.start(timer_engine.new_timer(25, 5, 15, 3), now - i) for i in range(sessions)]
+        tick_seconds, mismatches = [], 0
+        for tick in range(seconds):
+            tick_start = time.perf_counter()
+            for i, timer in enumerate(timers):
+                status = timer_engine.timer_status(timer, now + tick)
+                if abs(status["remaining"] - (25 * 60 - i - tick)) > 1e-6 and i + tick < 25 * 60:
+                    mismatches += 1
+            tick_seconds.append(time.perf_counter() - tick_start)
+        start = time.perf_counter()
+        for i, timer in enumerate(timers):
+            store.save(str(i), timer_engine.pause(timer, now + seconds))
+        restored = sum(store.load(str(i)) == timer for i, timer in enumerate(timers))
+        store_seconds = time.perf_counter() - start
+    results.append({"engine": "deadline", "sessions": sessions, "threads_held": 0,
+                    "tick_cpu_ms_p50": round(float(np.median(tick_seconds)) * 1000, 3),
+                    "per_session_us": round(float(np.median(tick_seconds)) / sessions * 1e6, 2),
+                    "status_mismatches": mismatches, "restored": restored,
+                    "save_and_reload_ms_per_session": round(store_seconds / sessions * 1000, 3)})
+    return results
+
+# Random study tasks shaped like the planner's form input
+def make_tasks(count, seed=0):
+    from datetime import date, timedelta
+    rng = np.random.default_rng(seed)
+    categories, priorities = ["Reading", "Coding", "Assignments", "Other"], ["High", "Medium", "Low"]
+    statuses = ["Pending", "In Progress", "Completed"]
+    today = date.today()
+    return [{
+        "Task Name": f"Task {i % (count // 3 + 1)}",  # Names repeat, as they may in real use
+        "Description": "",
+        "Category": categories[rng.integers(4)],
+        "Priority": priorities[rng.integers(3)],
+        "Due Date": today + timedelta(days=int(rng.integers(365))),
+        "Estimated Time (hours)": round(float(rng.uniform(0, 5)), 2),
+        "Status": statuses[rng.integers(3)],
+    } for i in range(count)]
+
+# Planner work per rerun with many tasks: session list + DataFrame rebuilds against the indexed store
+def bench_task_store(count=50_000, reruns=20):
+    import tempfile
+    from task_store import TaskStore
+
+    tasks = make_tasks(count)
+    results = []
+
+    # Old page: DataFrame rebuilt from the list and filtered by masks on every rerun, updates by name scan
+    legacy = [dict(task) for task in tasks]
+    timings = []
+    for rerun in range(reruns):
+        start = time.perf_counter()
+        tasks_df = pd.DataFrame(legacy)
+        filtered = tasks_df[(tasks_df["Status"] == "Pending") & (tasks_df["Priority"] == "High")]
+        completed = sum(task["Status"] == "Completed" for task in legacy)
+        for task in legacy:
+            if task["Task Name"] == f"Task {rerun}":
+                task["Status"] = "Completed"
+                break
+        timings.append(time.perf_counter() - start)
+    results.append({"store": "session_list", "tasks": count, "rerun_ms_p50": round(float(np.median(timings)) * 1000, 2),
+                    "filtered": len(filtered), "completed": completed})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tasks.sqlite")
+        start = time.perf_counter()
+        store = TaskStore(path)
+        store.add_many(tasks)
+        add_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        store = TaskStore(path)
+        store.frame()
+        load_seconds = time.perf_counter() - start
+        timings = []
+        for rerun in range(reruns):
+            start = time.perf_counter()
+            frame = store.frame()
+            ids = store.ids_where({"Status": "Pending", "Priority": "High"})
+            filtered = frame.loc[ids]
+            completed = store.count("Status", "Completed")
+            store.update_status(rerun + 1, "Completed")
+            timings.append(time.perf_counter() - start)
+    results.append({"store": "task_store", "tasks": count, "rerun_ms_p50": round(float(np.median(timings)) * 1000, 2),
+                    "filtered": len(filtered), "completed": completed,
+                    "bulk_add_s": round(add_seconds, 2), "reload_s": round(load_seconds, 2)})
+    return results
+
+# Planning a semester of tasks from scratch, and re-planning after one task changes
+def bench_scheduler(count=10_000, daily_hours=8.0, updates=200):
+    from datetime import date, timedelta
+    from study_scheduler import StudyScheduler
+
+    tasks = make_tasks(count)
+    for task_id, task in enumerate(tasks, start=1):
+        task["id"] = task_id
+        task["Due Date"] = date.today() + timedelta(days=(task_id * 7919) % 120)  # One semester
+    start = time.perf_counter()
+    scheduler = StudyScheduler(daily_hours).build(tasks)
+    sessions = scheduler.sessions()
+    late = scheduler.late_tasks()
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    update_seconds, rebuild_seconds = [], []
+    for _ in range(updates):
+        task = tasks[rng.integers(count)]
+        task["Estimated Time (hours)"] = round(float(rng.uniform(0, 5)), 2)
+        start = time.perf_counter()
+        scheduler.upsert(task)
+        scheduler.late_tasks()
+        update_seconds.append(time.perf_counter() - start)
+    for _ in range(5):
+        start = time.perf_counter()
+        StudyScheduler(daily_hours).build(tasks).late_tasks()
+        rebuild_seconds.append(time.perf_counter() - start)
+    return {"tasks": count, "daily_hours": daily_hours, "sessions": len(sessions), "late": len(late),
+            "build_and_plan_ms": round(build_seconds * 1000, 1),
+            "update_ms_p50": round(float(np.median(update_seconds)) * 1000, 3),
+            "rebuild_ms_p50": round(float(np.median(rebuild_seconds)) * 1000, 1)}
+
+# Calendar payload per rerun: every task as an event against the visible month plus the prefetch margin
+def bench_calendar(counts=(1_000, 10_000, 100_000), reruns=20, recurring_share=0.002):
+    import tempfile
+    from datetime import date, timedelta
+    from task_store import TaskStore
+
+    results = []
+    for count in counts:
+        tasks = make_tasks(count)
+        for i, task in enumerate(tasks):
+            task["Recurrence"] = ("Daily", "Weekly", "Monthly")[i % 3] if i < count * recurring_share else "None"
+        with tempfile.TemporaryDirectory() as tmp:
+            store = TaskStore(os.path.join(tmp, "tasks.sqlite"))
+            store.add_many(tasks)
+            all_tasks = store.query()
+            full_timings, window_timings = [], []
+            for rerun in range(reruns):
+                start = time.perf_counter()
+                full = json.dumps([{"date": task["Due Date"].isoformat(), "title": task["Task Name"]} for task in all_tasks])
+                full_timings.append(time.perf_counter() - start)
+                # A month view (six weeks) plus the planner's 14-day prefetch margin on each side
+                first = date.today() + timedelta(days=31 * (rerun % 12) - 21)
+                start = time.perf_counter()
+                window = json.dumps([{"date": day.isoformat(), "title": task["Task Name"]}
+                                     for day, task in store.tasks_between(first, first + timedelta(days=70))])
+                window_timings.append(time.perf_counter() - start)
+        results.append({"tasks": count, "full_events_ms_p50": round(float(np.median(full_timings)) * 1000, 2),
+                        "full_payload_kb": round(len(full) / 1024, 1),
+                        "window_events_ms_p50": round(float(np.median(window_timings)) * 1000, 2),
+                        "window_payload_kb": round(len(window) / 1024, 1)})
+    return results
+
+# Corpus query latency and recall as documents are added one at a time, against an exact scan of every chunk
+def bench_corpus(sizes=(1, 10, 100, 1000), questions=50, facts=10, filler_lines=200):
+    import tempfile
+    from corpus_index import CorpusIndex, normalize_rows
+    from embedding_cache import LocalEmbeddings
+    from document_qa import split_document
+
+    embeddings = LocalEmbeddings()
+    rng = np.random.default_rng(0)
+    results, asked, matrix, all_texts = [], [], [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = CorpusIndex(os.path.join(tmp, "corpus"))
+        add_timings = []
+        for number in range(max(sizes)):
+            # Each document gets its own subjects, and shares its vocabulary with the other lectures of its course
+            document, facts_asked = make_qa_document(facts, filler_lines, seed=number)
+            document = document.replace("specimen", f"lecture{number}specimen").replace("term", f"course{number % 25}term")
+            # Questions quote a line of the document, so they carry its course's vocabulary
+            lines = document.splitlines()
+            for question, _ in facts_asked:
+                line = lines[int(rng.integers(len(lines)))]
+                asked.append((f"{question.replace('specimen', f'lecture{number}specimen')} {line}", line))
+            texts = split_document(document)
+            vectors = embeddings.embed_documents(list(texts))
+            matrix.append(normalize_rows(vectors))
+            all_texts += texts
+            start = time.perf_counter()
+            corpus.add(f"document-{number}", f"lecture{number}.pdf", texts, vectors, {"course": f"course{number % 10}"})
+            add_timings.append(time.perf_counter() - start)
+            if number + 1 not in sizes:
+                continue
+            sample = [asked[i] for i in rng.choice(len(asked), min(questions, len(asked)), replace=False)]
+            vectors = [normalize_rows(np.array([embeddings.embed_query(question)]))[0] for question, _ in sample]
+            everything = np.vstack(matrix)
+            row = {"documents": number + 1, "chunks": len(everything),
+                   "main_chunks": corpus.main.ntotal if corpus.main is not None else 0, "delta_chunks": corpus.delta.ntotal}
+            timings, exact_timings, hits, exact_hits, agreement = [], [], 0, 0, 0
+            for vector, (_, line) in zip(vectors, sample):
+                start = time.perf_counter()
+                found = corpus.search(vector, 3)
+                timings.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                exact = [all_texts[i] for i in np.argsort(-(everything @ vector), kind="stable")[:3]]
+                exact_timings.append(time.perf_counter() - start)
+                # Questions whose quoted line is in a returned chunk, and overlap with the exact top 3
+                hits += any(line in hit["text"] for hit in found)
+                exact_hits += any(line in text for text in exact)
+                agreement += len({hit["text"] for hit in found} & set(exact)) / 3
+            row["query_ms_p50"] = round(float(np.median(timings)) * 1000, 2)
+            row["query_ms_p99"] = round(float(np.percentile(timings, 99)) * 1000, 2)
+            row["exact_scan_ms_p50"] = round(float(np.median(exact_timings)) * 1000, 2)
+            row["recall_at_3"] = round(hits / len(sample), 3)
+            row["exact_recall_at_3"] = round(exact_hits / len(sample), 3)
+            row["overlap_with_exact"] = round(agreement / len(sample), 3)
+            start = time.perf_counter()
+            corpus.search(vectors[0], 3, filters={"course": "course1"})
+            row["filtered_query_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            row["add_ms_p50"] = round(float(np.median(add_timings)) * 1000, 2)
+            # The slowest add is the one that merged the delta into a new main segment
+            row["add_ms_max"] = round(max(add_timings) * 1000, 2)
+            # Opening maps the main segment and only reads the delta's shards
+            before = resident_memory_mb()
+            start = time.perf_counter()
+            reopened = CorpusIndex(os.path.join(tmp, "corpus"))
+            row["reopen_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            row["reopen_rss_mb"] = round(resident_memory_mb() - before, 1)
+            del reopened
+            results.append(row)
+        start = time.perf_counter()
+        corpus.remove(1)
+        results[-1]["remove_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return results
+
+# Where suite results are written, one JSON file per run
+RESULTS_DIR = "bench_results"
+
+# Saved suite results that later runs are compared against
+BASELINE_PATH = "bench_baseline.json"
+
+# A case regresses when its p50 latency or peak memory grows by more than this share over the baseline
+REGRESSION_THRESHOLD = 0.25
+
+# Input sizes per suite scale: "quick" for every change, "full" for the sizes the app must cope with
+SUITE_SCALES = {
+    "quick": {"books": [10_000], "pdf_pages": [10, 100], "text_mb": [1], "summary_mb": 0.25, "repeats": 20},
+    "full": {"books": [10_000, 1_000_000], "pdf_pages": [10, 100, 1000], "text_mb": [1, 8], "summary_mb": 2,
+             "repeats": 50},
+}
+
+# A text-only PDF built by hand, one object per page and content stream, so no PDF writer is needed
+def make_pdf(pages, lines_per_page=45, seed=0):
+    rng = np.random.default_rng(seed)
+    words = ["cell", "energy", "process", "system", "value", "table", "result", "data", "model", "page"]
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(words, size=rng.integers(6, 14))) + ("." if rng.random() < 0.3 else "")
+                 for _ in range(lines_per_page)]
+        stream = "BT /F1 10 Tf 12 TL 50 800 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+        objects.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                        f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>").encode())
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+    pdf, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+# Latency percentiles, throughput and peak memory of repeated calls to fn
+def measure(case, fn, repeats, units=1, unit="calls", setup=None):
+    """
+    setup runs untimed before every call, including one warm-up call that is
+    not counted. Peak memory comes from one further call under tracemalloc,
+    kept apart from the timed calls because tracing slows allocation-heavy
+    code; it covers Python and NumPy allocations in this process only.
+    """
+    import tracemalloc
+
+    def call():
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    call()
+    timings = np.array([call() for _ in range(repeats)])
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    p50 = float(np.percentile(timings, 50))
+    return {"case": case, "repeats": repeats, "p50_ms": round(p50 * 1000, 3),
+            "p99_ms": round(float(np.percentile(timings, 99)) * 1000, 3),
+            "throughput": round(units / p50, 2) if p50 else None, "unit": f"{unit}/s",
+            "peak_mb": round(peak / 2**20, 2)}
+
+def suite_books(rows, repeats):
+    import book_store
+    from books import recommend_books
+
+    csv_path = f"catalog_{rows}.csv"
+    if not os.path.exists(csv_path):
+        make_catalog(rows, csv_path)
+
+    def drop_store():
+        book_store._loaded.clear()
+        for name in os.listdir(book_store.STORE_DIR) if os.path.isdir(book_store.STORE_DIR) else []:
+            os.remove(os.path.join(book_store.STORE_DIR, name))
+
+    results = [
+        measure(f"load_data.convert[{rows}]", lambda: book_store.load_books(csv_path), min(repeats, 5),
+                units=rows, unit="rows", setup=drop_store),
+        measure(f"load_data.store[{rows}]", lambda: book_store.load_books(csv_path), repeats,
+                units=rows, unit="rows", setup=book_store._loaded.clear),
+    ]
+    books_df = book_store.load_books(csv_path)
+    titles = iter(books_df["title"].sample(3 * repeats + 3, replace=True, random_state=0).tolist())
+    results.append(measure(f"recommend_books.exact[{rows}]", lambda: recommend_books(next(titles), books_df), repeats))
+    results.append(measure(f"recommend_books.approximate[{rows}]",
+                           lambda: recommend_books(next(titles), books_df, approximate=True), repeats))
+    return results
+
+def suite_pdf(pages, repeats):
+    import pdf_extract
+
+    data = make_pdf(pages)
+    cache_dir = "pdf_cache"
+
+    def drop_cache():
+        pdf_extract._memory_cache.clear()
+        for name in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+            os.remove(os.path.join(cache_dir, name))
+
+    # In-process extraction, so its time and memory are measured here rather than in pool workers
+    repeats = max(3, repeats // max(1, pages // 10))
+    results = [measure(f"pdf_extract[{pages}p]", lambda: "".join(pdf_extract.iter_pages(data, False, cache_dir)),
+                       repeats, units=pages, unit="pages", setup=drop_cache)]
+    if pages >= pdf_extract.PARALLEL_MIN_PAGES:
+        # The same PDF on the process pool (started by the warm-up call); peak_mb leaves out the workers
+        parallel = measure(f"pdf_extract.parallel[{pages}p]",
+                           lambda: "".join(pdf_extract.iter_pages(data, True, cache_dir)),
+                           repeats, units=pages, unit="pages", setup=drop_cache)
+        cpus = os.cpu_count() or 1
+        # With one CPU iter_pages extracts serially anyway
+        parallel["workers"] = max(1, cpus - 1) if cpus >= 2 else 0
+        parallel["speedup_vs_serial"] = round(results[0]["p50_ms"] / parallel["p50_ms"], 2)
+        results.append(parallel)
+    return results
+
+def suite_text(megabytes, repeats):
+    from text_cleaning import clean_text
+    from text_highlight import sentence_index
+    from document_qa import extract_relevant_text, split_document
+
+    raw_text = make_pdf_text(megabytes, "prose")
+    context = make_pdf_text(megabytes, "prose", vocabulary=5000).replace("\n", " ")
+    queries = iter(f"What does term{i} say about term{i * 7 % 5000}?" for i in range(3 * repeats + 3))
+    return [
+        measure(f"clean_text[{megabytes}MB]", lambda: clean_text(raw_text), repeats, units=megabytes, unit="MB"),
+        measure(f"extract_relevant_text[{megabytes}MB]", lambda: extract_relevant_text(context, next(queries)),
+                repeats, units=megabytes, unit="MB", setup=sentence_index.cache_clear),
+        measure(f"split_document[{megabytes}MB]", lambda: split_document(raw_text), repeats, units=megabytes,
+                unit="MB", setup=split_document.cache_clear),
+    ]
+
+def suite_llm(summary_mb, repeats):
+    import summarizer
+    import document_qa
+    from llm_client import MockLLM
+
+    llm = MockLLM()
+    text = make_pdf_text(summary_mb, "prose")
+    results = [measure(f"summarize.mock[{summary_mb}MB]", lambda: summarizer.summarize_with_gpt35(text, "Medium", llm=llm),
+                       min(repeats, 10), units=1, unit="documents", setup=summarizer._summary_cache.clear)]
+    results[-1]["llm_calls"] = llm.calls // (min(repeats, 10) + 2)
+
+    document, questions = make_qa_document()
+    for mode in document_qa.RETRIEVAL_MODES:
+        asked = iter(question for question, _ in questions * 4)
+        results.append(measure(f"retrieve.{mode}", lambda: document_qa.retrieve_chunks(document, next(asked), mode),
+                               repeats))
+    # Each question is new, so the answer is generated (by the mock LLM) rather than served from the cache
+    asked = iter(question for question, _ in questions)
+    results.append(measure("query_document.mock", lambda: document_qa.query_document(document, next(asked), "bm25"),
+                           min(repeats, len(questions) // 2 - 2)))
+    return results
+
+# Environment recorded with suite results, so runs on different machines are not compared blindly
+def suite_environment(scale):
+    import platform
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"scale": scale, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit,
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+# Run every suite case in a scratch directory, so the app's own caches are neither read nor overwritten
+def run_suite(scale="quick", only=None):
+    """
+    LLM calls go to MockLLM and embeddings to LocalEmbeddings, so the suite
+    never reaches a network provider. A case group whose dependencies are
+    missing is recorded as skipped, with the error, instead of failing the run.
+    """
+    sizes = SUITE_SCALES[scale]
+    os.environ["LLM_PROVIDER"] = "mock"
+    os.environ["EMBEDDINGS_PROVIDER"] = "local"
+    groups = [(f"books[{rows}]", suite_books, rows) for rows in sizes["books"]]
+    groups += [(f"pdf[{pages}p]", suite_pdf, pages) for pages in sizes["pdf_pages"]]
+    groups += [(f"text[{megabytes}MB]", suite_text, megabytes) for megabytes in sizes["text_mb"]]
+    groups.append(("llm", suite_llm, sizes["summary_mb"]))
+
+    results = suite_environment(scale)
+    results["cases"] = []
+    cwd = os.getcwd()
+    workdir = os.path.join(BENCH_DIR, "suite")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    try:
+        for name, group, size in groups:
+            if only and not any(pattern in name for pattern in only):
+                continue
+            try:
+                cases = group(size, sizes["repeats"])
+            except ImportError as error:
+                cases = [{"case": name, "skipped": str(error)}]
+            for case in cases:
+                print(json.dumps(case), file=sys.stderr)
+            results["cases"].extend(cases)
+    finally:
+        os.chdir(cwd)
+    return results
+
+# Mark cases whose p50 latency or peak memory grew past the threshold; returns the regressed case names
+def compare_to_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    previous = {case["case"]: case for case in baseline.get("cases", []) if "p50_ms" in case}
+    regressed = []
+    for case in results["cases"]:
+        old = previous.get(case["case"])
+        if old is None or "p50_ms" not in case:
+            continue
+        changes = {metric: round(case[metric] / old[metric] - 1, 3)
+                   for metric in ("p50_ms", "peak_mb") if old[metric] > 0}
+        case["baseline"] = {metric: old[metric] for metric in ("p50_ms", "p99_ms", "peak_mb")}
+        case["change"] = changes
+        case["regression"] = [metric for metric, change in changes.items() if change > threshold]
+        if case["regression"]:
+            regressed.append(case["case"])
+    results["baseline"] = {"commit": baseline.get("commit"), "created": baseline.get("created"),
+                           "threshold": threshold}
+    if baseline.get("scale") != results["scale"] or baseline.get("cpus") != results["cpus"]:
+        results["baseline"]["warning"] = "baseline was recorded at another scale or on another machine"
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the Smart Study Planner hot paths.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    load = subparsers.add_parser("load-data", help="Compare CSV parsing with the columnar book store.")
+    load.add_argument("--rows", type=int, nargs="+", default=[11123, 5_000_000])
+    embed = subparsers.add_parser("embeddings", help="Embedding throughput against the local provider.")
+    embed.add_argument("--chunks", type=int, default=2000)
+    embed.add_argument("--latency", type=float, default=0.05, help="simulated seconds per request")
+    clean = subparsers.add_parser("clean-text", help="Streaming text cleaner against the original implementation.")
+    clean.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 2, 4])
+    highlight = subparsers.add_parser("highlight", help="Relevant-sentence highlighting on large contexts.")
+    highlight.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 4])
+    streaming = subparsers.add_parser("streaming", help="Time to first token, blocking vs streaming, on a local server.")
+    streaming.add_argument("--runs", type=int, default=5)
+    streaming.add_argument("--words", type=int, default=200)
+    retrieval = subparsers.add_parser("retrieval", help="BM25, hybrid and FAISS retrieval latency and recall.")
+    retrieval.add_argument("--facts", type=int, default=200)
+    retrieval.add_argument("--filler-lines", type=int, default=4000)
+    timer = subparsers.add_parser("focus-timer", help="Many concurrent focus timers, sleeping loop vs deadlines.")
+    timer.add_argument("--sessions", type=int, default=500)
+    timer.add_argument("--seconds", type=int, default=5)
+    task_bench = subparsers.add_parser("tasks", help="Study planner reruns with many tasks, session list vs task store.")
+    task_bench.add_argument("--count", type=int, default=50_000)
+    schedule = subparsers.add_parser("scheduler", help="Study plan for a semester of tasks, full and incremental.")
+    schedule.add_argument("--count", type=int, default=10_000)
+    schedule.add_argument("--daily-hours", type=float, default=8.0)
+    calendar_bench = subparsers.add_parser("calendar", help="Task calendar events, every task vs the visible window.")
+    calendar_bench.add_argument("--counts", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    corpus_bench = subparsers.add_parser("corpus", help="Multi-document corpus query latency from 1 to 1,000 documents.")
+    corpus_bench.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    suite = subparsers.add_parser("suite", help="Every hot path: p50/p99 latency, throughput and peak memory, "
+                                                "saved as JSON and compared against a baseline.")
+    suite.add_argument("--scale", choices=list(SUITE_SCALES), default="quick")
+    suite.add_argument("--only", nargs="+", help="run only the case groups whose name contains one of these")
+    suite.add_argument("--output", help="results file (default: a timestamped file in bench_results/)")
+    suite.add_argument("--baseline", default=BASELINE_PATH, help="results to compare against, when the file exists")
+    suite.add_argument("--save-baseline", action="store_true", help="also save these results as the baseline")
+    suite.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    measure = subparsers.add_parser("measure-load")
+    measure.add_argument("method")
+    measure.add_argument("csv_path")
+    args = parser.parse_args()
+
+    if args.command == "suite":
+        results = run_suite(args.scale, args.only)
+        regressed = []
+        if os.path.exists(args.baseline) and not args.save_baseline:
+            with open(args.baseline, encoding="utf-8") as file:
+                regressed = compare_to_baseline(results, json.load(file), args.threshold)
+        output = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{args.scale}.json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        for path in [output] + ([args.baseline] if args.save_baseline else []):
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+        print(json.dumps({"results": output, "cases": len(results["cases"]), "regressions": regressed}))
+        if regressed:
+            sys.exit(1)
+    elif args.command == "measure-load":
+        print(json.dumps(measure_load(args.method, args.csv_path)))
+    elif args.command == "load-data":
+        for result in bench_load_data(args.rows):
+            print(json.dumps(result))
+    elif args.command == "clean-text":
+        for result in bench_clean_text(args.sizes_mb):
+            print(json.dumps(result))
+    elif args.command == "highlight":
+        for result in bench_extract_relevant_text(args.sizes_mb):
+            print(json.dumps(result))
+    elif args.command == "corpus":
+        for result in bench_corpus(args.sizes):
+            print(json.dumps(result))
+    elif args.command == "calendar":
+        for result in bench_calendar(args.counts):
+            print(json.dumps(result))
+    elif args.command == "scheduler":
+        print(json.dumps(bench_scheduler(args.count, args.daily_hours)))
+    elif args.command == "tasks":
+        for result in bench_task_store(args.count):
+            print(json.dumps(result))
+    elif args.command == "focus-timer":
+        for result in bench_focus_timer(args.sessions, args.seconds):
+            print(json.dumps(result))
+    elif args.command == "retrieval":
+        for result in bench_retrieval(args.facts, args.filler_lines):
+            print(json.dumps(result))
+    elif args.command == "streaming":
+        print(json.dumps(bench_streaming(args.runs, args.words)))
+    elif args.command == "embeddings":
+        for result in bench_embeddings(args.chunks, args.latency):
+            print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
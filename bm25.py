@@ -0,0 +1,89 @@
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+WORD = re.compile(r"\w+")
+
+# BM25 parameters: term frequency saturation and document length normalization
+K1 = 1.5
+B = 0.75
+
+# Built indexes kept in memory for follow-up questions about the same document
+MAX_LOADED_INDEXES = 8
+
+_loaded_indexes = OrderedDict()
+_loaded_lock = threading.Lock()
+
+def tokenize(text):
+    return WORD.findall(text.lower())
+
+class BM25Index:
+    """
+    In-memory inverted index over a list of text chunks, scored with Okapi
+    BM25. Built in one pass over the chunks; each term maps to the chunks
+    containing it and its frequency there, so a query only touches the
+    postings of its own terms.
+    """
+
+    def __init__(self, texts, k1=K1, b=B):
+        self.texts = list(texts)
+        self.k1 = k1
+        self.b = b
+        postings = {}
+        lengths = np.zeros(len(self.texts), dtype=np.float32)
+        for position, text in enumerate(self.texts):
+            tokens = tokenize(text)
+            lengths[position] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(position)
+                postings[token][1].append(count)
+        self.postings = {
+            token: (np.array(ids, dtype=np.int32), np.array(counts, dtype=np.float32))
+            for token, (ids, counts) in postings.items()
+        }
+        self.lengths = lengths
+        self.average_length = float(lengths.mean()) if len(lengths) and lengths.mean() else 1.0
+        count = len(self.texts)
+        self.idf = {
+            token: float(np.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5)))
+            for token, (ids, _) in self.postings.items()
+        }
+
+    def scores(self, query):
+        scores = np.zeros(len(self.texts), dtype=np.float32)
+        norms = self.k1 * (1 - self.b + self.b * self.lengths / self.average_length)
+        for token in set(tokenize(query)):
+            if token not in self.postings:
+                continue
+            ids, counts = self.postings[token]
+            scores[ids] += self.idf[token] * counts * (self.k1 + 1) / (counts + norms[ids])
+        return scores
+
+    # Best k chunks for a query as (chunk position, score), best first; chunks sharing no term are left out
+    def search(self, query, k=3):
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        # Highest score first, ties in document order
+        order = np.lexsort((matched, -scores[matched]))
+        return [(int(matched[i]), float(scores[matched[i]])) for i in order]
+
+# Index for a document's chunks, built once per key and kept in a small in-memory LRU
+def get_bm25_index(texts, index_key):
+    with _loaded_lock:
+        if index_key in _loaded_indexes:
+            _loaded_indexes.move_to_end(index_key)
+            return _loaded_indexes[index_key]
+    index = BM25Index(texts)
+    with _loaded_lock:
+        _loaded_indexes[index_key] = index
+        _loaded_indexes.move_to_end(index_key)
+        while len(_loaded_indexes) > MAX_LOADED_INDEXES:
+            _loaded_indexes.popitem(last=False)
+    return index
@@ -0,0 +1,196 @@
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from recommender import build_features, dataset_fingerprint, get_index, top_similar
+
+# Prime modulus for the MinHash permutations (feature ids are below it)
+MERSENNE_PRIME = (1 << 31) - 1
+
+# Default recall/latency tradeoff: more bands means more candidates and better recall
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 64
+DEFAULT_MAX_CANDIDATES = 2000
+
+# Rows hashed at once when computing signatures
+SIGNATURE_BLOCK_ROWS = 10_000
+
+# Stateless tokenizer and vectorizer, so rows can be added without refitting anything
+HASHER = HashingVectorizer(n_features=2**20, alternate_sign=False, norm="l2")
+
+# MinHash signatures for the rows of a hashed feature matrix
+def minhash_signatures(matrix, num_perm=DEFAULT_NUM_PERM, seed=1):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    signatures = np.full((matrix.shape[0], num_perm), MERSENNE_PRIME, dtype=np.uint64)
+    # Hash in row blocks so the (tokens x permutations) scratch array stays small
+    for start in range(0, matrix.shape[0], SIGNATURE_BLOCK_ROWS):
+        block = matrix[start:start + SIGNATURE_BLOCK_ROWS]
+        non_empty = np.flatnonzero(np.diff(block.indptr))
+        if len(non_empty):
+            hashed = (block.indices.astype(np.uint64)[:, None] * a + b) % MERSENNE_PRIME
+            signatures[start + non_empty] = np.minimum.reduceat(hashed, block.indptr[non_empty], axis=0)
+    return signatures
+
+# One bucket key per band, mixing the band's signature values into a single integer
+def band_keys(signatures, bands):
+    rows_per_band = signatures.shape[1] // bands
+    mixers = np.random.default_rng(0).integers(1, 2**63, size=rows_per_band, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        return np.stack([
+            (signatures[:, band * rows_per_band:(band + 1) * rows_per_band] * mixers).sum(axis=1)
+            for band in range(bands)
+        ], axis=1)
+
+# Vectorize a range of feature strings and compute their band keys (runs in worker processes)
+def build_shard(features, num_perm, bands, seed):
+    vectors = HASHER.transform(features).tocsr()
+    vectors.sort_indices()
+    return vectors, band_keys(minhash_signatures(vectors, num_perm, seed), bands)
+
+class BookLSH:
+    """
+    Approximate nearest-neighbor index over book features using MinHash with
+    LSH banding. Books can be added incrementally, and shards built in other
+    processes can be merged in. Candidates from matching buckets are re-ranked
+    by exact cosine similarity.
+    """
+
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS, max_candidates=DEFAULT_MAX_CANDIDATES, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands.")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.max_candidates = max_candidates
+        self.seed = seed
+        self.buckets = [{} for _ in range(bands)]
+        self.keys = np.zeros((0, bands), dtype=np.uint64)
+        self.vector_blocks = []
+        self._vectors = None
+        self.size = 0
+
+    # Insert a shard built by build_shard; its rows get the next ids
+    def add_shard(self, vectors, keys):
+        start = self.size
+        for band, buckets in enumerate(self.buckets):
+            for offset, key in enumerate(keys[:, band].tolist()):
+                buckets.setdefault(key, []).append(start + offset)
+        self.keys = np.vstack([self.keys, keys])
+        self.vector_blocks.append(vectors)
+        self._vectors = None
+        self.size += vectors.shape[0]
+        return range(start, self.size)
+
+    # Add books by their feature strings
+    def add(self, features):
+        return self.add_shard(*build_shard(list(features), self.num_perm, self.bands, self.seed))
+
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            self._vectors = sparse.vstack(self.vector_blocks, format="csr") if self.vector_blocks else None
+            self.vector_blocks = [self._vectors] if self._vectors is not None else []
+        return self._vectors
+
+    # Books sharing at least one band bucket with a book
+    def candidates(self, doc):
+        # Distinct ids in the order their bands are visited, so the cap counts each book once
+        found = {}
+        for band, buckets in enumerate(self.buckets):
+            found.update(dict.fromkeys(buckets.get(int(self.keys[doc, band]), ())))
+            if len(found) >= self.max_candidates:
+                break
+        return np.sort(np.array(list(found)[:self.max_candidates], dtype=np.int64))
+
+    # Approximate top-k neighbors, ranked like the exact engine
+    def query(self, doc, k=5):
+        candidates = self.candidates(doc)
+        if doc not in candidates:
+            candidates = np.sort(np.append(candidates, doc))
+        vectors = self.vectors
+        scores = (vectors[candidates] @ vectors[doc].T).toarray().ravel()
+        order = np.lexsort((candidates, -scores))
+        return candidates[order][1:k + 1]
+
+# Build an index over a whole catalog, vectorizing shards on a process pool
+def build_lsh(features, workers=1, shard_rows=100_000, **options):
+    lsh = BookLSH(**options)
+    features = list(features)
+    shards = [features[start:start + shard_rows] for start in range(0, len(features), shard_rows)]
+    if workers <= 1:
+        for shard in shards:
+            lsh.add(shard)
+        return lsh
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        args = [(shard, lsh.num_perm, lsh.bands, lsh.seed) for shard in shards]
+        for vectors, keys in executor.map(build_shard, *zip(*args)):
+            lsh.add_shard(vectors, keys)
+    return lsh
+
+# Approximate indexes kept for the lifetime of the process, keyed by dataset fingerprint
+_lsh_cache = {}
+
+# Return the approximate index for a dataset, building it on first use
+def get_lsh(books_df):
+    fingerprint = dataset_fingerprint(books_df)
+    if fingerprint not in _lsh_cache:
+        _lsh_cache[fingerprint] = build_lsh(build_features(books_df))
+    return _lsh_cache[fingerprint]
+
+# Compare the approximate engine against the exact one on a sample of books
+def recall_report(books_df, lsh, sample=1000, k=5, seed=0):
+    """
+    Returns recall@k by book id, recall@k by score (a returned book counts if it
+    scores at least as high as the exact k-th neighbor, so equally good tied
+    books are not penalized), and mean query latency for both engines.
+    """
+    matrix = get_index(books_df)["matrix"]
+    docs = np.random.default_rng(seed).choice(len(books_df), size=min(sample, len(books_df)), replace=False)
+    id_hits = score_hits = total = 0
+    exact_time = approx_time = 0.0
+    for doc in docs:
+        start = time.perf_counter()
+        exact = top_similar(matrix, doc, k)
+        exact_time += time.perf_counter() - start
+        start = time.perf_counter()
+        approx = lsh.query(doc, k)
+        approx_time += time.perf_counter() - start
+
+        exact_scores = (matrix[exact] @ matrix[doc].T).toarray().ravel()
+        approx_scores = (matrix[approx] @ matrix[doc].T).toarray().ravel()
+        id_hits += len(np.intersect1d(exact, approx))
+        score_hits += int(np.sum(approx_scores >= exact_scores.min() - 1e-9)) if len(exact) else 0
+        total += len(exact)
+    return {
+        "recall_by_id": id_hits / max(total, 1),
+        "recall_by_score": score_hits / max(total, 1),
+        "exact_ms": 1000 * exact_time / len(docs),
+        "approximate_ms": 1000 * approx_time / len(docs),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Report recall of the approximate book recommender.")
+    parser.add_argument("csv_path", nargs="?", default="cleaned_books.csv")
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM)
+    parser.add_argument("--bands", type=int, default=DEFAULT_BANDS)
+    parser.add_argument("--max-candidates", type=int, default=DEFAULT_MAX_CANDIDATES)
+    parser.add_argument("--sample", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    from book_store import load_books
+    books_df = load_books(args.csv_path)
+    start = time.perf_counter()
+    lsh = build_lsh(build_features(books_df), args.workers, num_perm=args.num_perm,
+                    bands=args.bands, max_candidates=args.max_candidates)
+    print(f"Built LSH index over {lsh.size} books in {time.perf_counter() - start:.2f}s")
+    for name, value in recall_report(books_df, lsh, args.sample).items():
+        print(f"{name}: {value:.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import re
+import bisect
+import weakref
+from collections import defaultdict
+import numpy as np
+
+# Relative weight of a match in each indexed field
+FIELD_WEIGHTS = {"title": 2.0, "authors": 1.0}
+
+# Score multipliers for how a query token matched an indexed token; a prefix expansion never scores
+# more than PREFIX_QUALITY times the query token's own exact match, however rare the longer token is
+PREFIX_QUALITY = 0.8
+FUZZY_QUALITY = 0.7
+
+# Minimum trigram Jaccard similarity for a fuzzy token match
+FUZZY_THRESHOLD = 0.4
+
+# Tokens below the trigram threshold still match within one edit (an insertion, deletion, substitution
+# or swap of adjacent letters) per this many letters of the query token, rounded up
+LETTERS_PER_EDIT = 8
+
+# Closest tokens by trigrams whose edit distance is checked, per query token
+MAX_EDIT_CANDIDATES = 256
+
+# Upper bound on how many indexed tokens a single query token may expand to
+MAX_EXPANSIONS = 32
+
+# Postings larger than this are only used to score, never to generate candidates
+MAX_CANDIDATE_POSTINGS = 5000
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Indexes kept for the lifetime of each DataFrame they were built from
+_index_cache = {}
+
+# Split text into lowercase word tokens
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+# Character trigrams of a token, padded so short tokens still produce some
+def trigrams(token):
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# Edits turning one token into the other, counting a swap of adjacent letters as one, or None past max_edits
+def edit_distance(a, b, max_edits):
+    if abs(len(a) - len(b)) > max_edits:
+        return None
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > max_edits:
+            return None
+        before, previous = previous, current
+    return previous[-1] if previous[-1] <= max_edits else None
+
+class BookSearchIndex:
+    """
+    Inverted index over book titles and authors with prefix and fuzzy token
+    matching. Documents are identified by their row position in the frame the
+    index was built from.
+    """
+
+    def __init__(self, titles, authors):
+        postings = {field: defaultdict(list) for field in FIELD_WEIGHTS}
+        self.size = len(titles)
+        self.title_lengths = np.zeros(self.size, dtype=np.int32)
+        for doc, (title, author) in enumerate(zip(titles, authors)):
+            for field, text in (("title", title), ("authors", author)):
+                tokens = tokenize(text)
+                if field == "title":
+                    self.title_lengths[doc] = len(tokens)
+                for token in set(tokens):
+                    postings[field][token].append(doc)
+
+        self.postings = {
+            field: {token: np.array(docs, dtype=np.int32) for token, docs in field_postings.items()}
+            for field, field_postings in postings.items()
+        }
+
+        # Sorted vocabulary for prefix expansion and trigram postings for fuzzy expansion
+        self.vocabulary = sorted(set().union(*(p.keys() for p in self.postings.values())))
+        self.document_frequency = np.array(
+            [sum(len(p.get(token, ())) for p in self.postings.values()) for token in self.vocabulary]
+        )
+        trigram_postings = defaultdict(list)
+        self.trigram_counts = np.zeros(len(self.vocabulary), dtype=np.int32)
+        for token_id, token in enumerate(self.vocabulary):
+            grams = trigrams(token)
+            self.trigram_counts[token_id] = len(grams)
+            for gram in grams:
+                trigram_postings[gram].append(token_id)
+        self.trigram_postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in trigram_postings.items()}
+
+        # Sorted lowercase titles for whole-title autocomplete
+        order = sorted(range(self.size), key=lambda doc: str(titles[doc]).lower())
+        self.sorted_titles = [str(titles[doc]).lower() for doc in order]
+        self.sorted_title_docs = np.array(order, dtype=np.int32)
+
+    # Indexed tokens starting with a prefix, most frequent first
+    def prefix_tokens(self, prefix):
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "￿")
+        if end - start > MAX_EXPANSIONS:
+            ids = start + np.argsort(-self.document_frequency[start:end], kind="stable")[:MAX_EXPANSIONS]
+        else:
+            ids = range(start, end)
+        return [self.vocabulary[i] for i in ids]
+
+    # Indexed tokens that look like a (possibly misspelled) query token, with their similarity
+    def fuzzy_tokens(self, token):
+        """
+        Similarity is the trigram Jaccard similarity. A typo in a short token,
+        such as a swap ("tolkein"), breaks too many trigrams to reach
+        FUZZY_THRESHOLD, so the closest tokens by trigrams that are within a
+        few edits score at least 1 - edits / length.
+        """
+        grams = [self.trigram_postings[g] for g in trigrams(token) if g in self.trigram_postings]
+        if not grams:
+            return []
+        ids, shared = np.unique(np.concatenate(grams), return_counts=True)
+        similarity = shared / (len(trigrams(token)) + self.trigram_counts[ids] - shared)
+        order = np.argsort(-similarity, kind="stable")
+        ids, similarity = ids[order], similarity[order]
+        max_edits = -(-len(token) // LETTERS_PER_EDIT)
+        for i in range(min(len(ids), MAX_EDIT_CANDIDATES)):
+            edits = edit_distance(token, self.vocabulary[ids[i]], max_edits)
+            if edits is not None:
+                similarity[i] = max(similarity[i], 1 - edits / max(len(token), len(self.vocabulary[ids[i]])))
+        keep = similarity >= FUZZY_THRESHOLD
+        ids, similarity = ids[keep], similarity[keep]
+        best = np.argsort(-similarity, kind="stable")[:MAX_EXPANSIONS]
+        return [(self.vocabulary[ids[i]], float(similarity[i])) for i in best]
+
+    # Expand a query token to (indexed token, match quality) pairs
+    def expand(self, token, allow_prefix):
+        matches = {}
+        index = bisect.bisect_left(self.vocabulary, token)
+        if index < len(self.vocabulary) and self.vocabulary[index] == token:
+            matches[token] = 1.0
+        if allow_prefix:
+            for candidate in self.prefix_tokens(token):
+                matches.setdefault(candidate, PREFIX_QUALITY)
+        if not matches and len(token) >= 3:
+            for candidate, similarity in self.fuzzy_tokens(token):
+                matches[candidate] = FUZZY_QUALITY * similarity
+        return matches
+
+    # Rank documents for a free-text query and return their row positions
+    def search(self, query, limit=10):
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        # Gather weighted postings for every query token; the last one may still be being typed
+        groups = []
+        for position, token in enumerate(tokens):
+            weighted = []
+            for term, quality in self.expand(token, allow_prefix=position == len(tokens) - 1).items():
+                for field, field_weight in FIELD_WEIGHTS.items():
+                    docs = self.postings[field].get(term)
+                    if docs is not None:
+                        idf = np.log1p(self.size / len(docs))
+                        weighted.append((docs, quality * field_weight * idf, term == token))
+            # An exact match outranks every expansion of it, in any field
+            exact = [weight for _, weight, is_exact in weighted if is_exact]
+            cap = PREFIX_QUALITY * min(exact) if exact else np.inf
+            weighted = [(docs, weight if is_exact else min(weight, cap)) for docs, weight, is_exact in weighted]
+            if weighted:
+                groups.append(weighted)
+        if not groups:
+            return []
+
+        # Generate candidates from the selective groups only, then score them against every group
+        sizes = [sum(len(docs) for docs, _ in group) for group in groups]
+        selective = [g for g, size in zip(groups, sizes) if size <= MAX_CANDIDATE_POSTINGS]
+        if not selective:
+            selective = [groups[int(np.argmin(sizes))]]
+        candidates = np.sort(np.concatenate([docs for group in selective for docs, _ in group]))
+        candidates = candidates[np.concatenate(([True], candidates[1:] != candidates[:-1]))]
+
+        scores = np.zeros(len(candidates))
+        for group, size in zip(groups, sizes):
+            best = np.zeros(len(candidates))
+            if size <= 4 * len(candidates):
+                # Small group: locate its postings among the candidates in one batch
+                docs = np.concatenate([docs for docs, _ in group])
+                weights = np.concatenate([np.full(len(docs), weight) for docs, weight in group])
+                positions = np.minimum(np.searchsorted(candidates, docs), len(candidates) - 1)
+                hit = candidates[positions] == docs
+                np.maximum.at(best, positions[hit], weights[hit])
+            else:
+                # Large group: look each candidate up in its postings instead
+                for docs, weight in group:
+                    positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+                    best = np.maximum(best, np.where(docs[positions] == candidates, weight, 0.0))
+            scores += best
+
+        # Among equal scores prefer shorter titles, i.e. the closer title match
+        top = np.lexsort((candidates, self.title_lengths[candidates], -scores))[:limit]
+        return [int(doc) for doc in candidates[top]]
+
+    # Best single match for a query, or None if nothing matches
+    def best_match(self, query):
+        results = self.search(query, limit=1)
+        return results[0] if results else None
+
+    # Row positions of titles starting with the typed prefix, in alphabetical order
+    def complete(self, prefix, limit=10):
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.sorted_titles, prefix)
+        end = bisect.bisect_left(self.sorted_titles, prefix + "￿", lo=start, hi=min(start + limit, self.size))
+        return [int(doc) for doc in self.sorted_title_docs[start:end]]
+
+# Return the search index for a DataFrame, building it on first use
+def get_search_index(books_df):
+    key = id(books_df)
+    entry = _index_cache.get(key)
+    if entry is None or entry[0]() is not books_df:
+        entry = (weakref.ref(books_df), BookSearchIndex(books_df["title"].tolist(), books_df["authors"].tolist()))
+        _index_cache[key] = entry
+        weakref.finalize(books_df, _index_cache.pop, key, None)
+    return entry[1]
@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+import threading
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # Without pyarrow we still share one parsed copy, just without the binary store
+    feather = None
+
+# Directory holding the converted columnar copies of source CSV files
+STORE_DIR = "books_store"
+
+# Bump whenever the on-disk layout or column types change
+STORE_VERSION = 2
+
+# Column types used for the converted store
+COLUMN_DTYPES = {
+    "bookID": "int32",
+    "title": "string",
+    "authors": "category",
+    "average_rating": "float32",
+    "isbn": "string",
+    "isbn13": "string",
+    "language_code": "category",
+    "num_pages": "int32",
+    "ratings_count": "int32",
+    "text_reviews_count": "int32",
+    "publication_date": "string",
+    "publisher": "category",
+}
+
+# One loaded copy per source path, shared by every session in this process
+_loaded = {}
+_lock = threading.Lock()
+
+# Cheap identity of a source file, checked on every load
+def source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+# Content hash of a source file, only computed when its signature changes
+def file_hash(csv_path):
+    digest = hashlib.sha1()
+    with open(csv_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Paths of the converted table and its manifest for a source file
+def store_paths(csv_path, store_dir=STORE_DIR):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(store_dir, name + ".arrow"), os.path.join(store_dir, name + ".json")
+
+# Parse a CSV with the store's column types
+def read_typed_csv(csv_path):
+    header = pd.read_csv(csv_path, nrows=0).columns
+    dtypes = {col: COLUMN_DTYPES[col] for col in header if col in COLUMN_DTYPES}
+    return pd.read_csv(csv_path, dtype=dtypes)
+
+# Convert a CSV into an uncompressed Arrow file that can be memory-mapped
+def convert_csv(csv_path, store_dir=STORE_DIR, content_hash=None):
+    table_path, manifest_path = store_paths(csv_path, store_dir)
+    os.makedirs(store_dir, exist_ok=True)
+    books = read_typed_csv(csv_path)
+    temp_path = table_path + ".tmp"
+    feather.write_feather(books, temp_path, compression="uncompressed")
+    os.replace(temp_path, table_path)
+    write_manifest(manifest_path, csv_path, content_hash or file_hash(csv_path))
+
+def write_manifest(manifest_path, csv_path, content_hash):
+    manifest = {"version": STORE_VERSION, "sha1": content_hash, **source_signature(csv_path)}
+    with open(manifest_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+
+def read_manifest(manifest_path):
+    try:
+        with open(manifest_path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+# Make sure the converted store matches the source, converting only when the content changed
+def ensure_store(csv_path, store_dir=STORE_DIR):
+    table_path, manifest_path = store_paths(csv_path, store_dir)
+    manifest = read_manifest(manifest_path)
+    signature = source_signature(csv_path)
+    if (
+        manifest is not None
+        and manifest.get("version") == STORE_VERSION
+        and os.path.exists(table_path)
+    ):
+        if all(manifest.get(key) == value for key, value in signature.items()):
+            return table_path
+        # Touched but not modified: refresh the manifest instead of converting again
+        content_hash = file_hash(csv_path)
+        if manifest.get("sha1") == content_hash:
+            write_manifest(manifest_path, csv_path, content_hash)
+            return table_path
+        convert_csv(csv_path, store_dir, content_hash)
+        return table_path
+    convert_csv(csv_path, store_dir)
+    return table_path
+
+# Memory-map the converted store as a DataFrame
+def read_store(table_path):
+    table = feather.read_table(table_path, memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=False)
+
+# Load a books CSV through the shared cache, refreshing it when the source changes
+def load_books(csv_path, store_dir=STORE_DIR):
+    """
+    Returns a DataFrame shared by every caller in the process. Treat it as
+    read-only: copy it before adding or changing columns.
+    """
+    key = os.path.abspath(csv_path)
+    signature = source_signature(csv_path)
+    with _lock:
+        entry = _loaded.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        if feather is None:
+            books = read_typed_csv(csv_path)
+        else:
+            try:
+                books = read_store(ensure_store(csv_path, store_dir))
+            except OSError:
+                # Read-only checkout: the store cannot be written, parse directly
+                books = read_typed_csv(csv_path)
+        _loaded[key] = (signature, books)
+        return books
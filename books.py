@@ -1,42 +1,56 @@
 import streamlit as st
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import CountVectorizer
+from recommender import get_index, get_neighbors, top_similar
+from book_search import get_search_index
+from book_store import load_books
+from book_lsh import get_lsh
+from tracing import span, traced
 
 # Load the cleaned dataset
+@traced("load_data")
 def load_data():
     try:
-        # Load the cleaned dataset
-        return pd.read_csv("cleaned_books.csv")
+        # Load the shared, memory-mapped copy of the cleaned dataset
+        return load_books("cleaned_books.csv")
     except FileNotFoundError:
         st.error("Cleaned dataset not found. Please ensure 'cleaned_books.csv' is in the directory.")
         return None
 
-def recommend_books(book_title, books_df):
-    try:
-        # Combine relevant features
-        books_df["features"] = books_df["authors"] + " " + books_df["publisher"] + " " + books_df["language_code"]
-        
-        # Vectorize features
-        vectorizer = CountVectorizer()
-        feature_matrix = vectorizer.fit_transform(books_df["features"])
-        
-        # Compute cosine similarity
-        similarity = cosine_similarity(feature_matrix, feature_matrix)
-        
+# Find the row position of the book that best matches a title or author query
+def find_book(book_title, books_df):
+    return get_search_index(books_df).best_match(book_title)
+
+# Books similar to the best match for book_title; pass book_pos when the caller has already found it
+def recommend_books(book_title, books_df, approximate=False, book_pos=None):
+    with span("recommend_books", books=len(books_df), approximate=approximate) as current:
         # Find the book index
-        book_idx = books_df[books_df["title"].str.contains(book_title, case=False, na=False)].index[0]
-        
-        # Get similarity scores and sort
-        scores = list(enumerate(similarity[book_idx]))
-        scores = sorted(scores, key=lambda x: x[1], reverse=True)
-        
-        # Get top 5 recommendations
-        top_recommendations = scores[1:6]
-        recommended_books = books_df.iloc[[i[0] for i in top_recommendations]]
+        if book_pos is None:
+            with span("books.find"):
+                book_pos = find_book(book_title, books_df)
+        if book_pos is None:
+            return None
+
+        neighbors = None
+        if not approximate:
+            # Look the neighbors up in the precomputed table when the batch job has run
+            with span("books.neighbors"):
+                neighbors = get_neighbors(books_df)
+        if approximate:
+            # MinHash/LSH candidates re-ranked exactly, for catalogs too large to score in full
+            with span("books.lsh"):
+                top_recommendations = get_lsh(books_df).query(book_pos, k=5)
+            current.set(engine="lsh")
+        elif neighbors is not None and neighbors["ids"].shape[1] >= 5:
+            top_recommendations = neighbors["ids"][book_pos, :5]
+            top_recommendations = top_recommendations[top_recommendations >= 0]
+            current.set(engine="precomputed")
+        else:
+            # Otherwise score only the query row against the normalized feature matrix
+            with span("books.score"):
+                index = get_index(books_df)
+                top_recommendations = top_similar(index["matrix"], book_pos, k=5)
+            current.set(engine="exact")
+        recommended_books = books_df.iloc[top_recommendations]
         return recommended_books[["title", "authors", "average_rating", "publisher"]]
-    except IndexError:
-        return None
 
 def book_recommendation_ui():
     # Load data
@@ -49,7 +63,10 @@ def book_recommendation_ui():
     user_input = st.text_input("Enter a book, author, or genre to get recommendations:")
     
     if user_input:
-        recommendations = recommend_books(user_input, books_df)
+        book_pos = find_book(user_input, books_df)
+        if book_pos is not None:
+            st.caption(f"Showing books similar to *{books_df.iloc[book_pos]['title']}*")
+        recommendations = recommend_books(user_input, books_df, book_pos=book_pos) if book_pos is not None else None
         if recommendations is not None and not recommendations.empty:
             st.write("### Recommended Books")
             st.dataframe(recommendations)
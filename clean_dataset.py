@@ -1,45 +1,203 @@
+import os
+import io
+import json
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
-def clean_books_dataset(input_file, output_file):
+# Define the expected columns
+EXPECTED_COLUMNS = ["bookID", "title", "authors", "average_rating", "isbn",
+                    "isbn13", "language_code", "num_pages", "ratings_count",
+                    "text_reviews_count", "publication_date", "publisher"]
+
+# Types of the numeric columns; everything else is kept as text, so ISBNs keep their leading zeros
+NUMERIC_COLUMNS = {"average_rating": "float64", "num_pages": "int64", "ratings_count": "int64",
+                   "text_reviews_count": "int64"}
+
+# Columns a book may only appear once by, across all chunks and runs
+DEDUP_COLUMNS = ["bookID", "isbn13"]
+
+# Rows read per chunk when streaming
+DEFAULT_CHUNKSIZE = 100_000
+
+# Bytes of the input hashed to detect that it was rewritten rather than appended to
+PREFIX_HASH_BYTES = 1 << 20
+
+# Clean a single chunk of the raw dataset
+def clean_chunk(books):
+    # Find intersection of actual and expected columns
+    actual_columns = [col for col in EXPECTED_COLUMNS if col in books.columns]
+    if not actual_columns:
+        raise ValueError("No matching columns found in the dataset.")
+
+    # Keep only the relevant columns
+    books = books[actual_columns].copy()
+
+    # Drop rows with missing or invalid data
+    books.dropna(inplace=True)
+
+    # Convert numeric columns to appropriate data types (if present)
+    numeric = {col: dtype for col, dtype in NUMERIC_COLUMNS.items() if col in books.columns}
+    for col in numeric:
+        books[col] = pd.to_numeric(books[col], errors="coerce")
+
+    # Drop rows with NaN values introduced by type conversion
+    books.dropna(inplace=True)
+    # The same types for every chunk, whatever values it happens to hold
+    return books.astype(numeric)
+
+# Drop rows whose keys were already written, remembering the new ones
+def drop_seen(books, seen):
+    keep = pd.Series(True, index=books.index)
+    for col in DEDUP_COLUMNS:
+        if col in books.columns:
+            keep &= ~books[col].map(seen[col].__contains__) & ~books[col].duplicated()
+    books = books[keep]
+    for col in DEDUP_COLUMNS:
+        if col in books.columns:
+            seen[col].update(books[col])
+    return books
+
+# Keys already present in a previously cleaned file
+def load_seen(output_file, chunksize):
+    seen = {col: set() for col in DEDUP_COLUMNS}
+    header = pd.read_csv(output_file, nrows=0, dtype=str).columns
+    usecols = [col for col in DEDUP_COLUMNS if col in header]
+    if usecols:
+        for chunk in pd.read_csv(output_file, usecols=usecols, dtype=str, chunksize=chunksize):
+            for col in usecols:
+                seen[col].update(chunk[col])
+    return seen
+
+# File-like view of the first `limit` bytes of a binary file
+class BoundedReader(io.RawIOBase):
+    def __init__(self, file, limit):
+        self.file = file
+        self.remaining = limit
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        data = self.file.read(size)
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+# Offset just past the last complete line, so a row still being written is left for next run
+def complete_lines_end(input_file):
+    size = os.path.getsize(input_file)
+    with open(input_file, "rb") as file:
+        position = size
+        while position > 0:
+            start = max(0, position - 65536)
+            file.seek(start)
+            block = file.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                return start + newline + 1
+            position = start
+    return 0
+
+def prefix_hash(input_file, end):
+    with open(input_file, "rb") as file:
+        return hashlib.sha1(file.read(min(end, PREFIX_HASH_BYTES))).hexdigest()
+
+# Incremental state is stored next to the output file
+def state_path(output_file):
+    return output_file + ".state.json"
+
+def read_state(output_file):
     try:
-        # Load the dataset with error handling
-        books = pd.read_csv(input_file, on_bad_lines="skip")
-        print("Dataset loaded successfully.")
-        
-        # Define the expected columns
-        expected_columns = ["bookID", "title", "authors", "average_rating", "isbn",
-                            "isbn13", "language_code", "num_pages", "ratings_count",
-                            "text_reviews_count", "publication_date", "publisher"]
-        
-        # Find intersection of actual and expected columns
-        actual_columns = [col for col in expected_columns if col in books.columns]
-        if not actual_columns:
-            raise ValueError("No matching columns found in the dataset.")
-        
-        # Keep only the relevant columns
-        books = books[actual_columns]
-        
-        # Drop rows with missing or invalid data
-        books.dropna(inplace=True)
-        
-        # Convert numeric columns to appropriate data types (if present)
-        numeric_columns = ["average_rating", "num_pages", "ratings_count", "text_reviews_count"]
-        for col in numeric_columns:
-            if col in books.columns:
-                books[col] = pd.to_numeric(books[col], errors="coerce")
-        
-        # Drop rows with NaN values introduced by type conversion
-        books.dropna(inplace=True)
-        
-        # Save the cleaned dataset
-        books.to_csv(output_file, index=False)
-        print(f"Cleaned dataset saved to {output_file}.")
+        with open(state_path(output_file), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+# Clean chunks in order, on a process pool when more than one worker is requested
+def clean_chunks(chunks, workers):
+    if workers <= 1:
+        for chunk in chunks:
+            yield clean_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Bound the chunks in flight so memory stays flat however large the input is
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(clean_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def clean_books_dataset(input_file, output_file, chunksize=DEFAULT_CHUNKSIZE, workers=1, incremental=False):
+    try:
+        end = complete_lines_end(input_file)
+        state = read_state(output_file) if incremental and os.path.exists(output_file) else None
+        if state is not None and (state["offset"] > end or state["prefix_sha1"] != prefix_hash(input_file, state["offset"])):
+            print("Input changed since the last run; cleaning it from scratch.")
+            state = None
+        if state is not None and state["offset"] == end:
+            print("No new rows since the last run.")
+            return
+
+        with open(input_file, "rb") as raw:
+            if state is None:
+                # Full run: stream the whole file into a temporary output
+                columns = list(pd.read_csv(input_file, nrows=0, dtype=str).columns)
+                target = output_file + ".tmp"
+                seen = {col: set() for col in DEDUP_COLUMNS}
+                reader = io.BufferedReader(BoundedReader(raw, end))
+                # Every column is read as text: per-chunk type guessing would drop ISBNs' leading zeros
+                chunks = pd.read_csv(reader, dtype=str, on_bad_lines="skip", chunksize=chunksize)
+            else:
+                # Incremental run: only read the bytes appended since the last run
+                columns = state["columns"]
+                target = output_file
+                seen = load_seen(output_file, chunksize)
+                raw.seek(state["offset"])
+                reader = io.BufferedReader(BoundedReader(raw, end - state["offset"]))
+                chunks = pd.read_csv(reader, header=None, names=columns, dtype=str, on_bad_lines="skip",
+                                     chunksize=chunksize)
+            print("Dataset opened successfully.")
+
+            # Write cleaned chunks in input order, header only once
+            header = state is None
+            rows_written = 0
+            for books in clean_chunks(chunks, workers):
+                books = drop_seen(books, seen)
+                books.to_csv(target, mode="w" if header else "a", header=header, index=False)
+                header = False
+                rows_written += len(books)
+
+        if state is None:
+            if header:
+                # The input had no rows: still produce a file with the cleaned header
+                clean_chunk(pd.DataFrame(columns=columns)).to_csv(target, index=False)
+            os.replace(target, output_file)
+
+        # Remember how far we got so the next incremental run starts there
+        with open(state_path(output_file), "w", encoding="utf-8") as file:
+            json.dump({"offset": end, "prefix_sha1": prefix_hash(input_file, end), "columns": columns}, file)
+        print(f"Cleaned dataset saved to {output_file} ({rows_written} new rows).")
     except Exception as e:
         print(f"An error occurred: {e}")
 
-# File paths
-input_file = "books.csv"
-output_file = "cleaned_books.csv"
+def main():
+    parser = argparse.ArgumentParser(description="Clean the Goodreads books dataset.")
+    parser.add_argument("input_file", nargs="?", default="books.csv")
+    parser.add_argument("output_file", nargs="?", default="cleaned_books.csv")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="rows read per chunk")
+    parser.add_argument("--workers", type=int, default=1, help="processes cleaning chunks in parallel")
+    parser.add_argument("--incremental", action="store_true", help="only clean rows added since the last run")
+    args = parser.parse_args()
+
+    # Run the cleaning function
+    clean_books_dataset(args.input_file, args.output_file, args.chunksize, args.workers, args.incremental)
 
-# Run the cleaning function
-clean_books_dataset(input_file, output_file)
+if __name__ == "__main__":
+    main()
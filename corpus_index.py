@@ -0,0 +1,444 @@
+import os
+import re
+import json
+import math
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+import faiss
+
+# Where document corpora are kept, one directory per embeddings model and chunking setup
+CORPUS_DIR = "corpus_index"
+
+# Chunk ids are document id << POSITION_BITS | chunk position, so a document's chunks form one id range
+POSITION_BITS = 20
+
+# Below this many chunks every query scans the vectors exactly; from here on most of them are in a trained IVF
+TRAIN_MIN_CHUNKS = 16384
+
+# IVF lists per square root of the chunk count it was trained on, and lists probed per query
+LISTS_PER_SQRT = 1
+NPROBE = 64
+
+# The IVF is retrained once the corpus has grown this many times past the size it was trained on
+RETRAIN_GROWTH = 4
+
+# Chunks added or removed since the last merge are folded into the main segment once there are this many,
+# or this share of the main segment if that is more
+MERGE_MIN_CHUNKS = 8192
+MERGE_FRACTION = 0.125
+
+# Candidates taken from the compressed IVF and re-scored exactly from the shards
+RERANK_CANDIDATES = 64
+
+# Filters matching at most this many documents are answered by searching their shards directly
+EXACT_SEARCH_DOCUMENTS = 32
+
+# Shards kept open (memory-mapped) between queries; re-ranking reads from a few dozen of them per query
+MAX_OPEN_SHARDS = 1024
+
+# Indexes are memory-mapped instead of read into memory, without copying their codes where this FAISS
+# version supports it
+MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+_corpora = {}
+_corpora_lock = threading.Lock()
+
+def normalize_rows(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+def chunk_ids(document_id, count):
+    return (np.int64(document_id) << POSITION_BITS) + np.arange(count, dtype=np.int64)
+
+def split_chunk_id(chunk_id):
+    return int(chunk_id) >> POSITION_BITS, int(chunk_id) & ((1 << POSITION_BITS) - 1)
+
+class CorpusIndex:
+    """
+    Persistent vector index over many documents, for questions across a
+    course's PDFs. Each document is one immutable shard on disk: a flat FAISS
+    index of its unit-length chunk vectors, memory-mapped when read. Adding or
+    removing a document writes or deletes its own shard and never rebuilds the
+    others. Chunk texts and per-document metadata live in SQLite.
+
+    Queries go through two segments. The main segment is an IVF with 8-bit
+    scalar quantization over most of the corpus, saved as one file and
+    memory-mapped, so opening the corpus reads none of it; its best candidates
+    are re-scored exactly from the shards. Documents added since the last
+    merge are in a small exact in-memory delta, rebuilt from their shards on
+    open, and documents removed from the main segment are skipped there until
+    then. Once the delta and removals pass MERGE_MIN_CHUNKS or MERGE_FRACTION
+    of the main segment, they are merged into a new main segment file (the IVF
+    is retrained as well once the corpus has grown RETRAIN_GROWTH times).
+
+    The number of lists grows with the square root of the corpus and a fixed
+    number are probed, so a query scans about sqrt(chunks) vectors: latency
+    still grows with the corpus, only far slower. Safe to share between
+    threads.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.shard_dir = os.path.join(root, "shards")
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.path = os.path.join(root, "corpus.sqlite")
+        self.lock = threading.RLock()
+        self.shards = OrderedDict()
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents (id INTEGER PRIMARY KEY, document_hash TEXT NOT NULL UNIQUE, "
+                "name TEXT NOT NULL, added_at REAL NOT NULL, chunks INTEGER NOT NULL, metadata TEXT NOT NULL, "
+                "segment TEXT NOT NULL DEFAULT 'delta')"
+            )
+            if "segment" not in [row[1] for row in conn.execute("PRAGMA table_info(documents)")]:
+                conn.execute("ALTER TABLE documents ADD COLUMN segment TEXT NOT NULL DEFAULT 'delta'")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (document_id INTEGER NOT NULL, position INTEGER NOT NULL, "
+                "text TEXT NOT NULL, PRIMARY KEY (document_id, position))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS document_meta (document_id INTEGER NOT NULL, key TEXT NOT NULL, "
+                "value TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS document_meta_key ON document_meta (key, value)")
+            conn.execute("CREATE INDEX IF NOT EXISTS document_meta_document ON document_meta (document_id)")
+            # Documents removed from the corpus whose chunks are still in the main segment file
+            conn.execute("CREATE TABLE IF NOT EXISTS removed (document_id INTEGER PRIMARY KEY, chunks INTEGER NOT NULL)")
+            settings = dict(conn.execute("SELECT key, value FROM settings").fetchall())
+            rows = conn.execute("SELECT id, chunks, segment FROM documents ORDER BY id").fetchall()
+            self.removed = dict(conn.execute("SELECT document_id, chunks FROM removed").fetchall())
+        self.chunk_counts = {document_id: chunks for document_id, chunks, _ in rows}
+        self.delta_ids = {document_id for document_id, _, segment in rows if segment == "delta"}
+        self.dimension = int(settings["dimension"]) if "dimension" in settings else None
+        self.trained_size = int(settings.get("trained_size", 0))
+        self.generation = int(settings.get("main_generation", 0))
+        self.main = self._open_main(self.generation) if self.generation else None
+        self.excluded = self._excluded_selector()
+        # Main segment files of other generations were left by an interrupted merge
+        for name in os.listdir(root):
+            if re.fullmatch(r"main-\d+\.faiss", name) and name != os.path.basename(self.main_path(self.generation)):
+                os.remove(os.path.join(root, name))
+        self.delta = None
+        if self.dimension is not None:
+            self.delta = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+            for document_id in sorted(self.delta_ids):
+                count = self.chunk_counts[document_id]
+                self.delta.add_with_ids(self._shard(document_id).reconstruct_n(0, count), chunk_ids(document_id, count))
+            self._maybe_merge()
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def shard_path(self, document_id):
+        return os.path.join(self.shard_dir, f"{document_id}.faiss")
+
+    def main_path(self, generation):
+        return os.path.join(self.root, f"main-{generation}.faiss")
+
+    def __len__(self):
+        return len(self.chunk_counts)
+
+    # Chunks indexed across all documents
+    def size(self):
+        return sum(self.chunk_counts.values())
+
+    def _save_setting(self, key, value):
+        with self.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _shard(self, document_id):
+        with self.lock:
+            shard = self.shards.get(document_id)
+            if shard is None:
+                shard = faiss.read_index(self.shard_path(document_id), MMAP_FLAG)
+                self.shards[document_id] = shard
+                while len(self.shards) > MAX_OPEN_SHARDS:
+                    self.shards.popitem(last=False)
+            else:
+                self.shards.move_to_end(document_id)
+            return shard
+
+    # The main segment is only ever read, so it is mapped rather than loaded
+    def _open_main(self, generation):
+        main = faiss.read_index(self.main_path(generation), MMAP_FLAG)
+        main.nprobe = NPROBE
+        return main
+
+    # Selector skipping the chunks of removed documents in the main segment, or None; kept alive with its batch
+    def _excluded_selector(self):
+        if not self.removed:
+            return None
+        batch = faiss.IDSelectorBatch(np.concatenate(
+            [chunk_ids(document_id, count) for document_id, count in self.removed.items()]))
+        return batch, faiss.IDSelectorNot(batch)
+
+    # Empty IVF for `size` chunks, trained on whole documents picked at random
+    def _train(self, size):
+        nlist = int(LISTS_PER_SQRT * math.sqrt(size))
+        main = faiss.IndexIVFScalarQuantizer(faiss.IndexFlatIP(self.dimension), self.dimension, nlist,
+                                             faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        # More than 256 points per list only slows training down
+        sample, wanted = [], nlist * 256
+        for document_id in np.random.default_rng(0).permutation(list(self.chunk_counts)):
+            document_id = int(document_id)
+            sample.append(self._shard(document_id).reconstruct_n(0, self.chunk_counts[document_id]))
+            wanted -= len(sample[-1])
+            if wanted <= 0:
+                break
+        main.cp.min_points_per_centroid = 1
+        main.train(np.vstack(sample))
+        self.trained_size = size
+        return main
+
+    # Merge the delta and the removals into a new main segment file, then map it and empty the delta
+    def _merge(self):
+        size = self.size()
+        if self.main is None or size > RETRAIN_GROWTH * self.trained_size:
+            main = self._train(size)
+            merged = self.chunk_counts
+        else:
+            # Only the quantized codes are read, a quarter of the vectors' size, and only while merging
+            main = faiss.read_index(self.main_path(self.generation))
+            if self.removed:
+                main.remove_ids(self.excluded[0])
+            merged = {document_id: self.chunk_counts[document_id] for document_id in self.delta_ids}
+        for document_id, count in sorted(merged.items()):
+            main.add_with_ids(self._shard(document_id).reconstruct_n(0, count), chunk_ids(document_id, count))
+        generation = self.generation + 1
+        temp_path = f"{self.main_path(generation)}.{os.getpid()}.tmp"
+        faiss.write_index(main, temp_path)
+        del main
+        os.replace(temp_path, self.main_path(generation))
+        # The settings point at the new file in the same transaction that moves the documents into it
+        with self.connect() as conn:
+            conn.execute("UPDATE documents SET segment = 'main'")
+            conn.execute("DELETE FROM removed")
+            conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                             [("main_generation", str(generation)), ("trained_size", str(self.trained_size))])
+        previous, self.generation = self.generation, generation
+        self.main = self._open_main(generation)
+        self.delta_ids, self.removed, self.excluded = set(), {}, None
+        self.delta.reset()
+        if previous:
+            os.remove(self.main_path(previous))
+
+    def _maybe_merge(self):
+        pending = self.delta.ntotal + sum(self.removed.values())
+        if self.main is None:
+            due = pending >= TRAIN_MIN_CHUNKS
+        else:
+            due = pending > max(MERGE_MIN_CHUNKS, MERGE_FRACTION * self.main.ntotal)
+        if due:
+            self._merge()
+
+    # Id of the document with this content hash, or None
+    def find(self, document_hash):
+        with self.connect() as conn:
+            row = conn.execute("SELECT id FROM documents WHERE document_hash = ?", (document_hash,)).fetchone()
+        return None if row is None else row[0]
+
+    # Index one document's chunks and their vectors; returns its id (the existing one if already indexed)
+    def add(self, document_hash, name, texts, vectors, metadata=None):
+        vectors = normalize_rows(vectors)
+        if len(texts) != len(vectors) or not len(texts):
+            raise ValueError("expected one vector per chunk and at least one chunk")
+        if len(texts) >= 1 << POSITION_BITS:
+            raise ValueError(f"a document may have at most {(1 << POSITION_BITS) - 1} chunks")
+        metadata = {key: str(value) for key, value in (metadata or {}).items()}
+        with self.lock:
+            existing = self.find(document_hash)
+            if existing is not None:
+                return existing
+            if self.dimension is None:
+                self.dimension = vectors.shape[1]
+                self._save_setting("dimension", self.dimension)
+                self.delta = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"vectors have {vectors.shape[1]} dimensions; this corpus uses {self.dimension}")
+            with self.connect() as conn:
+                document_id = conn.execute(
+                    "INSERT INTO documents (document_hash, name, added_at, chunks, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (document_hash, name, time.time(), len(texts), json.dumps(metadata)),
+                ).lastrowid
+                conn.executemany("INSERT INTO chunks (document_id, position, text) VALUES (?, ?, ?)",
+                                 [(document_id, position, text) for position, text in enumerate(texts)])
+                conn.executemany("INSERT INTO document_meta (document_id, key, value) VALUES (?, ?, ?)",
+                                 [(document_id, key, value) for key, value in metadata.items()])
+                # The shard is in place before the transaction commits, so a listed document is always searchable
+                shard = faiss.IndexFlatIP(self.dimension)
+                shard.add(vectors)
+                temp_path = f"{self.shard_path(document_id)}.{os.getpid()}.tmp"
+                faiss.write_index(shard, temp_path)
+                os.replace(temp_path, self.shard_path(document_id))
+            self.chunk_counts[document_id] = len(texts)
+            self.delta_ids.add(document_id)
+            self.delta.add_with_ids(vectors, chunk_ids(document_id, len(texts)))
+            self._maybe_merge()
+            return document_id
+
+    def remove(self, document_id):
+        with self.lock:
+            count = self.chunk_counts.pop(document_id, None)
+            in_main = count is not None and document_id not in self.delta_ids
+            with self.connect() as conn:
+                conn.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+                conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
+                conn.execute("DELETE FROM document_meta WHERE document_id = ?", (document_id,))
+                if in_main:
+                    # The main segment file is never edited in place; its chunks are skipped until the next merge
+                    conn.execute("INSERT OR REPLACE INTO removed (document_id, chunks) VALUES (?, ?)",
+                                 (document_id, count))
+            if in_main:
+                self.removed[document_id] = count
+                self.excluded = self._excluded_selector()
+            elif count is not None:
+                self.delta_ids.discard(document_id)
+                low = int(document_id) << POSITION_BITS
+                self.delta.remove_ids(faiss.IDSelectorRange(low, low + (1 << POSITION_BITS)))
+            self.shards.pop(document_id, None)
+            try:
+                os.remove(self.shard_path(document_id))
+            except FileNotFoundError:
+                pass
+            if count is not None:
+                self._maybe_merge()
+
+    # Documents as dicts (id, document_hash, name, added_at, chunks, metadata), oldest first, optionally filtered
+    def documents(self, filters=None):
+        where, params = self._filter_sql(filters)
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, document_hash, name, added_at, chunks, metadata FROM documents {where} ORDER BY id", params
+            ).fetchall()
+        return [{"id": row[0], "document_hash": row[1], "name": row[2], "added_at": row[3], "chunks": row[4],
+                 "metadata": json.loads(row[5])} for row in rows]
+
+    # Ids of the documents passing {key: value or list of values} metadata filters
+    def document_ids(self, filters):
+        where, params = self._filter_sql(filters)
+        with self.connect() as conn:
+            return [row[0] for row in conn.execute(f"SELECT id FROM documents {where}", params)]
+
+    # Distinct values of one metadata key, such as every course in the corpus
+    def metadata_values(self, key):
+        with self.connect() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT DISTINCT value FROM document_meta WHERE key = ? ORDER BY value", (key,))]
+
+    # WHERE clause for {key: value or list of values} metadata filters; "id" filters on document ids
+    def _filter_sql(self, filters):
+        clauses, params = [], []
+        for key, values in (filters or {}).items():
+            values = [values] if isinstance(values, (str, int)) else list(values)
+            marks = ", ".join("?" * len(values))
+            if key == "id":
+                clauses.append(f"id IN ({marks})")
+                params += [int(value) for value in values]
+            else:
+                clauses.append(f"id IN (SELECT document_id FROM document_meta WHERE key = ? AND value IN ({marks}))")
+                params += [key] + [str(value) for value in values]
+        return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    # (score, chunk id) of the best k chunks of a few documents, searching their shards exactly
+    def _search_shards(self, query, document_ids, k):
+        found = []
+        for document_id in document_ids:
+            try:
+                shard = self._shard(document_id)
+            except RuntimeError:
+                continue  # Removed meanwhile
+            scores, positions = shard.search(query[None, :], min(k, shard.ntotal))
+            found += [(float(score), (document_id << POSITION_BITS) + int(position))
+                      for score, position in zip(scores[0], positions[0]) if position >= 0]
+        return found
+
+    # (score, chunk id) of the best candidates from the main segment, with exact scores
+    def _search_main(self, query, allowed, counts, delta_ids, k):
+        with self.lock:
+            main, excluded = self.main, self.excluded
+        if main is None or not main.ntotal:
+            return []
+        selector = None if excluded is None else excluded[1]
+        if allowed is not None:
+            # Ids of removed documents can be reused by new ones in the delta, so only ask for documents merged here
+            allowed = [document_id for document_id in allowed if document_id not in delta_ids]
+            if not allowed:
+                return []
+            selector = faiss.IDSelectorBatch(np.concatenate(
+                [chunk_ids(document_id, counts[document_id]) for document_id in allowed]))
+        params = None if selector is None else faiss.SearchParametersIVF(sel=selector, nprobe=NPROBE)
+        # The mapped file is never modified, so searching it needs no lock
+        scores, ids = main.search(query[None, :], max(k, RERANK_CANDIDATES), params=params)
+        # Quantized scores only pick the candidates; the order comes from the full vectors
+        rescored = []
+        for chunk_id in ids[0]:
+            if chunk_id < 0:
+                continue
+            document_id, position = split_chunk_id(chunk_id)
+            try:
+                rescored.append((float(self._shard(document_id).reconstruct(position) @ query), int(chunk_id)))
+            except RuntimeError:
+                pass  # Removed meanwhile
+        return rescored
+
+    # (score, chunk id) of the best k chunks added since the last merge, searched exactly
+    def _search_delta(self, query, allowed, counts, delta_ids, k):
+        params = None
+        if allowed is not None:
+            allowed = [document_id for document_id in allowed if document_id in delta_ids]
+            if not allowed:
+                return []
+            selector = faiss.IDSelectorBatch(np.concatenate(
+                [chunk_ids(document_id, counts[document_id]) for document_id in allowed]))
+            params = faiss.SearchParameters(sel=selector)
+        with self.lock:
+            if not self.delta.ntotal:
+                return []
+            scores, ids = self.delta.search(query[None, :], min(k, self.delta.ntotal), params=params)
+        return [(float(score), int(chunk_id)) for score, chunk_id in zip(scores[0], ids[0]) if chunk_id >= 0]
+
+    # Best k chunks for a query vector as dicts (document_id, name, document_hash, position, score, text), best first
+    def search(self, query_vector, k=3, filters=None):
+        query = normalize_rows(np.asarray(query_vector, dtype=np.float32)[None, :])[0]
+        with self.lock:
+            counts, delta_ids = dict(self.chunk_counts), set(self.delta_ids)
+        if not counts:
+            return []
+        allowed = None
+        if filters:
+            allowed = [document_id for document_id in self.document_ids(filters) if document_id in counts]
+            if not allowed:
+                return []
+        if allowed is not None and len(allowed) <= EXACT_SEARCH_DOCUMENTS:
+            found = self._search_shards(query, allowed, k)
+        else:
+            found = (self._search_main(query, allowed, counts, delta_ids, k)
+                     + self._search_delta(query, allowed, counts, delta_ids, k))
+        found.sort(key=lambda hit: (-hit[0], hit[1]))
+        results = []
+        with self.connect() as conn:
+            for score, chunk_id in found[:k]:
+                document_id, position = split_chunk_id(chunk_id)
+                row = conn.execute(
+                    "SELECT documents.name, documents.document_hash, chunks.text FROM chunks "
+                    "JOIN documents ON documents.id = chunks.document_id "
+                    "WHERE chunks.document_id = ? AND chunks.position = ?", (document_id, position)
+                ).fetchone()
+                if row is not None:
+                    results.append({"document_id": document_id, "name": row[0], "document_hash": row[1],
+                                    "position": position, "score": score, "text": row[2]})
+        return results
+
+# Shared corpus for one embeddings model and chunking setup, opened on first use
+def get_corpus(namespace, corpus_dir=CORPUS_DIR):
+    root = os.path.join(corpus_dir, re.sub(r"[^\w.-]", "_", namespace))
+    with _corpora_lock:
+        if root not in _corpora:
+            _corpora[root] = CorpusIndex(root)
+        return _corpora[root]
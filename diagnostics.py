@@ -0,0 +1,49 @@
+import pandas as pd
+import streamlit as st
+from tracing import SAMPLE_RATE, prometheus_text, recent_traces, stage_summary, traces_jsonl
+
+# Traces listed one by one below the per-stage table
+TRACES_SHOWN = 20
+
+# Stages of one trace in start order, indented under their parents
+def trace_frame(trace):
+    depths = []
+    rows = []
+    for record in trace["spans"]:
+        depth = 0 if record["parent"] is None else depths[record["parent"]] + 1
+        depths.append(depth)
+        rows.append({
+            "Stage": " " * depth + record["name"],
+            "Start (ms)": record["start_ms"],
+            "Duration (ms)": record["duration_ms"],
+            "Details": ", ".join(f"{key}={value}" for key, value in record["attributes"].items()),
+            "Error": record["error"] or "",
+        })
+    rows.sort(key=lambda row: row["Start (ms)"])
+    return pd.DataFrame(rows)
+
+def diagnostics_ui():
+    st.write(f"Recent Document Q&A, summarization, PDF and recommendation calls handled by this server "
+             f"process, broken down by stage. {SAMPLE_RATE:.0%} of calls are traced (`TRACE_SAMPLE_RATE`).")
+
+    traces = recent_traces()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Download traces (JSON lines)", traces_jsonl(), "traces.jsonl", "application/jsonl")
+    with col2:
+        st.download_button("Download metrics (Prometheus)", prometheus_text(), "metrics.prom", "text/plain")
+    if not traces:
+        st.info("No traces yet. Use the other pages, then come back here.")
+        return
+
+    st.subheader("Time per Stage")
+    st.dataframe(pd.DataFrame(stage_summary(traces)), hide_index=True)
+
+    st.subheader("Recent Calls")
+    names = sorted({trace["name"] for trace in traces})
+    shown = st.multiselect("Operations", names, default=names)
+    for trace in [trace for trace in traces if trace["name"] in shown][:TRACES_SHOWN]:
+        started = pd.Timestamp(trace["started_at"], unit="s").floor("s")
+        failed = any(record["error"] for record in trace["spans"])
+        with st.expander(f"{'⚠️ ' if failed else ''}{trace['name']} · {trace['duration_ms']:.0f} ms · {started}"):
+            st.dataframe(trace_frame(trace), hide_index=True)
@@ -1,69 +1,145 @@
 import os
-import csv
-import re
-from langchain.chat_models import ChatOpenAI
+import time
+from functools import lru_cache
 from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.vectorstores import FAISS
 from langchain.text_splitter import CharacterTextSplitter
-
-# Log questions and answers into a CSV file
-def log_qa_to_file(question, answer, relevant_text):
-    file_exists = os.path.exists('qa_log.csv')
-    with open('qa_log.csv', mode='a', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow(["Question", "Answer", "Relevant Text"])
-        writer.writerow([question, answer, relevant_text])
-
-# Extract relevant sentences from the document
+import numpy as np
+from text_highlight import highlight_relevant_text
+from bm25 import get_bm25_index
+from corpus_index import get_corpus
+from embedding_cache import CachedEmbeddings, LocalEmbeddings, RateLimiter, content_hash, get_vectorstore
+from llm_cache import get_response_cache, response_key
+from llm_client import TimedStream, get_llm
+from qa_history import get_history
+from tracing import record_span, span, traced
+
+# Chunking settings; they are part of the cache key of a document's index
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+
+# Embedding requests per second allowed towards the provider, shared by all sessions
+EMBEDDING_RATE_LIMITER = RateLimiter(rate=5, burst=5)
+
+# How relevant chunks are found: embeddings + FAISS, BM25 alone (no API calls), or BM25 then an embedding re-rank
+RETRIEVAL_MODES = ("dense", "bm25", "hybrid")
+
+# Chunks passed from the BM25 prefilter to the embedding re-rank in hybrid mode
+PREFILTER_K = 20
+
+# Answers given without asking the LLM when there is no passage to answer from
+NO_DOCUMENTS_ANSWER = "No documents in the library match these filters."
+NO_PASSAGE_ANSWER = "No passage of the document is relevant to this question."
+
+# Pick the embeddings provider; EMBEDDINGS_PROVIDER=local works offline
+def make_embeddings(api_key):
+    if os.getenv("EMBEDDINGS_PROVIDER") == "local":
+        # Computed in-process, so there is no provider to rate limit
+        provider = LocalEmbeddings()
+        return CachedEmbeddings(provider, namespace=provider.model)
+    provider = OpenAIEmbeddings(openai_api_key=api_key)
+    return CachedEmbeddings(provider, namespace=provider.model, rate_limiter=EMBEDDING_RATE_LIMITER)
+
+# Log questions and answers into the Q&A history store
+def log_qa_to_file(question, answer, relevant_text, document_hash=None):
+    get_history().add(question, answer, relevant_text, document_hash)
+
+# Extract relevant sentences from the document, best matches first, with query terms in bold
 def extract_relevant_text(document_text, user_query):
-    keyword = re.escape(user_query.lower())  # Escape special characters in the query
-    sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s', document_text)  # Split into sentences
-
-    # Extract sentences that contain the keyword
-    relevant_sentences = [sentence for sentence in sentences if re.search(r'\b' + keyword + r'\b', sentence.lower())]
-
-    # Highlight the keyword within the relevant sentences
-    highlighted_sentences = [
-        re.sub(r'\b' + keyword + r'\b', lambda match: f"**{match.group(0)}**", sentence, flags=re.IGNORECASE)
-        for sentence in relevant_sentences
-    ]
-
-    # Join all relevant sentences into a single text block
-    return " ".join(highlighted_sentences)
+    return highlight_relevant_text(document_text, user_query)
 
-# Query the document and return the answer and relevant text
-def query_document(document_text, user_query):
-    api_key = os.getenv("OPENAI_API_KEY", "ADD-OPENAI-API-KEY-HERE") 
-
-    # Step 1: Split the document into manageable chunks
+# Split a document into the chunks that are indexed and retrieved, once per distinct text
+@lru_cache(maxsize=8)
+def split_document(document_text):
     text_splitter = CharacterTextSplitter(
         separator="\n",
-        chunk_size=500,  # Split into focused chunks
-        chunk_overlap=100
+        chunk_size=CHUNK_SIZE,  # Split into focused chunks
+        chunk_overlap=CHUNK_OVERLAP
     )
-    texts = text_splitter.split_text(document_text)
+    return tuple(text_splitter.split_text(document_text))
+
+# Embed every chunk into a FAISS index (cached per document) and return the k nearest chunks
+def retrieve_dense(texts, document_text, user_query, embeddings, k=3):
+    index_key = content_hash(f"{embeddings.namespace}|{CHUNK_SIZE}|{CHUNK_OVERLAP}|{document_text}")
+    # Embedding the chunks and building FAISS, or loading the cached index
+    with span("qa.index", chunks=len(texts)):
+        vectorstore = get_vectorstore(texts, embeddings, index_key)
+    with span("qa.search"):
+        retriever = vectorstore.as_retriever(search_kwargs={"k": k})
+        return [doc.page_content for doc in retriever.get_relevant_documents(user_query)]
+
+# Best k chunks by BM25 over an in-memory inverted index; no embedding calls
+def retrieve_bm25(texts, document_text, user_query, k=3):
+    with span("qa.bm25", chunks=len(texts)):
+        index = get_bm25_index(texts, content_hash(f"bm25|{CHUNK_SIZE}|{CHUNK_OVERLAP}|{document_text}"))
+        return [texts[position] for position, _ in index.search(user_query, k)]
+
+# Order candidate chunks by cosine similarity of their embeddings to the query; only the candidates are embedded
+@traced("qa.rerank")
+def rerank_dense(candidates, user_query, embeddings, k=3):
+    vectors = np.asarray(embeddings.embed_documents(candidates), dtype=np.float32)
+    query = np.asarray(embeddings.embed_query(user_query), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+    similarity = vectors @ query / np.where(norms == 0, 1.0, norms)
+    order = np.argsort(-similarity, kind="stable")[:k]
+    return [candidates[i] for i in order]
+
+# The k chunks most relevant to the query, using one of RETRIEVAL_MODES
+def retrieve_chunks(document_text, user_query, mode="dense", k=3, api_key=None):
+    """
+    In hybrid mode BM25 narrows the document to PREFILTER_K candidates and only
+    those are embedded and re-ranked; when no chunk shares a term with the
+    query it falls back to the dense search over all chunks.
+    """
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {RETRIEVAL_MODES}")
+    with span("qa.split"):
+        texts = split_document(document_text)
+    if mode == "bm25":
+        return retrieve_bm25(texts, document_text, user_query, k)
+    embeddings = make_embeddings(api_key)
+    if mode == "hybrid":
+        candidates = retrieve_bm25(texts, document_text, user_query, PREFILTER_K)
+        if candidates:
+            return rerank_dense(candidates, user_query, embeddings, k)
+    return retrieve_dense(texts, document_text, user_query, embeddings, k)
+
+# Query the document and stream the answer; returns (answer pieces, relevant text, whether the answer is cached)
+def query_document_stream(document_text, user_query, retrieval="dense"):
+    """
+    The answer pieces are a TimedStream: iterate it to render the answer as it
+    arrives, then read first_token_seconds and total_seconds (measured from
+    this call). Once the answer is complete it is cached and logged.
+    retrieval is one of RETRIEVAL_MODES. When no chunk is found (in bm25 mode,
+    none shares a term with the question) the answer is NO_PASSAGE_ANSWER and
+    nothing is sent to the LLM or logged.
+    """
+    start = time.perf_counter()
+    api_key = os.getenv("OPENAI_API_KEY", "ADD-OPENAI-API-KEY-HERE") 
 
-    # Step 2: Embed the document chunks
-    embeddings = OpenAIEmbeddings(openai_api_key=api_key)
-    vectorstore = FAISS.from_texts(texts, embeddings)
+    # Steps 1-3: Split the document into chunks and retrieve the most relevant ones for the query
+    with span("qa.retrieve", mode=retrieval):
+        relevant_docs = retrieve_chunks(document_text, user_query, retrieval, k=3, api_key=api_key)
+    if not relevant_docs:
+        return fixed_answer(NO_PASSAGE_ANSWER, start), "", False
 
-    # Step 3: Retrieve the most relevant chunks for the query
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-    relevant_docs = retriever.get_relevant_documents(user_query)
+    # Steps 4-5: highlight the relevant text and stream an answer from it
+    return stream_answer(user_query, relevant_docs, content_hash(document_text), api_key, start)
+
+# Highlight the retrieved chunks and stream an answer from them; returns (answer pieces, relevant text, cached)
+def stream_answer(user_query, relevant_docs, document_hash, api_key=None, start=None):
+    start = time.perf_counter() if start is None else start
 
     # Combine relevant chunks into a single text
-    relevant_text_from_docs = " ".join([doc.page_content for doc in relevant_docs])
+    relevant_text_from_docs = " ".join(relevant_docs)
 
     # Step 4: Extract relevant text with highlighted keywords
-    highlighted_relevant_text = extract_relevant_text(relevant_text_from_docs, user_query)
+    with span("qa.highlight"):
+        highlighted_relevant_text = extract_relevant_text(relevant_text_from_docs, user_query)
 
     # Step 5: Generate an answer based on the highlighted relevant text
-    chat_model = ChatOpenAI(
-        model="gpt-3.5-turbo",
-        temperature=0,
-        openai_api_key=api_key,
-    )
+    llm = get_llm(api_key)
+    model = "gpt-3.5-turbo"
+    temperature = 0
 
     prompt_template = """
     You are a helpful AI assistant answering questions based on the provided context. 
@@ -77,11 +153,82 @@ def query_document(document_text, user_query):
     """
     prompt = prompt_template.format(context=relevant_text_from_docs, query=user_query)
 
-    # Generate the answer using the LLM
-    answer = chat_model.predict(prompt)
-
-    # Log the results
-    log_qa_to_file(user_query, answer, relevant_text_from_docs)
+    # Stream the answer from the LLM, unless this question was answered from the same context before
+    key = response_key(f"{llm.provider}:{model}", temperature, document_hash,
+                       content_hash(relevant_text_from_docs), prompt)
+    generate_start = time.perf_counter()
+    pieces, cached = get_response_cache().get_or_stream(
+        key,
+        lambda: llm.stream([{"role": "user", "content": prompt}], model=model, temperature=temperature),
+        namespace="qa",
+    )
 
-    # Return the answer and the relevant text
-    return answer.strip(), relevant_text_from_docs.strip()
+    # Log the results once the whole answer has arrived
+    def on_complete(text):
+        record_span("qa.generate", time.perf_counter() - generate_start, cached=cached, provider=llm.provider,
+                    first_token_ms=round(answer.first_token_seconds * 1000, 1))
+        with span("qa.log"):
+            log_qa_to_file(user_query, text, relevant_text_from_docs, document_hash)
+
+    answer = TimedStream(pieces, on_complete=on_complete, start=start)
+
+    # Return the answer and the relevant text, highlighted when any query term was found
+    return answer, (highlighted_relevant_text or relevant_text_from_docs).strip(), cached
+
+# A fixed answer, streamed like the LLM's, for questions that are never sent to it
+def fixed_answer(text, start=None):
+    return TimedStream(iter([text]), start=start)
+
+# Query the document and return the answer and the relevant text; query_document_stream also reports cache hits
+def query_document(document_text, user_query, retrieval="dense"):
+    with span("query_document", retrieval=retrieval):
+        answer, relevant_text, _ = query_document_stream(document_text, user_query, retrieval)
+        return "".join(answer).strip(), relevant_text
+
+# The persistent multi-document corpus for the current embeddings model and chunking settings
+def get_library(api_key=None):
+    api_key = api_key or os.getenv("OPENAI_API_KEY", "ADD-OPENAI-API-KEY-HERE")
+    return get_corpus(f"{make_embeddings(api_key).namespace}-{CHUNK_SIZE}-{CHUNK_OVERLAP}")
+
+# Split, embed and index a document into the corpus; returns its id there (unchanged if already indexed)
+def add_to_corpus(document_text, name, metadata=None, api_key=None):
+    api_key = api_key or os.getenv("OPENAI_API_KEY", "ADD-OPENAI-API-KEY-HERE")
+    embeddings = make_embeddings(api_key)
+    corpus = get_library(api_key)
+    document_hash = content_hash(document_text)
+    document_id = corpus.find(document_hash)
+    if document_id is not None:
+        return document_id
+    with span("corpus.add", document=name) as current:
+        texts = split_document(document_text)
+        current.set(chunks=len(texts))
+        # Chunks embedded before, for single-document questions, come from the embedding cache
+        vectors = embeddings.embed_documents(list(texts))
+        return corpus.add(document_hash, name, texts, vectors, metadata)
+
+# Query every document in the corpus matching the metadata filters and stream the answer
+def query_corpus_stream(user_query, filters=None, k=3):
+    """
+    Returns (answer pieces, relevant text, cached, hits); hits are the chunks
+    the answer is based on, with the name of the document each came from.
+    The question is logged under the document of the best hit. When the
+    filters match no document, the answer is NO_DOCUMENTS_ANSWER and nothing is
+    sent to the LLM or logged.
+    """
+    start = time.perf_counter()
+    api_key = os.getenv("OPENAI_API_KEY", "ADD-OPENAI-API-KEY-HERE")
+    embeddings = make_embeddings(api_key)
+    with span("qa.retrieve", mode="corpus") as current:
+        hits = get_library(api_key).search(embeddings.embed_query(user_query), k, filters)
+        current.set(documents=len({hit["document_id"] for hit in hits}))
+    if not hits:
+        # Nothing to answer from: neither the LLM nor the history sees the question
+        return fixed_answer(NO_DOCUMENTS_ANSWER, start), "", False, hits
+    answer, relevant_text, cached = stream_answer(user_query, [hit["text"] for hit in hits], hits[0]["document_hash"],
+                                                  api_key, start)
+    return answer, relevant_text, cached, hits
+
+def query_corpus(user_query, filters=None, k=3):
+    with span("query_corpus"):
+        answer, relevant_text, cached, hits = query_corpus_stream(user_query, filters, k)
+        return "".join(answer).strip(), relevant_text, cached, hits
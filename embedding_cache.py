@@ -0,0 +1,265 @@
+import os
+import re
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain.vectorstores import FAISS
+
+# Where chunk embeddings and built FAISS indexes are kept
+CACHE_DIR = "embedding_cache"
+
+# Upper bound on the disk space used by saved FAISS indexes
+MAX_INDEX_CACHE_MB = 512
+
+# Built vector stores kept in memory for follow-up questions
+MAX_LOADED_INDEXES = 8
+
+# Batching and concurrency of embedding requests
+BATCH_SIZE = 64
+MAX_BATCH_CHARS = 100_000
+MAX_CONCURRENCY = 4
+MAX_RETRIES = 3
+
+_loaded_indexes = OrderedDict()
+_loaded_lock = threading.Lock()
+
+# Stable hex digest of a piece of text
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingStore:
+    """
+    SQLite table of embedding vectors keyed by chunk content hash. Safe to share
+    between threads; each call opens its own short-lived connection.
+    """
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "embeddings.sqlite")):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        with self.connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # Vectors for the keys that are cached, as a {key: list of floats} dict
+    def get_many(self, keys):
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self.connect() as conn:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, items):
+        with self.connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items],
+            )
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` requests per second with bursts of `burst`.
+    Shared by all threads sending requests to the same provider.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class LocalEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings: hashed bag of words, L2-normalized.
+    Texts sharing words get similar vectors, so retrieval still behaves
+    sensibly. An optional per-request latency simulates a network provider.
+    """
+
+    def __init__(self, size=256, latency=0.0):
+        self.size = size
+        self.latency = latency
+        self.model = f"local-hash-{size}"
+
+    def embed_one(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.size] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.embed_one(text) for text in texts]
+
+    def embed_query(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.embed_one(text)
+
+# Split items into batches bounded by count and by the total characters of their texts
+def make_batches(items, sizes, batch_size=BATCH_SIZE, max_batch_chars=MAX_BATCH_CHARS):
+    batches, batch, chars = [], [], 0
+    for item, size in zip(items, sizes):
+        if batch and (len(batch) >= batch_size or chars + size > max_batch_chars):
+            batches.append(batch)
+            batch, chars = [], 0
+        batch.append(item)
+        chars += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model so document chunks are only embedded once per
+    model: chunks already in the store are read back instead of re-requested.
+    Missing chunks are deduplicated and sent in size-bounded batches across a
+    small thread pool. Each batch is stored as soon as it returns, so a run that
+    fails part way resumes where it stopped.
+    """
+
+    def __init__(self, embeddings, store=None, namespace="default", batch_size=BATCH_SIZE,
+                 max_batch_chars=MAX_BATCH_CHARS, max_concurrency=MAX_CONCURRENCY,
+                 rate_limiter=None, max_retries=MAX_RETRIES):
+        self.embeddings = embeddings
+        self.store = store or EmbeddingStore()
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.max_batch_chars = max_batch_chars
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+
+    def key(self, text):
+        return content_hash(self.namespace + "\0" + text)
+
+    # Embed and store one batch, retrying with exponential backoff
+    def embed_batch(self, keys, texts):
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                break
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+        items = list(zip(keys, vectors))
+        self.store.put_many(items)
+        return items
+
+    def embed_documents(self, texts):
+        keys = [self.key(text) for text in texts]
+        cached = self.store.get_many(keys)
+        text_by_key = dict(zip(keys, texts))
+        missing = [key for key in dict.fromkeys(keys) if key not in cached]
+        if missing:
+            sizes = [len(text_by_key[key]) for key in missing]
+            batches = make_batches(missing, sizes, self.batch_size, self.max_batch_chars)
+            if self.max_concurrency <= 1 or len(batches) == 1:
+                for batch in batches:
+                    cached.update(self.embed_batch(batch, [text_by_key[key] for key in batch]))
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                    futures = [
+                        executor.submit(self.embed_batch, batch, [text_by_key[key] for key in batch])
+                        for batch in batches
+                    ]
+                    for future in as_completed(futures):
+                        cached.update(future.result())
+        return [list(cached[key]) for key in keys]
+
+    def embed_query(self, text):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        return self.embeddings.embed_query(text)
+
+# Total size of a directory tree in bytes
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path) for name in names
+    )
+
+# Remove least recently used saved indexes until they fit in the size budget
+def evict_indexes(index_root, max_bytes):
+    if not os.path.isdir(index_root):
+        return
+    entries = []
+    for name in os.listdir(index_root):
+        path = os.path.join(index_root, name)
+        if os.path.isdir(path):
+            entries.append((os.path.getmtime(path), directory_size(path), path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+# Return a FAISS store for a document, from memory, from disk or built from cached chunk embeddings
+def get_vectorstore(texts, embeddings, index_key, cache_dir=CACHE_DIR, max_index_mb=MAX_INDEX_CACHE_MB):
+    """
+    index_key must identify the document and everything that shaped its chunks
+    and vectors (splitter settings, embedding model).
+    """
+    with _loaded_lock:
+        if index_key in _loaded_indexes:
+            _loaded_indexes.move_to_end(index_key)
+            return _loaded_indexes[index_key]
+
+    index_root = os.path.join(cache_dir, "faiss")
+    path = os.path.join(index_root, index_key)
+    vectorstore = None
+    if os.path.exists(os.path.join(path, "index.faiss")):
+        try:
+            vectorstore = FAISS.load_local(path, embeddings)
+            os.utime(path)  # Mark as recently used for eviction
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+    if vectorstore is None:
+        # Unchanged chunks come from the embedding cache, only new ones are embedded
+        vectors = embeddings.embed_documents(texts)
+        vectorstore = FAISS.from_embeddings(list(zip(texts, vectors)), embeddings)
+        temp_path = f"{path}.{os.getpid()}.{time.time_ns()}.tmp"
+        vectorstore.save_local(temp_path)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temp_path, path)
+        evict_indexes(index_root, max_index_mb * 2**20)
+
+    with _loaded_lock:
+        _loaded_indexes[index_key] = vectorstore
+        while len(_loaded_indexes) > MAX_LOADED_INDEXES:
+            _loaded_indexes.popitem(last=False)
+    return vectorstore
@@ -1,5 +1,78 @@
+import math
+import threading
 import streamlit as st
-import time
+from timer_engine import TimerStore, new_timer, new_timer_id, pause, start, timer_status, elapsed
+
+_store = None
+_store_lock = threading.Lock()
+
+# Shared store of saved timers, opened on first use
+def get_timer_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TimerStore()
+        return _store
+
+def format_remaining(seconds):
+    minutes, seconds = divmod(math.ceil(seconds), 60)
+    return f"{int(minutes):02}:{int(seconds):02}"
+
+# This browser's timer: its id lives in the page URL, so a reload or reconnect finds the saved state
+def load_timer():
+    timer_id = st.query_params.get("timer")
+    if not timer_id:
+        timer_id = new_timer_id()
+        st.query_params["timer"] = timer_id
+    if st.session_state.get("timer_id") != timer_id:
+        st.session_state.timer_id = timer_id
+        st.session_state.timer = get_timer_store().load(timer_id)
+    return st.session_state.timer
+
+def save_timer(timer):
+    st.session_state.timer = timer
+    get_timer_store().save(st.session_state.timer_id, timer)
+
+# Button callbacks run before the page is redrawn, so the controls always match the new state
+def start_timer(settings):
+    save_timer(start(new_timer(*settings)))
+
+def stop_timer():
+    save_timer(pause(st.session_state.timer))
+
+def resume_timer():
+    save_timer(start(st.session_state.timer))
+
+def reset_timer():
+    st.session_state.timer = None
+    get_timer_store().delete(st.session_state.timer_id)
+
+# Countdown, redrawn every second by a partial rerun while the timer runs; nothing sleeps on the server
+def show_countdown(total_sessions):
+    timer = st.session_state.timer
+    status = timer_status(timer) if timer else None
+
+    if status is None:
+        st.markdown("### Session 1")
+        st.markdown("<h1 style='text-align: center; font-size: 80px;'>--:--</h1>", unsafe_allow_html=True)
+    else:
+        st.markdown(f"### {'Session ' + str(status['current_session']) if status['mode'] == 'Focus' else status['mode']}")
+        st.markdown(
+            f"<h1 style='text-align: center; font-size: 80px;'>{format_remaining(status['remaining'])}</h1>",
+            unsafe_allow_html=True,
+        )
+        if status["finished"] and timer["running"]:
+            # Stop the periodic refresh and redraw the whole page once
+            save_timer(pause(timer))
+            st.rerun(scope="app")
+
+    # Today's Progress Section
+    st.markdown("### Today's Progress")
+    total = timer["total_sessions"] if timer else total_sessions
+    completed_sessions = status["sessions_completed"] if status else 0
+    progress_icon = "🍅" * completed_sessions
+    remaining_icon = "🍅" * (total - completed_sessions)
+    st.write(f"{progress_icon}{remaining_icon} ({completed_sessions}/{total} sessions)")
 
 # Function to handle the focus timer and progress logging
 def focus_timer():
@@ -10,98 +83,31 @@ def focus_timer():
     short_break = st.number_input("Short Break (minutes):", min_value=1, max_value=30, value=5)
     long_break = st.number_input("Long Break (minutes):", min_value=1, max_value=60, value=15)
     total_sessions = st.number_input("Number of Sessions:", min_value=1, max_value=10, value=3)
+    settings = (work_duration, short_break, long_break, total_sessions)
 
-    # Initialize session states
-    if "timer_running" not in st.session_state:
-        st.session_state.timer_running = False
-    if "mode" not in st.session_state:
-        st.session_state.mode = "Focus"
-    if "remaining_time" not in st.session_state:
-        st.session_state.remaining_time = work_duration * 60
-    if "sessions_completed" not in st.session_state:
-        st.session_state.sessions_completed = 0
-    if "current_session" not in st.session_state:
-        st.session_state.current_session = 1
-    if "paused_time" not in st.session_state:
-        st.session_state.paused_time = 0
+    timer = load_timer()
+    finished = timer is not None and timer_status(timer)["finished"]
+    paused = timer is not None and not timer["running"] and not finished and elapsed(timer) > 0
 
     # Timer Controls
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        if not st.session_state.timer_running and st.button("Start Timer"):
-            st.session_state.timer_running = True
-            st.session_state.remaining_time = (
-                work_duration * 60 if st.session_state.mode == "Focus" else
-                short_break * 60 if st.session_state.mode == "Short Break" else
-                long_break * 60
-            )
-            st.session_state.paused_time = 0
-
+        if timer is None or finished:
+            st.button("Start Timer", on_click=start_timer, args=(settings,))
     with col2:
-        if st.session_state.timer_running and st.button("Stop Timer"):
-            st.session_state.timer_running = False
-            st.session_state.paused_time = st.session_state.remaining_time
-
-        elif not st.session_state.timer_running and st.session_state.paused_time > 0 and st.button("Resume Timer"):
-            st.session_state.timer_running = True
-
+        if timer is not None and timer["running"]:
+            st.button("Stop Timer", on_click=stop_timer)
+        elif paused:
+            st.button("Resume Timer", on_click=resume_timer)
     with col3:
-        if st.button("Reset Timer"):
-            st.session_state.timer_running = False
-            st.session_state.mode = "Focus"
-            st.session_state.remaining_time = work_duration * 60
-            st.session_state.sessions_completed = 0
-            st.session_state.current_session = 1
-            st.session_state.paused_time = 0
-
-    # Timer Header
-    header_placeholder = st.empty()
-    timer_placeholder = st.empty()
-
-    # Timer Logic
-    if st.session_state.timer_running:
-        while st.session_state.timer_running and st.session_state.remaining_time > 0:
-            minutes, seconds = divmod(st.session_state.remaining_time, 60)
-            header_placeholder.markdown(
-                f"### {'Session ' + str(st.session_state.current_session) if st.session_state.mode == 'Focus' else st.session_state.mode}"
-            )
-            timer_placeholder.markdown(
-                f"<h1 style='text-align: center; font-size: 80px;'>{int(minutes):02}:{int(seconds):02}</h1>",
-                unsafe_allow_html=True,
-            )
-            time.sleep(1)
-            st.session_state.remaining_time -= 1
-
-        if st.session_state.remaining_time <= 0:
-            # Transition logic
-            if st.session_state.mode == "Focus":
-                st.session_state.sessions_completed += 1
-                if st.session_state.current_session < total_sessions:
-                    st.session_state.mode = "Short Break"
-                    st.session_state.remaining_time = short_break * 60
-                else:
-                    st.session_state.mode = "Long Break"
-                    st.session_state.remaining_time = long_break * 60
-            elif st.session_state.mode == "Short Break":
-                st.session_state.mode = "Focus"
-                st.session_state.current_session += 1
-                st.session_state.remaining_time = work_duration * 60
-            elif st.session_state.mode == "Long Break":
-                st.session_state.timer_running = False
-                st.success("🎉 All Sessions Completed!")
-                st.balloons()
-
-    # Display Timer in Paused State
-    if not st.session_state.timer_running and st.session_state.paused_time > 0:
-        minutes, seconds = divmod(st.session_state.paused_time, 60)
-        timer_placeholder.markdown(
-            f"<h1 style='text-align: center; font-size: 80px;'>{int(minutes):02}:{int(seconds):02}</h1>",
-            unsafe_allow_html=True,
-        )
+        st.button("Reset Timer", on_click=reset_timer)
 
-    # Today's Progress Section
-    st.markdown("### Today's Progress")
-    completed_sessions = st.session_state.sessions_completed
-    progress_icon = "🍅" * completed_sessions
-    remaining_icon = "🍅" * (total_sessions - completed_sessions)
-    st.write(f"{progress_icon}{remaining_icon} ({completed_sessions}/{total_sessions} sessions)")
+    running = timer is not None and timer["running"]
+    st.fragment(show_countdown, run_every=1 if running else None)(total_sessions)
+
+    if finished:
+        st.success("🎉 All Sessions Completed!")
+        if not timer.get("celebrated"):
+            timer["celebrated"] = True
+            save_timer(timer)
+            st.balloons()
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Where LLM answers and summaries are kept between runs
+CACHE_DIR = "llm_cache"
+
+# Cached responses older than this are treated as missing and removed
+RESPONSE_TTL_SECONDS = 30 * 24 * 3600
+
+# Upper bound on the stored response text; least recently used entries go first
+MAX_RESPONSE_CACHE_MB = 64
+
+# Key of one LLM request: everything that can change its answer
+def response_key(model, temperature, document_hash, context_hash, prompt, max_tokens=None):
+    parts = [model, repr(float(temperature)), document_hash, context_hash, prompt, repr(max_tokens)]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    SQLite store of LLM responses with a time to live and a size bound.
+    Hits and misses are counted per namespace (e.g. "qa", "summary") in the
+    same database, so hit rates cover every session and restart. Safe to
+    share between threads; each call opens its own short-lived connection.
+    """
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "responses.sqlite"),
+                 ttl=RESPONSE_TTL_SECONDS, max_mb=MAX_RESPONSE_CACHE_MB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 2**20)
+        self.lock = threading.Lock()
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, namespace TEXT NOT NULL, "
+                "response TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (namespace TEXT PRIMARY KEY, "
+                "hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def count(self, conn, namespace, hit):
+        column = "hits" if hit else "misses"
+        conn.execute("INSERT OR IGNORE INTO stats (namespace) VALUES (?)", (namespace,))
+        conn.execute(f"UPDATE stats SET {column} = {column} + 1 WHERE namespace = ?", (namespace,))
+
+    # Cached response for a key, or None when missing or expired
+    def get(self, key, namespace="default"):
+        now = time.time()
+        with self.connect() as conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.count(conn, namespace, row is not None)
+        return None if row is None else row[0]
+
+    def put(self, key, response, namespace="default"):
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, namespace, response, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, namespace, response, len(response.encode("utf-8")), now, now),
+            )
+        self.evict()
+
+    # Drop expired entries, then least recently used ones until the store fits its size bound
+    def evict(self):
+        with self.lock, self.connect() as conn:
+            conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            removed = []
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                if total <= self.max_bytes * 0.9:
+                    break
+                removed.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM responses WHERE key = ?", removed)
+
+    # Cached response, or the result of call() stored for next time; returns (response, cache hit)
+    def get_or_call(self, key, call, namespace="default"):
+        cached = self.get(key, namespace)
+        if cached is not None:
+            return cached, True
+        response = call()
+        self.put(key, response, namespace)
+        return response, False
+
+    # Streaming variant: the cached response as one piece, or stream()'s pieces, stored once the stream completes
+    def get_or_stream(self, key, stream, namespace="default"):
+        cached = self.get(key, namespace)
+        if cached is not None:
+            return iter([cached]), True
+        source = stream()
+
+        def pieces():
+            parts = []
+            for piece in source:
+                parts.append(piece)
+                yield piece
+            self.put(key, "".join(parts), namespace)
+        return pieces(), False
+
+    # Hits, misses and hit rate per namespace, plus the size of the store
+    def stats(self):
+        with self.connect() as conn:
+            rows = conn.execute("SELECT namespace, hits, misses FROM stats ORDER BY namespace").fetchall()
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        namespaces = {
+            namespace: {"hits": hits, "misses": misses,
+                        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0}
+            for namespace, hits, misses in rows
+        }
+        return {"namespaces": namespaces, "entries": entries, "size_mb": round(size / 2**20, 3)}
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+# Process-wide response cache, opened on first use
+def get_response_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
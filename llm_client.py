@@ -0,0 +1,123 @@
+import os
+import re
+import time
+import threading
+import openai
+
+# Chat model used by the summarizer
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+class OpenAIChat:
+    """
+    Chat completions through the OpenAI API. api_key and api_base default to
+    the openai module settings (OPENAI_API_KEY / OPENAI_API_BASE).
+    """
+
+    provider = "openai"
+
+    def __init__(self, api_key=None, api_base=None):
+        self.api_key = api_key
+        self.api_base = api_base
+
+    def request(self, messages, model, max_tokens, temperature, stream=False):
+        options = {"api_key": self.api_key} if self.api_key else {}
+        if self.api_base:
+            options["api_base"] = self.api_base
+        return openai.ChatCompletion.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            n=1,
+            stop=None,
+            stream=stream,
+            **options,
+        )
+
+    def complete(self, messages, model=DEFAULT_MODEL, max_tokens=None, temperature=0.5):
+        response = self.request(messages, model, max_tokens, temperature)
+        return response.choices[0].message['content'].strip()
+
+    # Yield the completion piece by piece as the API sends it
+    def stream(self, messages, model=DEFAULT_MODEL, max_tokens=None, temperature=0.5):
+        for chunk in self.request(messages, model, max_tokens, temperature, stream=True):
+            content = chunk.choices[0].delta.get("content") if chunk.choices else None
+            if content:
+                yield content
+
+# Words the offline stand-ins answer with: the start of the last message after its instruction line
+def mock_reply(messages, max_tokens=None):
+    body = messages[-1]["content"].split("\n\n", 1)[-1]
+    limit = max(1, int((max_tokens or 256) * 0.75))
+    return re.findall(r"\S+", body)[:limit]
+
+class MockLLM:
+    """
+    Deterministic local stand-in for the chat API, for tests and offline runs.
+    It answers with the first words of the last user message after its
+    instruction line, truncated to roughly max_tokens, after an optional
+    simulated latency. When streaming, each word after the first takes
+    token_delay seconds.
+    """
+
+    provider = "mock"
+
+    def __init__(self, latency=0.0, token_delay=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def complete(self, messages, model=DEFAULT_MODEL, max_tokens=None, temperature=0.5):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return " ".join(mock_reply(messages, max_tokens))
+
+    def stream(self, messages, model=DEFAULT_MODEL, max_tokens=None, temperature=0.5):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        for position, word in enumerate(mock_reply(messages, max_tokens)):
+            if position and self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if position == 0 else " " + word
+
+class TimedStream:
+    """
+    Wraps a stream of text pieces, recording the time to the first piece and
+    to the end of the stream, measured from `start` (default: when iteration
+    begins). Once the stream is exhausted the full text is available as
+    `text` and is passed to on_complete.
+    """
+
+    def __init__(self, pieces, on_complete=None, start=None):
+        self.pieces = pieces
+        self.on_complete = on_complete
+        self.start = start
+        self.first_token_seconds = None
+        self.total_seconds = None
+        self.text = None
+
+    def __iter__(self):
+        start = self.start if self.start is not None else time.perf_counter()
+        parts = []
+        for piece in self.pieces:
+            if self.first_token_seconds is None:
+                self.first_token_seconds = time.perf_counter() - start
+            parts.append(piece)
+            yield piece
+        self.total_seconds = time.perf_counter() - start
+        if self.first_token_seconds is None:
+            self.first_token_seconds = self.total_seconds
+        self.text = "".join(parts)
+        if self.on_complete is not None:
+            self.on_complete(self.text)
+
+# Pick the chat backend; LLM_PROVIDER=mock runs everything offline
+def get_llm(api_key=None):
+    if os.getenv("LLM_PROVIDER") == "mock":
+        return MockLLM()
+    return OpenAIChat(api_key=api_key)
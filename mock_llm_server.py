@@ -0,0 +1,93 @@
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from llm_client import mock_reply
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /v1/chat/completions like the OpenAI API, with the same
+    replies as MockLLM. Streaming requests get server-sent events, one word
+    per event; the delays come from the server's first_token_delay and
+    token_delay attributes.
+    """
+
+    protocol_version = "HTTP/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        words = mock_reply(request.get("messages", [{"content": ""}]), request.get("max_tokens"))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get("model", "mock")
+        time.sleep(self.server.first_token_delay)
+
+        if not request.get("stream"):
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay * max(len(words) - 1, 0))
+            self.send_json({
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        self.send_event({**chunk, "choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]})
+        for position, word in enumerate(words):
+            if position and self.server.token_delay:
+                time.sleep(self.server.token_delay)
+            content = word if position == 0 else " " + word
+            self.send_event({**chunk, "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]})
+        self.send_event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+# Start the stand-in API on a background thread; returns the server and its API base URL
+def serve(port=0, first_token_delay=0.3, token_delay=0.02, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), MockChatHandler)
+    server.daemon_threads = True
+    server.first_token_delay = first_token_delay
+    server.token_delay = token_delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat completions API.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="seconds before the first word")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between words")
+    args = parser.parse_args()
+    server, api_base = serve(args.port, args.first_token_delay, args.token_delay)
+    print(f"Serving mock chat completions at {api_base} (set OPENAI_API_BASE to use it)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
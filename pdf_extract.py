@@ -0,0 +1,186 @@
+import io
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from PyPDF2 import PdfReader
+from text_cleaning import TextCleaner, iter_clean_text
+from tracing import span
+
+# Where extracted page texts are cached, one JSON file per PDF content hash
+CACHE_DIR = "pdf_cache"
+
+# Documents kept in memory so Streamlit reruns never touch the disk cache
+MAX_CACHED_DOCUMENTS = 8
+
+# Documents with fewer pages are extracted in-process; the pool is not worth it
+PARALLEL_MIN_PAGES = 40
+
+# Pages handed to a worker at a time
+PAGES_PER_TASK = 16
+
+_memory_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+_worker_reader = None  # (path, PdfReader) of the document a worker process is extracting
+
+# Raw bytes of an uploaded file, a path or a binary file object
+def read_pdf_bytes(source):
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as file:
+            return file.read()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+def pdf_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def count_pages(data):
+    return len(PdfReader(io.BytesIO(data)).pages)
+
+# Extract a range of pages from a PDF file (runs in worker processes, parsing each file once per worker)
+def extract_page_range(path, start, stop):
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != path:
+        with open(path, "rb") as file:
+            _worker_reader = (path, PdfReader(io.BytesIO(file.read())))
+    reader = _worker_reader[1]
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+# Shared worker pool, started on first use; spawn avoids forking the threaded server
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=max(1, (os.cpu_count() or 2) - 1),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+def cache_path(digest, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, digest + ".json")
+
+def load_cached_pages(digest, cache_dir=CACHE_DIR):
+    with _cache_lock:
+        if digest in _memory_cache:
+            _memory_cache.move_to_end(digest)
+            return _memory_cache[digest]
+    try:
+        with open(cache_path(digest, cache_dir), encoding="utf-8") as file:
+            pages = json.load(file)
+    except (OSError, ValueError):
+        return None
+    remember_pages(digest, pages)
+    return pages
+
+def remember_pages(digest, pages):
+    with _cache_lock:
+        _memory_cache[digest] = pages
+        _memory_cache.move_to_end(digest)
+        while len(_memory_cache) > MAX_CACHED_DOCUMENTS:
+            _memory_cache.popitem(last=False)
+
+def save_pages(digest, pages, cache_dir=CACHE_DIR):
+    remember_pages(digest, pages)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = f"{cache_path(digest, cache_dir)}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(pages, file)
+        os.replace(temp_path, cache_path(digest, cache_dir))
+    except OSError:
+        pass  # The in-memory copy still serves this process
+
+# Yield the text of each page in order, as soon as it is available
+def iter_pages(source, parallel=True, cache_dir=CACHE_DIR, digest=None):
+    """
+    Pages come from the cache when this PDF was extracted before. Otherwise
+    large documents are extracted in page ranges on a process pool; the first
+    range is yielded while later ones are still being extracted. The PDF is
+    written once to a temporary file that the workers read, instead of being
+    sent with every range. Pass digest when the caller already hashed the PDF.
+    """
+    data = read_pdf_bytes(source)
+    digest = digest or pdf_hash(data)
+    cached = load_cached_pages(digest, cache_dir)
+    if cached is not None:
+        yield from cached
+        return
+
+    pages = []
+    reader = PdfReader(io.BytesIO(data))
+    total = len(reader.pages)
+    if not parallel or total < PARALLEL_MIN_PAGES or (os.cpu_count() or 1) < 2:
+        for page in reader.pages:
+            pages.append(page.extract_text() or "")
+            yield pages[-1]
+    else:
+        executor = get_executor()
+        handle, path = tempfile.mkstemp(suffix=".pdf")
+        futures = []
+        try:
+            with os.fdopen(handle, "wb") as file:
+                file.write(data)
+            futures = [
+                executor.submit(extract_page_range, path, start, min(start + PAGES_PER_TASK, total))
+                for start in range(0, total, PAGES_PER_TASK)
+            ]
+            for future in futures:
+                for text in future.result():
+                    pages.append(text)
+                    yield text
+        finally:
+            for future in futures:
+                future.cancel()
+            os.remove(path)
+    save_pages(digest, pages, cache_dir)
+
+# Extract the full text of a PDF
+def extract_text(source, parallel=True):
+    with span("pdf.extract") as current:
+        pages = list(iter_pages(source, parallel))
+        current.set(pages=len(pages))
+        return "".join(pages)
+
+# Extract and clean a PDF inside a Streamlit page, previewing the first pages while the rest is extracted
+def extract_clean_text_with_preview(uploaded_file, preview_pages=3):
+    import streamlit as st  # Imported here so worker processes stay light
+
+    data = read_pdf_bytes(uploaded_file)
+    digest = pdf_hash(data)
+    cached = load_cached_pages(digest)
+    if cached is not None:
+        return "".join(iter_clean_text(cached))
+
+    # Only real extractions are traced; cache hits happen on every rerun
+    with span("pdf.extract_clean") as current:
+        total = count_pages(data)
+        if total == 0:
+            return ""
+        current.set(pages=total)
+        preview = st.empty()
+        progress = st.progress(0.0, text=f"Extracting {total} pages...")
+        cleaner = TextCleaner()
+        cleaned = []
+        for page_number, text in enumerate(iter_pages(data, digest=digest), start=1):
+            cleaned.append(cleaner.feed(text))
+            if page_number == preview_pages and page_number < total:
+                with preview.container():
+                    st.caption(f"Preview of the first {preview_pages} pages")
+                    st.write("".join(cleaned))
+            if page_number * 100 // total != (page_number - 1) * 100 // total:
+                progress.progress(page_number / total, text=f"Extracted {page_number} of {total} pages")
+        cleaned.append(cleaner.finish())
+        preview.empty()
+        progress.empty()
+        return "".join(cleaned)
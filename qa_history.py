@@ -0,0 +1,110 @@
+import os
+import csv
+import time
+import sqlite3
+import threading
+
+# Database holding every question asked on the Document Q&A page
+HISTORY_PATH = "qa_history.sqlite"
+
+# CSV log written by earlier versions, imported once into the database
+LEGACY_CSV_PATH = "qa_log.csv"
+
+COLUMNS = ("id", "asked_at", "document_hash", "question", "answer", "relevant_text")
+
+class QAHistory:
+    """
+    Q&A history in SQLite using write-ahead logging, so readers never block the
+    writer and concurrent sessions can log at the same time. Rows are indexed
+    by time and by document, and are read newest first, a page at a time.
+    Safe to share between threads; each call opens its own short-lived connection.
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS qa (id INTEGER PRIMARY KEY, asked_at REAL NOT NULL, "
+                "document_hash TEXT, question TEXT NOT NULL, answer TEXT NOT NULL, relevant_text TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS qa_asked_at ON qa (asked_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS qa_document ON qa (document_hash, asked_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS imports (source TEXT PRIMARY KEY, rows INTEGER NOT NULL)")
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def add(self, question, answer, relevant_text, document_hash=None, asked_at=None):
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT INTO qa (asked_at, document_hash, question, answer, relevant_text) VALUES (?, ?, ?, ?, ?)",
+                (time.time() if asked_at is None else asked_at, document_hash, question, answer, relevant_text),
+            )
+
+    def count(self, document_hash=None):
+        with self.connect() as conn:
+            if document_hash is None:
+                return conn.execute("SELECT COUNT(*) FROM qa").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM qa WHERE document_hash = ?", (document_hash,)).fetchone()[0]
+
+    # One page of history, newest first, as a list of dicts
+    def page(self, page=0, page_size=20, document_hash=None):
+        where, params = ("", []) if document_hash is None else ("WHERE document_hash = ?", [document_hash])
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM qa {where} ORDER BY asked_at DESC, id DESC LIMIT ? OFFSET ?",
+                params + [page_size, page * page_size],
+            ).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    # The most recent entries, newest first
+    def tail(self, limit=20, document_hash=None):
+        return self.page(0, limit, document_hash)
+
+    # Import a CSV log from earlier versions; returns the number of rows added
+    def import_csv(self, csv_path=LEGACY_CSV_PATH):
+        """
+        The CSV has no timestamps, so new rows are spread over the second before
+        the file's modification time, in file order. The import records how many
+        rows of the file (by path) were taken, so running it again only adds rows
+        appended since, and touching the file adds nothing.
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        source = os.path.abspath(csv_path)
+        modified = os.stat(csv_path).st_mtime
+        with open(csv_path, newline="", encoding="utf-8") as file:
+            rows = [row for row in csv.DictReader(file)]
+        with self.connect() as conn:
+            # Taken before reading the count, so concurrent imports cannot both add the same rows
+            conn.execute("BEGIN IMMEDIATE")
+            recorded = conn.execute("SELECT rows FROM imports WHERE source = ?", (source,)).fetchone()
+            done = recorded[0] if recorded else 0
+            new_rows = rows[done:]
+            step = 1.0 / max(len(new_rows), 1)
+            conn.executemany(
+                "INSERT INTO qa (asked_at, document_hash, question, answer, relevant_text) VALUES (?, NULL, ?, ?, ?)",
+                [
+                    (modified - 1 + i * step, row.get("Question") or "", row.get("Answer") or "",
+                     row.get("Relevant Text") or "")
+                    for i, row in enumerate(new_rows)
+                ],
+            )
+            conn.execute("INSERT OR REPLACE INTO imports (source, rows) VALUES (?, ?)", (source, max(done, len(rows))))
+        return len(new_rows)
+
+_default_history = None
+_default_lock = threading.Lock()
+
+# Process-wide history store; the legacy CSV log is imported the first time it is opened
+def get_history():
+    global _default_history
+    with _default_lock:
+        if _default_history is None:
+            _default_history = QAHistory()
+            _default_history.import_csv()
+        return _default_history
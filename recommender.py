@@ -0,0 +1,267 @@
+import os
+import json
+import hashlib
+import weakref
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+# Directory where the fitted vocabulary and feature matrix are persisted
+INDEX_DIR = "recommender_index"
+
+# Fitted indexes and neighbor tables kept in memory for the lifetime of the process, keyed by fingerprint
+_index_cache = {}
+_neighbor_cache = {}
+
+# Fingerprints of the DataFrames seen so far, so each shared frame is only hashed once
+_fingerprint_cache = {}
+
+# Memory budget for scoring one block of rows in the batch job
+BLOCK_MEMORY_MB = 256
+
+# Peak bytes per score while a block is ranked: first the sparse product (8-byte value and 4-byte
+# column index when every book shares a term) next to the dense float64 block made from it, then
+# the dense block with np.argpartition's index array, and later with the tie masks
+SCORE_BYTES = max(12 + 8, 8 + 8, 8 + 1 + 1)
+
+# Matrix shared with batch worker processes
+_worker_matrix = None
+
+# Combine the columns the recommender compares books on
+def build_features(books_df):
+    columns = [books_df[col].astype(str) for col in ("authors", "publisher", "language_code")]
+    return columns[0] + " " + columns[1] + " " + columns[2]
+
+# Fingerprint the feature columns so a stale index is never reused
+def dataset_fingerprint(books_df):
+    key = id(books_df)
+    entry = _fingerprint_cache.get(key)
+    if entry is None or entry[0]() is not books_df:
+        hashes = pd.util.hash_pandas_object(books_df[["authors", "publisher", "language_code"]], index=False)
+        entry = (weakref.ref(books_df), hashlib.sha1(hashes.values.tobytes()).hexdigest())
+        _fingerprint_cache[key] = entry
+        weakref.finalize(books_df, _fingerprint_cache.pop, key, None)
+    return entry[1]
+
+# Fit the vocabulary and build the L2-normalized sparse feature matrix
+def build_index(features):
+    """
+    Returns the fitted vocabulary and a CSR matrix whose rows have unit length,
+    so a dot product between two rows is their cosine similarity.
+    """
+    vectorizer = CountVectorizer()
+    feature_matrix = vectorizer.fit_transform(features)
+    vocabulary = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    return {"vocabulary": vocabulary, "matrix": normalize(feature_matrix).tocsr()}
+
+# Persist a fitted index to disk
+def save_index(index, fingerprint, index_dir=INDEX_DIR):
+    os.makedirs(index_dir, exist_ok=True)
+    sparse.save_npz(os.path.join(index_dir, "matrix.npz"), index["matrix"])
+    with open(os.path.join(index_dir, "vocabulary.json"), "w", encoding="utf-8") as file:
+        json.dump({"fingerprint": fingerprint, "vocabulary": index["vocabulary"]}, file)
+
+# Load a persisted index, or return None if it is missing or was built from other data
+def load_index(fingerprint, index_dir=INDEX_DIR):
+    try:
+        with open(os.path.join(index_dir, "vocabulary.json"), encoding="utf-8") as file:
+            meta = json.load(file)
+        if meta["fingerprint"] != fingerprint:
+            return None
+        matrix = sparse.load_npz(os.path.join(index_dir, "matrix.npz")).tocsr()
+    except (OSError, ValueError, KeyError):
+        return None
+    return {"vocabulary": meta["vocabulary"], "matrix": matrix}
+
+# Return the index for a dataset, building and persisting it only when needed
+def get_index(books_df, index_dir=INDEX_DIR):
+    fingerprint = dataset_fingerprint(books_df)
+    index = _index_cache.get(fingerprint)
+    if index is None:
+        index = load_index(fingerprint, index_dir)
+        if index is None:
+            index = build_index(build_features(books_df))
+            try:
+                save_index(index, fingerprint, index_dir)
+            except OSError:
+                pass  # A read-only directory only costs us the rebuild next time
+        _index_cache[fingerprint] = index
+    return index
+
+# Score one book against the whole catalog and return the k best matches
+def top_similar(matrix, book_idx, k=5):
+    """
+    Returns the row indices of the k most similar books, ordered by descending
+    score with ties broken by row order. The first-ranked book (normally the
+    query itself) is skipped, matching the original dense implementation.
+    """
+    scores = (matrix @ matrix[book_idx].T).toarray().ravel()
+    wanted = min(k + 1, len(scores))
+    if wanted == 0:
+        return np.array([], dtype=np.intp)
+
+    # Keep every candidate tied with the cut-off score so tie-breaking stays exact
+    threshold = np.partition(scores, len(scores) - wanted)[len(scores) - wanted]
+    candidates = np.flatnonzero(scores >= threshold)
+    ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return ranked[1:wanted]
+
+# Rank a block of dense score rows like top_similar does for a single row, leaving out zero scores
+def block_top_similar(scores, k=5):
+    rows, cols = scores.shape
+    wanted = min(k + 1, cols)
+    ids = np.full((rows, k), -1, dtype=np.int32)
+    top_scores = np.zeros((rows, k), dtype=np.float16)
+    if wanted == 0:
+        return ids, top_scores
+
+    # Each row's `wanted` best columns; which of the columns tied with the cut-off score are among them is arbitrary
+    best = np.argpartition(scores, cols - wanted, axis=1)[:, cols - wanted:].copy()
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    cutoff = best_scores.min(axis=1)
+    above = best_scores > cutoff[:, None]
+    cand_rows, cand_cols = [np.nonzero(above)[0]], [best[above]]
+
+    # Fill up with the lowest-numbered columns tied with the cut-off, as top_similar's tie-break does;
+    # rows cut off at zero need none, since zero scores are never neighbors
+    needed = np.where(cutoff > 0, wanted - above.sum(axis=1), 0)
+    tied = scores == cutoff[:, None]
+    while needed.any():
+        pending = np.flatnonzero(needed)
+        first = tied[pending].argmax(axis=1)
+        tied[pending, first] = False
+        cand_rows.append(pending)
+        cand_cols.append(first)
+        needed[pending] -= 1
+    del tied
+
+    cand_rows, cand_cols = np.concatenate(cand_rows), np.concatenate(cand_cols)
+    cand_scores = scores[cand_rows, cand_cols]
+    order = np.lexsort((cand_cols, -cand_scores, cand_rows))
+    cand_rows, cand_cols, cand_scores = cand_rows[order], cand_cols[order], cand_scores[order]
+
+    # Rank of each candidate within its row; keep ranks 1..k (rank 0 is the book itself)
+    row_starts = np.searchsorted(cand_rows, np.arange(rows))
+    ranks = np.arange(len(cand_rows)) - row_starts[cand_rows]
+    keep = (ranks >= 1) & (ranks < wanted) & (cand_scores > 0)
+    ids[cand_rows[keep], ranks[keep] - 1] = cand_cols[keep]
+    top_scores[cand_rows[keep], ranks[keep] - 1] = cand_scores[keep]
+    return ids, top_scores
+
+def _init_worker(matrix):
+    global _worker_matrix
+    _worker_matrix = matrix
+
+# Score one block of rows against the whole catalog in a worker
+def _neighbors_for_block(bounds, k):
+    start, stop = bounds
+    product = _worker_matrix[start:stop] @ _worker_matrix.T
+    scores = product.toarray()
+    del product  # Freed before ranking allocates its own buffers
+    return start, block_top_similar(scores, k)
+
+# Compute the top-k neighbor table for every book without building the full similarity matrix
+def compute_neighbors(matrix, k=5, workers=1, memory_mb=BLOCK_MEMORY_MB):
+    """
+    Scores the catalog in row blocks sized so scoring and ranking one block
+    peaks at about memory_mb (per worker), optionally across a process pool. Returns int32 neighbor ids and
+    float16 scores of shape (n_books, k), padded with -1 for tiny catalogs.
+    """
+    n_books = matrix.shape[0]
+    block_rows = max(1, int(memory_mb * 2**20 // (SCORE_BYTES * max(n_books, 1))))
+    blocks = [(start, min(start + block_rows, n_books)) for start in range(0, n_books, block_rows)]
+    ids = np.full((n_books, k), -1, dtype=np.int32)
+    scores = np.zeros((n_books, k), dtype=np.float16)
+
+    if workers <= 1:
+        _init_worker(matrix)
+        results = (_neighbors_for_block(block, k) for block in blocks)
+        for start, (block_ids, block_scores) in results:
+            ids[start:start + len(block_ids)] = block_ids
+            scores[start:start + len(block_ids)] = block_scores
+        _init_worker(None)
+        return ids, scores
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matrix,)) as executor:
+        for start, (block_ids, block_scores) in executor.map(_neighbors_for_block, blocks, [k] * len(blocks)):
+            ids[start:start + len(block_ids)] = block_ids
+            scores[start:start + len(block_ids)] = block_scores
+    return ids, scores
+
+# Write a file next to its final path and swap it in, so processes mapping the old one keep their copy
+def _replace_file(path, write):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        write(file)
+    os.replace(temp_path, path)
+
+# Persist a neighbor table next to the fitted index; neighbors.json goes last and marks the new table
+def save_neighbors(ids, scores, fingerprint, index_dir=INDEX_DIR):
+    os.makedirs(index_dir, exist_ok=True)
+    _replace_file(os.path.join(index_dir, "neighbor_ids.npy"), lambda file: np.save(file, ids))
+    _replace_file(os.path.join(index_dir, "neighbor_scores.npy"), lambda file: np.save(file, scores))
+    meta = json.dumps({"fingerprint": fingerprint, "k": ids.shape[1]}).encode("utf-8")
+    _replace_file(os.path.join(index_dir, "neighbors.json"), lambda file: file.write(meta))
+
+def _modified(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+# Memory-map the neighbor table for a dataset, or return None if it was not precomputed
+def get_neighbors(books_df, index_dir=INDEX_DIR):
+    """
+    Tables and misses are both cached, so a lookup costs one stat() of
+    neighbors.json; the table is mapped again once the batch job rewrites
+    that file.
+    """
+    fingerprint = dataset_fingerprint(books_df)
+    meta_path = os.path.join(index_dir, "neighbors.json")
+    modified = _modified(meta_path)
+    cached = _neighbor_cache.get(fingerprint)
+    if cached is not None and cached["modified"] == modified:
+        return cached if cached["ids"] is not None else None
+    _neighbor_cache[fingerprint] = {"ids": None, "scores": None, "modified": modified}
+    try:
+        with open(meta_path, encoding="utf-8") as file:
+            meta = json.load(file)
+        if meta["fingerprint"] != fingerprint:
+            return None
+        _neighbor_cache[fingerprint] = {
+            "ids": np.load(os.path.join(index_dir, "neighbor_ids.npy"), mmap_mode="r"),
+            "scores": np.load(os.path.join(index_dir, "neighbor_scores.npy"), mmap_mode="r"),
+            "modified": modified,
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+    return _neighbor_cache[fingerprint]
+
+# Batch job: precompute and store the neighbor table for a catalog
+def precompute_neighbors(books_df, k=5, workers=1, memory_mb=BLOCK_MEMORY_MB, index_dir=INDEX_DIR):
+    index = get_index(books_df, index_dir)
+    ids, scores = compute_neighbors(index["matrix"], k, workers, memory_mb)
+    fingerprint = dataset_fingerprint(books_df)
+    save_neighbors(ids, scores, fingerprint, index_dir)
+    _neighbor_cache.pop(fingerprint, None)
+    return ids, scores
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute book recommendation neighbor tables.")
+    parser.add_argument("csv_path", nargs="?", default="cleaned_books.csv")
+    parser.add_argument("--k", type=int, default=5, help="neighbors stored per book")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes scoring blocks in parallel")
+    parser.add_argument("--memory-mb", type=int, default=BLOCK_MEMORY_MB, help="memory budget per score block")
+    args = parser.parse_args()
+
+    from book_store import load_books
+    books_df = load_books(args.csv_path)
+    precompute_neighbors(books_df, args.k, args.workers, args.memory_mb)
+    print(f"Stored {args.k} neighbors for {len(books_df)} books in {INDEX_DIR}/.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# Modules imported by each page of app.py
+PAGE_MODULES = {
+    "Document Q&A": ["document_qa", "pdf_extract", "qa_history"],
+    "Study Planner": ["study_planner"],
+    "Focus Timer": ["focus_timer"],
+    "Book Recommender": ["books"],
+    "Document Summarizer": ["summarizer"],
+}
+
+# Packages that must not be imported to render the Home page
+HEAVY_MODULES = ["langchain", "faiss", "openai", "sklearn", "PyPDF2", "pandas", "pyarrow", "streamlit_calendar"]
+
+# Time allowed for the Home page's first run, on top of importing streamlit itself
+HOME_BUDGET_MS = 1500
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Per-module import cost of a set of modules, measured with -X importtime in a fresh interpreter
+def profile_imports(modules, baseline=("streamlit",)):
+    """
+    Returns [(module, self_ms, cumulative_ms)] for every module the import
+    statement loaded, heaviest cumulative first. Modules in baseline are
+    imported beforehand and excluded, since the Streamlit server has them
+    loaded before any page runs. Raises ImportError when an import fails.
+    """
+    code = "".join(f"import {name}\n" for name in baseline)
+    code += "import sys; sys.stderr.write('--- start\\n')\n"
+    code += "".join(f"import {name}\n" for name in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=APP_DIR, capture_output=True, text=True)
+    stderr = result.stderr
+    if result.returncode:
+        raise ImportError(stderr.strip().splitlines()[-1])
+    timings = []
+    started = False
+    for line in stderr.splitlines():
+        if line == "--- start":
+            started = True
+            continue
+        if not started or not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return sorted(timings, key=lambda timing: timing[2], reverse=True)
+
+# Total import cost of each page, with its heaviest top-level packages
+def page_report(top=8):
+    report = []
+    for page, modules in PAGE_MODULES.items():
+        try:
+            timings = profile_imports(modules)
+        except ImportError as error:
+            report.append({"page": page, "error": str(error)})
+            continue
+        packages = {}
+        for name, self_ms, _ in timings:
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + self_ms
+        heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        report.append({
+            "page": page,
+            "import_ms": round(sum(self_ms for _, self_ms, _ in timings), 1),
+            "modules": len(timings),
+            "heaviest": {package: round(ms, 1) for package, ms in heaviest},
+        })
+    return report
+
+# First run of the Home page in a fresh interpreter: script time and heavy packages it imported
+def home_cold_start():
+    code = f"""
+import sys, json, time
+from streamlit.testing.v1 import AppTest
+before = set(sys.modules)
+start = time.perf_counter()
+app = AppTest.from_file("app.py", default_timeout=120)
+app.run()
+elapsed = time.perf_counter() - start
+loaded = sorted({{name.split(".")[0] for name in set(sys.modules) - before}})
+heavy = [name for name in {HEAVY_MODULES!r} if name in loaded]
+print(json.dumps({{"page": "Home", "run_ms": round(elapsed * 1000, 1), "heavy_imports": heavy}}))
+"""
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the app's pages and a cold-start check for Home.")
+    parser.add_argument("--budget", type=float, default=HOME_BUDGET_MS,
+                        help="fail when the Home page's first run exceeds this many ms")
+    parser.add_argument("--skip-pages", action="store_true", help="only run the Home cold-start check")
+    args = parser.parse_args()
+
+    if not args.skip_pages:
+        for row in page_report():
+            print(json.dumps(row))
+    home = home_cold_start()
+    print(json.dumps(home))
+
+    failures = []
+    if home["run_ms"] > args.budget:
+        failures.append(f"Home page took {home['run_ms']} ms, over the {args.budget:g} ms budget")
+    if home["heavy_imports"]:
+        failures.append(f"Home page imported {', '.join(home['heavy_imports'])}")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
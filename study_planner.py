@@ -1,30 +1,30 @@
 import streamlit as st
 from streamlit_calendar import calendar
-from datetime import date
+from datetime import date, timedelta
 import pandas as pd
+from task_store import (COLUMNS, ESTIMATED_TIME_COLUMN, RECURRENCES, format_estimated_time, get_task_store,
+                        is_valid_client_id, new_client_id)
+from study_scheduler import DAILY_HOURS, get_schedule
 
-# Initialize task storage
-if "tasks" not in st.session_state:
-    st.session_state.tasks = []
+# Days of planned study sessions shown on the plan calendar
+PLAN_DAYS = 28
 
-# Time Format Helper Function
-def format_estimated_time(total_hours):
-    """
-    Formats total estimated time (in hours) to 'xh ymin' format.
-    """
-    hours = int(total_hours)
-    minutes = int((total_hours - hours) * 60)
-    if hours > 0 and minutes > 0:
-        return f"{hours}h {minutes}min"
-    elif hours > 0:
-        return f"{hours}h"
-    elif minutes > 0:
-        return f"{minutes}min"
-    else:
-        return "0min"
+# Days loaded beyond the visible calendar range on each side, so nearby navigation needs no new data
+PREFETCH_DAYS = 14
+
+# Tasks offered in the status update box; a larger filtered view shows the first ones
+MAX_UPDATE_OPTIONS = 1000
+
+# This browser's task store: its client id lives in the page URL, like the focus timer's, so a reload finds the tasks
+def load_task_store():
+    client_id = st.query_params.get("planner")
+    if not is_valid_client_id(client_id):
+        client_id = new_client_id()
+        st.query_params["planner"] = client_id
+    return get_task_store(client_id)
 
 # Function to Display Tasks on Calendar
-def show_calendar(tasks):
+def show_calendar(tasks, title="Task Calendar", key=None):
     """
     Displays tasks on a calendar using streamlit-calendar.
     """
@@ -34,13 +34,56 @@ def show_calendar(tasks):
 
     # Convert dates to string format for JSON serialization
     events = [
-        {"date": task["Due Date"].strftime("%Y-%m-%d"), "title": task["Task Name"]}
+        {"date": task["Due Date"].isoformat(), "title": task["Task Name"]}
         for task in tasks
     ]
 
     # Render the interactive calendar
-    st.write("### Task Calendar")
-    calendar(events)
+    st.write(f"### {title}")
+    calendar(events, key=key)
+
+# Dates a month view can show: the weeks around the month of a day
+def month_range(day):
+    first = day.replace(day=1)
+    return first - timedelta(days=7), first + timedelta(days=42)
+
+# Calendar of the store's tasks that is only sent the visible range plus a prefetch margin
+def show_task_calendar(store, title="Task Calendar", key="task_calendar"):
+    """
+    Events come from the store's due-date index, with recurring tasks expanded
+    inside the range only. Navigating reports the newly visible dates through
+    the calendar's datesSet callback; when they leave the loaded range the page
+    reruns to load the new one, so the payload stays the same size however
+    many tasks there are.
+    """
+    range_key = f"{key}_range"
+    if range_key not in st.session_state:
+        start, end = month_range(date.today())
+        st.session_state[range_key] = {"visible": (start, end),
+                                       "loaded": (start - timedelta(days=PREFETCH_DAYS), end + timedelta(days=PREFETCH_DAYS))}
+    visible, loaded = st.session_state[range_key]["visible"], st.session_state[range_key]["loaded"]
+
+    events = [
+        {"date": day.isoformat(), "title": task["Task Name"]}
+        for day, task in store.tasks_between(*loaded)
+    ]
+
+    # Render the interactive calendar
+    st.write(f"### {title}")
+    state = calendar(
+        events,
+        options={"initialDate": (visible[0] + (visible[1] - visible[0]) / 2).isoformat()},
+        callbacks=["datesSet"],
+        key=key,
+    )
+    dates = (state or {}).get("datesSet") if isinstance(state, dict) else None
+    if dates:
+        start, end = date.fromisoformat(dates["start"][:10]), date.fromisoformat(dates["end"][:10])
+        st.session_state[range_key]["visible"] = (start, end)
+        if start < loaded[0] or end > loaded[1]:
+            st.session_state[range_key]["loaded"] = (start - timedelta(days=PREFETCH_DAYS),
+                                                     end + timedelta(days=PREFETCH_DAYS))
+            st.rerun()
 
 # Study Planner UI
 def study_planner_ui():
@@ -56,6 +99,7 @@ def study_planner_ui():
         category = st.selectbox("Category", ["Reading", "Coding", "Assignments", "Other"])
         priority = st.selectbox("Priority", ["High", "Medium", "Low"])
         due_date = st.date_input("Due Date", min_value=date.today())
+        recurrence = st.selectbox("Repeats", RECURRENCES, format_func=lambda value: "Never" if value == "None" else value)
         
         # Separate hour and minute inputs for estimated time
         col1, col2 = st.columns(2)
@@ -70,7 +114,7 @@ def study_planner_ui():
                 # Calculate total estimated time in hours
                 total_estimated_time = hours + (minutes / 60)
                 
-                # Add task to session state
+                # Add task to the persistent task store
                 new_task = {
                     "Task Name": task_name,
                     "Description": task_description,
@@ -79,34 +123,35 @@ def study_planner_ui():
                     "Due Date": due_date,  # This will be converted to string in show_calendar
                     "Estimated Time (hours)": round(total_estimated_time, 2),
                     "Status": "Pending",
+                    "Recurrence": recurrence,
                 }
-                st.session_state.tasks.append(new_task)
+                load_task_store().add(new_task)
                 st.success("Task added successfully!")
             else:
                 st.error("Task Name cannot be empty.")
 
     # Display tasks if available
-    if st.session_state.tasks:
-        # Convert task list to DataFrame for display
-        tasks_df = pd.DataFrame(st.session_state.tasks)
+    store = load_task_store()
+    if len(store):
+        # Shared table of all tasks, kept up to date by the store
+        tasks_df = store.frame()
 
-        # Task filters
+        # Task filters, answered from the store's indexes
         filter_status = st.selectbox("Filter by Status", ["All", "Pending", "In Progress", "Completed"])
         filter_priority = st.selectbox("Filter by Priority", ["All", "High", "Medium", "Low"])
         
-        filtered_df = tasks_df.copy()
+        filters = {}
         if filter_status != "All":
-            filtered_df = filtered_df[filtered_df["Status"] == filter_status]
+            filters["Status"] = filter_status
         if filter_priority != "All":
-            filtered_df = filtered_df[filtered_df["Priority"] == filter_priority]
+            filters["Priority"] = filter_priority
+        filtered_ids = store.ids_where(filters)
+        filtered_df = tasks_df.loc[filtered_ids] if filters else tasks_df
 
-        st.dataframe(filtered_df, use_container_width=True)
-        
-        # Format the "Estimated Time (hours)" column
-        tasks_df["Estimated Time"] = tasks_df["Estimated Time (hours)"].apply(format_estimated_time)
+        st.dataframe(filtered_df, use_container_width=True, column_order=list(COLUMNS))
         
-        # Drop the original unformatted column (optional)
-        tasks_df = tasks_df.drop(columns=["Estimated Time (hours)"])
+        # Show the "Estimated Time (hours)" column formatted; the store formats each task once, when it is added
+        task_list_columns = [column for column in COLUMNS if column != "Estimated Time (hours)"] + [ESTIMATED_TIME_COLUMN]
         
         # Highlight Priority levels with colors
         def highlight_priority(priority):
@@ -122,37 +167,55 @@ def study_planner_ui():
 
         # Display all tasks
         st.write("### Task List")
-        st.dataframe(tasks_df)
+        st.dataframe(tasks_df, column_order=task_list_columns)
 
         # Calendar view
-        show_calendar(st.session_state.tasks)
+        show_task_calendar(store)
+
+        # Study plan: pending tasks packed into daily study slots, earliest deadline first
+        st.write("### Study Plan")
+        daily_hours = st.number_input("Study hours per day", min_value=0.5, max_value=16.0,
+                                      value=DAILY_HOURS, step=0.5)
+        schedule = get_schedule(store, daily_hours)
+        late = schedule.late_tasks()
+        if late:
+            st.warning(f"{len(late)} task(s) cannot be finished by their due date at {daily_hours:g} hours per day: "
+                       + ", ".join(task["Task Name"] for task in late[:10]) + (" ..." if len(late) > 10 else ""))
+        sessions = schedule.sessions(date.today(), date.today() + timedelta(days=PLAN_DAYS - 1))
+        show_calendar(
+            [{"Task Name": f"{task['Task Name']} ({format_estimated_time(hours)})", "Due Date": day}
+             for day, task, hours in sessions],
+            title=f"Study Sessions (next {PLAN_DAYS} days)", key="study_plan_calendar",
+        )
 
         # Progress Tracker
         st.write("### Progress Tracker")
-        total_tasks = len(st.session_state.tasks)
-        completed_tasks = sum(task["Status"] == "Completed" for task in st.session_state.tasks)
+        total_tasks = len(store)
+        completed_tasks = store.count("Status", "Completed")
         progress_percentage = (completed_tasks / total_tasks) * 100 if total_tasks > 0 else 0
         st.progress(progress_percentage / 100)
         st.write(f"Completed {completed_tasks} of {total_tasks} tasks ({round(progress_percentage, 2)}%).")
 
-        # Mark tasks as completed
+        # Mark tasks as completed, choosing by id so tasks with the same name stay distinct
         st.write("### Update Task Status")
-        task_to_update = st.selectbox("Select a task to update", [t["Task Name"] for t in st.session_state.tasks])
+        if len(filtered_ids) > MAX_UPDATE_OPTIONS:
+            st.caption(f"Showing the first {MAX_UPDATE_OPTIONS} of {len(filtered_ids)} tasks; use the filters above to narrow them down.")
+        task_to_update = st.selectbox(
+            "Select a task to update",
+            filtered_ids[:MAX_UPDATE_OPTIONS],
+            format_func=lambda task_id: f"{store.get(task_id)['Task Name']} (due {store.get(task_id)['Due Date']})",
+        )
         new_status = st.selectbox("New Status", ["Pending", "In Progress", "Completed"])
         update_task = st.button("Update Status")
-        if update_task:
-            for task in st.session_state.tasks:
-                if task["Task Name"] == task_to_update:
-                    task["Status"] = new_status
-                    st.success(f"Task '{task_to_update}' updated to '{new_status}'!")
-                    break
-                
+        if update_task and task_to_update is not None:
+            store.update_status(task_to_update, new_status)
+            st.success(f"Task '{store.get(task_to_update)['Task Name']}' updated to '{new_status}'!")
 
         # Export tasks
         st.write("### Export Tasks")
         export_csv = st.button("Download Task List as CSV")
         if export_csv:
-            tasks_csv = pd.DataFrame(st.session_state.tasks).to_csv(index=False)
+            tasks_csv = store.frame().to_csv(index=False, columns=list(COLUMNS))
             st.download_button(
                 label="Download CSV",
                 data=tasks_csv,
@@ -0,0 +1,174 @@
+import heapq
+import bisect
+import weakref
+import threading
+from datetime import date, timedelta
+import numpy as np
+
+# Study hours planned per day unless the user picks another cap
+DAILY_HOURS = 4.0
+
+# Higher priorities go first among tasks due the same day
+PRIORITY_RANK = {"High": 0, "Medium": 1, "Low": 2}
+
+# Tasks with this status are not planned
+DONE_STATUS = "Completed"
+
+def task_key(task):
+    return (task["Due Date"].toordinal(), PRIORITY_RANK.get(task["Priority"], len(PRIORITY_RANK)), task["id"])
+
+def is_schedulable(task):
+    return task["Status"] != DONE_STATUS and task["Estimated Time (hours)"] > 0
+
+class StudyScheduler:
+    """
+    Packs pending tasks into daily study slots of at most daily_hours, from
+    start onwards, earliest deadline first and by priority among equal
+    deadlines. A task may be split over several days. Tasks that cannot be
+    finished by their due date are reported as late.
+
+    All tasks are available from the start, so the earliest-deadline-first
+    plan works through them one after another in heap order: each task
+    occupies a contiguous stretch of study hours, given by a running total of
+    the hours before it. A change to one task only shifts the tasks after it
+    in that order, so upsert() and remove() re-sum just that suffix.
+    """
+
+    def __init__(self, daily_hours=DAILY_HOURS, start=None):
+        if daily_hours <= 0:
+            raise ValueError("daily_hours must be positive")
+        self.daily_hours = float(daily_hours)
+        self.start = start or date.today()
+        self.tasks = {}
+        self.keys = []      # Sorted task keys: the order tasks are worked on
+        self.hours = []     # Estimated hours, aligned with keys
+        self._ends = np.zeros(0)
+        self._valid = 0     # Running totals are correct for keys[:_valid]
+
+    # Plan a set of tasks from scratch
+    def build(self, tasks):
+        self.tasks = {task["id"]: dict(task) for task in tasks if is_schedulable(task)}
+        heap = [task_key(task) for task in self.tasks.values()]
+        heapq.heapify(heap)
+        self.keys = [heapq.heappop(heap) for _ in range(len(heap))]
+        self.hours = [float(self.tasks[key[2]]["Estimated Time (hours)"]) for key in self.keys]
+        self._valid = 0
+        return self
+
+    def _position(self, task_id):
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        key = task_key(task)
+        position = bisect.bisect_left(self.keys, key)
+        return position if position < len(self.keys) and self.keys[position] == key else None
+
+    def remove(self, task_id):
+        position = self._position(task_id)
+        if position is None:
+            self.tasks.pop(task_id, None)
+            return
+        del self.keys[position]
+        del self.hours[position]
+        del self.tasks[task_id]
+        self._valid = min(self._valid, position)
+
+    # Add a new or changed task (or drop it when it is completed)
+    def upsert(self, task):
+        self.remove(task["id"])
+        if not is_schedulable(task):
+            return
+        task = dict(task)
+        key = task_key(task)
+        position = bisect.bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.hours.insert(position, float(task["Estimated Time (hours)"]))
+        self.tasks[task["id"]] = task
+        self._valid = min(self._valid, position)
+
+    # Study hours from the start of the plan to the end of each task, re-summed from the first change
+    def ends(self):
+        if self._valid < len(self.keys) or len(self._ends) != len(self.keys):
+            valid = min(self._valid, len(self._ends), len(self.keys))
+            base = self._ends[valid - 1] if valid else 0.0
+            suffix = base + np.cumsum(np.asarray(self.hours[valid:], dtype=np.float64))
+            self._ends = np.concatenate([self._ends[:valid], suffix])
+            self._valid = len(self.keys)
+        return self._ends
+
+    def _day(self, offset):
+        return self.start + timedelta(days=int(offset // self.daily_hours))
+
+    # First and last study day of a task and whether it misses its due date
+    def placement(self, task_id):
+        position = self._position(task_id)
+        if position is None:
+            return None
+        ends = self.ends()
+        end = ends[position]
+        begin = end - self.hours[position]
+        finish = self._day(np.nextafter(end, 0))
+        due = date.fromordinal(self.keys[position][0])
+        return {"start": self._day(begin), "finish": finish, "late": finish > due}
+
+    # Tasks that cannot be finished by their due date, in plan order
+    def late_tasks(self):
+        ends = self.ends()
+        if not len(ends):
+            return []
+        finish_days = self.start.toordinal() + np.floor(np.nextafter(ends, 0) / self.daily_hours).astype(np.int64)
+        due_days = np.fromiter((key[0] for key in self.keys), dtype=np.int64, count=len(self.keys))
+        return [self.tasks[self.keys[i][2]] for i in np.flatnonzero(finish_days > due_days)]
+
+    # Study sessions as (day, task, hours) for days in [first_day, last_day], in plan order
+    def sessions(self, first_day=None, last_day=None):
+        ends = self.ends()
+        first = max(((first_day or self.start) - self.start).days, 0) * self.daily_hours
+        last = (((last_day - self.start).days + 1) * self.daily_hours) if last_day else float("inf")
+        sessions = []
+        position = int(np.searchsorted(ends, first, side="right"))
+        while position < len(self.keys):
+            end = ends[position]
+            begin = end - self.hours[position]
+            if begin >= last:
+                break
+            cursor = max(begin, first)
+            while cursor < min(end, last):
+                day_end = (cursor // self.daily_hours + 1) * self.daily_hours
+                piece = min(end, day_end) - cursor
+                if piece > 1e-9:
+                    sessions.append((self._day(cursor), self.tasks[self.keys[position][2]], round(piece, 2)))
+                cursor = day_end
+            position += 1
+        return sessions
+
+# Latest plan of each task store, with the lock its updates run under; dropped with the store
+_schedulers = weakref.WeakKeyDictionary()
+_schedulers_lock = threading.Lock()
+
+# Plan for the tasks of a TaskStore, brought up to date with only the tasks changed since last time
+def get_schedule(store, daily_hours=DAILY_HOURS, start=None):
+    start = start or date.today()
+    # The global lock only finds the store's entry, so planning one store never blocks another
+    with _schedulers_lock:
+        entry = _schedulers.get(store)
+        if entry is None:
+            entry = _schedulers[store] = {"lock": threading.Lock(), "plan": (None, None, None, None)}
+    with entry["lock"]:
+        hours, first_day, scheduler, version = entry["plan"]
+        # A plan for another cap or an earlier day is stale
+        if (hours, first_day) != (daily_hours, start):
+            scheduler = None
+        with store.lock:
+            current = store.version
+            changed = None if scheduler is None else store.changed_since(version)
+            tasks = store.query() if changed is None else [store.get(task_id) for task_id in changed]
+        if scheduler is None:
+            scheduler = StudyScheduler(daily_hours, start).build(tasks)
+        elif changed is None:
+            scheduler.build(tasks)
+        else:
+            for task in tasks:
+                scheduler.upsert(task)
+        entry["plan"] = (daily_hours, start, scheduler, current)
+        return scheduler
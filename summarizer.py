@@ -1,38 +1,119 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import openai
 import streamlit as st
-from PyPDF2 import PdfReader
-import re
+from llm_client import DEFAULT_MODEL, TimedStream, get_llm
+from llm_cache import get_response_cache, response_key
+from pdf_extract import extract_text, extract_clean_text_with_preview
+import text_cleaning
+from tracing import record_span, span
 
 # Set OpenAI API key
 openai.api_key = "ADD-YOUR-OPENAI-API-KEY-HERE"
 
 # Extract text from a PDF
 def extract_text_from_pdf(uploaded_file):
-    reader = PdfReader(uploaded_file)
-    raw_text = ""
-    for page in reader.pages:
-        raw_text += page.extract_text()
-    return raw_text
+    return extract_text(uploaded_file)
 
 # Clean and format text
 def clean_text(raw_text):
-    text = re.sub(r'\n+', '\n', raw_text)
-    lines = text.splitlines()
-    cleaned_lines = []
-    for line in lines:
-        if line.strip():
-            if cleaned_lines and not line.endswith(('.', '!', '?')):
-                cleaned_lines[-1] += " " + line.strip()
-            else:
-                cleaned_lines.append(line.strip())
-    formatted_text = "\n\n".join(cleaned_lines)
-    return formatted_text
+    return text_cleaning.clean_text(raw_text)
 
-# GPT-3.5 Turbo Summarizer function using chat-based model
-def summarize_with_gpt35(text, summary_length):
-    # Set the prompt to summarize the text
-    prompt = f"Summarize the following document:\n\n{text}"
+# Tokens of document text sent in one request, leaving room for the prompt and the answer
+CHUNK_TOKEN_BUDGET = 3000
+
+# Chunk summaries requested from the API at the same time
+MAX_CONCURRENT_CALLS = 4
+
+# Answer size for each chunk summary; independent of the final summary length so it can be reused
+CHUNK_SUMMARY_TOKENS = 200
+
+# Chunk summaries kept in memory, keyed by content hash
+MAX_CACHED_SUMMARIES = 1024
+
+SYSTEM_MESSAGE = "You are a helpful assistant that summarizes text."
+
+CHUNK_PROMPT = "Summarize the following part of a longer document, keeping its key facts and terms:"
+
+MERGE_PROMPT = "Combine the following partial summaries of one document into a single summary:"
+
+_summary_cache = OrderedDict()
+_summary_cache_lock = threading.Lock()
+
+try:
+    import tiktoken
+    _encoding = tiktoken.encoding_for_model(DEFAULT_MODEL)
+except Exception:  # tiktoken is optional; fall back to ~4 characters per token
+    _encoding = None
+
+# Approximate number of tokens in a text
+def estimate_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+# Split text into chunks of at most budget tokens, on paragraph boundaries where possible
+def chunk_text(text, budget=CHUNK_TOKEN_BUDGET):
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in text.split("\n\n"):
+        tokens = estimate_tokens(paragraph)
+        if tokens > budget:
+            # A single paragraph over budget is cut on word boundaries
+            words = paragraph.split()
+            step = max(1, len(words) * budget // tokens)
+            pieces = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        else:
+            pieces = [paragraph]
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > budget:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
 
+def summary_key(instruction, text, max_tokens):
+    return hashlib.sha256(f"{DEFAULT_MODEL}\0{instruction}\0{max_tokens}\0{text}".encode("utf-8")).hexdigest()
+
+def summary_messages(instruction, text):
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": f"{instruction}\n\n{text}"},
+    ]
+
+# One summarization request; intermediate summaries are cached by the hash of their input
+def summarize_once(llm, instruction, text, max_tokens, cache=True):
+    key = summary_key(instruction, text, max_tokens)
+    if cache:
+        with _summary_cache_lock:
+            if key in _summary_cache:
+                _summary_cache.move_to_end(key)
+                return _summary_cache[key]
+    summary = llm.complete(summary_messages(instruction, text), model=DEFAULT_MODEL, max_tokens=max_tokens, temperature=0.5)
+    if cache:
+        with _summary_cache_lock:
+            _summary_cache[key] = summary
+            while len(_summary_cache) > MAX_CACHED_SUMMARIES:
+                _summary_cache.popitem(last=False)
+    return summary
+
+# Summarize every chunk, at most MAX_CONCURRENT_CALLS requests in flight
+def summarize_chunks(llm, instruction, chunks, max_workers=MAX_CONCURRENT_CALLS):
+    if len(chunks) == 1:
+        return [summarize_once(llm, instruction, chunks[0], CHUNK_SUMMARY_TOKENS)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+            lambda chunk: summarize_once(llm, instruction, chunk, CHUNK_SUMMARY_TOKENS), chunks
+        ))
+
+# Run the map and intermediate reduce steps; returns the instruction, text and max_tokens of the final request
+def prepare_final_request(text, summary_length, llm, budget=CHUNK_TOKEN_BUDGET):
     # Adjust the max tokens based on desired summary length
     max_tokens_mapping = {
         "Short": 150,   # ~120-150 words
@@ -41,24 +122,66 @@ def summarize_with_gpt35(text, summary_length):
     }
     max_tokens = max_tokens_mapping.get(summary_length, 250)
 
-    # Prepare the messages for the chat model
-    messages = [
-        {"role": "system", "content": "You are a helpful assistant that summarizes text."},
-        {"role": "user", "content": prompt}
-    ]
+    if estimate_tokens(text) <= budget:
+        return "Summarize the following document:", text, max_tokens
 
-    # Request completion from OpenAI API using GPT-3.5 Turbo
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",  
-        messages=messages,
-        max_tokens=max_tokens,
-        temperature=0.5,  # Lower temperature for more focused responses
-        n=1,              # We only want one response
-        stop=None         # No stop sequence
-    )
+    with span("summarize.chunk"):
+        chunks = chunk_text(text, budget)
+    with span("summarize.map", chunks=len(chunks)):
+        summaries = summarize_chunks(llm, CHUNK_PROMPT, chunks)
+    while True:
+        combined = "\n\n".join(summaries)
+        groups = chunk_text(combined, budget)
+        if len(groups) == 1 or len(groups) >= len(summaries):
+            break
+        with span("summarize.reduce", groups=len(groups)):
+            summaries = summarize_chunks(llm, MERGE_PROMPT, groups)
+    return MERGE_PROMPT, combined, max_tokens
 
-    # Return the summary text
-    return response.choices[0].message['content'].strip()
+# GPT-3.5 Turbo Summarizer function using chat-based model
+def summarize_with_gpt35(text, summary_length, llm=None, budget=CHUNK_TOKEN_BUDGET):
+    """
+    Documents that fit in one request are summarized directly. Longer ones are
+    split into chunks that are summarized concurrently (map), and the chunk
+    summaries are merged into the final summary (reduce), merging in rounds
+    while they are still too long for one request. Only the final request
+    depends on summary_length, so changing it reuses the cached chunk summaries.
+    """
+    llm = llm or get_llm()
+    with span("summarize_with_gpt35", length=summary_length, provider=llm.provider):
+        instruction, final_text, max_tokens = prepare_final_request(text, summary_length, llm, budget)
+        with span("summarize.final"):
+            return summarize_once(llm, instruction, final_text, max_tokens, cache=False).strip()
+
+# Stream a summary from the persistent response cache, or a fresh one; returns (summary pieces, cache hit)
+def summarize_document_stream(text, summary_length, llm=None, budget=CHUNK_TOKEN_BUDGET, cache=None):
+    """
+    On a cache miss the chunk summaries are computed before this returns and
+    only the final request is streamed. The pieces are a TimedStream whose
+    first_token_seconds and total_seconds are measured from this call.
+    """
+    start = time.perf_counter()
+    llm = llm or get_llm()
+    cache = cache or get_response_cache()
+    document_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    key = response_key(f"{llm.provider}:{DEFAULT_MODEL}", 0.5, document_hash, document_hash,
+                       f"summary:{budget}", summary_length)
+
+    def stream():
+        instruction, final_text, max_tokens = prepare_final_request(text, summary_length, llm, budget)
+        return llm.stream(summary_messages(instruction, final_text), model=DEFAULT_MODEL,
+                          max_tokens=max_tokens, temperature=0.5)
+
+    generate_start = time.perf_counter()
+    pieces, cached = cache.get_or_stream(key, stream, namespace="summary")
+    # The map and reduce steps above have their own spans; this covers them plus the streamed final request
+    return TimedStream(pieces, start=start, on_complete=lambda text: record_span(
+        "summarize.generate", time.perf_counter() - generate_start, cached=cached, provider=llm.provider)), cached
+
+# Summary of a document from the persistent response cache, or a fresh one; returns (summary, cache hit)
+def summarize_document(text, summary_length, llm=None, budget=CHUNK_TOKEN_BUDGET, cache=None):
+    pieces, cached = summarize_document_stream(text, summary_length, llm, budget, cache)
+    return "".join(pieces).strip(), cached
 
 # Streamlit UI
 def document_summarizer_ui():
@@ -66,8 +189,7 @@ def document_summarizer_ui():
     uploaded_file = st.file_uploader("Upload a PDF document", type="pdf")
 
     if uploaded_file:
-        raw_text = extract_text_from_pdf(uploaded_file)
-        cleaned_text = clean_text(raw_text)
+        cleaned_text = extract_clean_text_with_preview(uploaded_file)
 
         # Display extracted text
         st.subheader("Extracted Document Text")
@@ -79,7 +201,13 @@ def document_summarizer_ui():
 
         # Generate summary using GPT-3.5 Turbo
         if st.button("Summarize Document"):
-            with st.spinner("Generating summary..."):
-                summary = summarize_with_gpt35(cleaned_text, summary_length)
+            with span("document_summary", length=summary_length):
+                with st.spinner("Generating summary..."):
+                    pieces, cached = summarize_document_stream(cleaned_text, summary_length)
                 st.subheader("Generated Summary")
-                st.write(summary)
+                st.write_stream(pieces)
+            if cached:
+                hit_rate = get_response_cache().stats()["namespaces"]["summary"]["hit_rate"]
+                st.caption(f"⚡ Cached summary, returned in {pieces.total_seconds * 1000:.0f} ms (summary cache hit rate {hit_rate:.0%})")
+            else:
+                st.caption(f"First words after {pieces.first_token_seconds:.2f} s, complete in {pieces.total_seconds:.2f} s")
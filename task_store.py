@@ -0,0 +1,323 @@
+import os
+import re
+import uuid
+import bisect
+import sqlite3
+import calendar
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+import pandas as pd
+
+# Where study tasks are kept between sessions, when no client id is given
+TASK_STORE_PATH = os.path.join("study_data", "tasks.sqlite")
+
+# One task database per planner client id, so visitors never see each other's tasks
+CLIENT_STORE_DIR = os.path.join("study_data", "clients")
+
+# Client task stores kept in memory; the least recently used are closed and reloaded from disk when needed
+MAX_OPEN_STORES = 64
+
+# Task fields as shown in the planner, with their database columns
+COLUMNS = {
+    "Task Name": "name",
+    "Description": "description",
+    "Category": "category",
+    "Priority": "priority",
+    "Due Date": "due_date",
+    "Estimated Time (hours)": "estimated_hours",
+    "Status": "status",
+    "Recurrence": "recurrence",
+}
+
+# Column of the display table with each task's estimated time as text, such as "1h 30min"
+ESTIMATED_TIME_COLUMN = "Estimated Time"
+
+# Values used for fields a task dict leaves out
+DEFAULTS = {"Description": "", "Recurrence": "None"}
+
+# How often a recurring task comes back; "None" tasks happen once, on their due date
+RECURRENCES = ("None", "Daily", "Weekly", "Monthly")
+
+# Fields with a secondary index: value -> ids of the tasks having it
+INDEXED_FIELDS = ("Status", "Priority", "Category", "Due Date")
+
+# Recent changes remembered for incremental consumers such as the study scheduler
+MAX_CHANGE_LOG = 100_000
+
+class TaskStore:
+    """
+    Study tasks with stable integer ids, persisted in SQLite and mirrored in
+    memory. Secondary indexes on status, priority, category and due date are
+    updated on every change, so filters and counts never scan the task list,
+    and the display table is patched in place instead of rebuilt. Each
+    planner client has its own store, shared by that client's sessions (for
+    example two tabs); every method is thread-safe.
+    """
+
+    def __init__(self, path=TASK_STORE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.RLock()
+        self.tasks = {}
+        self.indexes = {field: {} for field in INDEXED_FIELDS}
+        self.version = 0
+        self._changes = []      # (version, task id) for recent changes, oldest first
+        self._changes_lost = 0  # Changes up to this version may have been dropped from the log
+        self._due = []          # Sorted (due ordinal, id) of one-off tasks
+        self._recurring = {}    # (recurrence, phase) -> sorted (first due ordinal, id) of recurring tasks
+        self._frame = None
+        self._pending = []
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+                "description TEXT NOT NULL, category TEXT NOT NULL, priority TEXT NOT NULL, "
+                "due_date TEXT NOT NULL, estimated_hours REAL NOT NULL, status TEXT NOT NULL, "
+                "recurrence TEXT NOT NULL DEFAULT 'None')"
+            )
+            # Stores created before tasks could recur
+            if "recurrence" not in [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]:
+                conn.execute("ALTER TABLE tasks ADD COLUMN recurrence TEXT NOT NULL DEFAULT 'None'")
+            for field in INDEXED_FIELDS:
+                column = COLUMNS[field]
+                conn.execute(f"CREATE INDEX IF NOT EXISTS tasks_{column} ON tasks ({column})")
+            rows = conn.execute(f"SELECT id, {', '.join(COLUMNS.values())} FROM tasks ORDER BY id").fetchall()
+        for row in rows:
+            self._remember(row[0], self._from_row(row[1:]), sort=False)
+        self._due.sort()
+        for dates in self._recurring.values():
+            dates.sort()
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _from_row(self, row):
+        task = dict(zip(COLUMNS, row))
+        task["Due Date"] = date.fromisoformat(task["Due Date"])
+        return task
+
+    def _remember(self, task_id, task, sort=True):
+        task["id"] = task_id
+        self.tasks[task_id] = task
+        for field in INDEXED_FIELDS:
+            self.indexes[field].setdefault(task[field], set()).add(task_id)
+        if task["Recurrence"] == "None":
+            dates = self._due
+        else:
+            dates = self._recurring.setdefault((task["Recurrence"], phase(task["Due Date"], task["Recurrence"])), [])
+        if sort:
+            bisect.insort(dates, (task["Due Date"].toordinal(), task_id))
+        else:
+            dates.append((task["Due Date"].toordinal(), task_id))
+
+    # Add a task (a dict keyed like COLUMNS); returns its id
+    def add(self, task):
+        return self.add_many([task])[0]
+
+    # Add several tasks in one transaction; returns their ids
+    def add_many(self, tasks):
+        tasks = [{field: task.get(field, DEFAULTS.get(field)) for field in COLUMNS} for task in tasks]
+        insert = f"INSERT INTO tasks ({', '.join(COLUMNS.values())}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        with self.lock:
+            with self.connect() as conn:
+                ids = []
+                for task in tasks:
+                    values = [task[field].isoformat() if field == "Due Date" else task[field] for field in COLUMNS]
+                    ids.append(conn.execute(insert, values).lastrowid)
+            for task_id, task in zip(ids, tasks):
+                self._remember(task_id, task)
+            self._pending.extend(tasks)
+            self.version += 1
+            self._log_changes(ids)
+        return ids
+
+    def update_status(self, task_id, status):
+        with self.lock:
+            task = self.tasks[task_id]
+            if task["Status"] == status:
+                return
+            with self.connect() as conn:
+                conn.execute("UPDATE tasks SET status = ? WHERE id = ?", (status, task_id))
+            self.indexes["Status"][task["Status"]].discard(task_id)
+            self.indexes["Status"].setdefault(status, set()).add(task_id)
+            task["Status"] = status
+            if self._frame is not None and task_id in self._frame.index:
+                self._frame.at[task_id, "Status"] = status
+            self.version += 1
+            self._log_changes([task_id])
+
+    def _log_changes(self, task_ids):
+        self._changes.extend((self.version, task_id) for task_id in task_ids)
+        if len(self._changes) > MAX_CHANGE_LOG:
+            dropped = len(self._changes) - MAX_CHANGE_LOG
+            self._changes_lost = self._changes[dropped - 1][0]
+            del self._changes[:dropped]
+
+    # Ids of the tasks changed after a version, or None when that is older than the change log
+    def changed_since(self, version):
+        with self.lock:
+            if version == self.version:
+                return []
+            if version < self._changes_lost:
+                return None
+            position = bisect.bisect_right(self._changes, (version, float("inf")))
+            return list(dict.fromkeys(task_id for _, task_id in self._changes[position:]))
+
+    def get(self, task_id):
+        return self.tasks[task_id]
+
+    def __len__(self):
+        return len(self.tasks)
+
+    # Number of tasks with a given value of an indexed field, without scanning
+    def count(self, field, value):
+        return len(self.indexes[field].get(value, ()))
+
+    # Ids of the tasks matching every {field: value} filter on indexed fields, in insertion order
+    def ids_where(self, filters=None):
+        with self.lock:
+            if not filters:
+                return sorted(self.tasks)
+            sets = sorted((self.indexes[field].get(value, set()) for field, value in filters.items()), key=len)
+            matched = set(sets[0])
+            for other in sets[1:]:
+                matched &= other
+            return sorted(matched)
+
+    # Tasks matching the filters, as dicts
+    def query(self, filters=None):
+        return [self.tasks[task_id] for task_id in self.ids_where(filters)]
+
+    # Task occurrences with start <= day < end, as (day, task) in date order; O(log n) plus the window's size
+    def tasks_between(self, start, end):
+        """
+        One-off tasks come from a sorted due-date index. Recurring tasks are
+        indexed by recurrence and phase (weekday, or day of the month), each
+        sorted by first due date: only the phases that fall inside the window
+        are looked at, and every task there that started before its end has
+        an occurrence in it, so no task outside the result is visited.
+        """
+        with self.lock:
+            low = bisect.bisect_left(self._due, (start.toordinal(), -1))
+            high = bisect.bisect_left(self._due, (end.toordinal(), -1))
+            found = [(date.fromordinal(day), self.tasks[task_id]) for day, task_id in self._due[low:high]]
+            for key in phases_between(start, end):
+                dates = self._recurring.get(key, [])
+                started = bisect.bisect_left(dates, (end.toordinal(), -1))
+                for _, task_id in dates[:started]:
+                    task = self.tasks[task_id]
+                    found.extend((day, task) for day in occurrences(task["Due Date"], task["Recurrence"], start, end))
+        found.sort(key=lambda item: (item[0], item[1]["id"]))
+        return found
+
+    # Display table of every task, indexed by id, with ESTIMATED_TIME_COLUMN; patched on updates and extended
+    # on adds, never rebuilt
+    def frame(self):
+        with self.lock:
+            if self._frame is None:
+                self._frame = self._build_frame(list(self.tasks.values()))
+                self._pending = []
+            elif self._pending:
+                self._frame = pd.concat([self._frame, self._build_frame(self._pending)])
+                self._pending = []
+            return self._frame
+
+    def _build_frame(self, tasks):
+        frame = pd.DataFrame([{field: task[field] for field in COLUMNS} for task in tasks],
+                             index=pd.Index([task["id"] for task in tasks], name="id"),
+                             columns=list(COLUMNS))
+        frame[ESTIMATED_TIME_COLUMN] = [format_estimated_time(task["Estimated Time (hours)"]) for task in tasks]
+        return frame
+
+# Time Format Helper Function
+def format_estimated_time(total_hours):
+    """
+    Formats total estimated time (in hours) to 'xh ymin' format.
+    """
+    hours = int(total_hours)
+    minutes = int((total_hours - hours) * 60)
+    if hours > 0 and minutes > 0:
+        return f"{hours}h {minutes}min"
+    elif hours > 0:
+        return f"{hours}h"
+    elif minutes > 0:
+        return f"{minutes}min"
+    else:
+        return "0min"
+
+# What a recurring task's dates have in common: nothing for daily tasks, the weekday or the day of the month
+def phase(first, recurrence):
+    if recurrence == "Weekly":
+        return first.weekday()
+    if recurrence == "Monthly":
+        return first.day
+    return None
+
+# (recurrence, phase) of the recurring tasks that fall on at least one day in [start, end)
+def phases_between(start, end):
+    days = [start + timedelta(days=offset) for offset in range(min(max((end - start).days, 0), 31))]
+    keys = {("Daily", None)} if days else set()
+    keys.update(("Weekly", day.weekday()) for day in days[:7])
+    for day in days:
+        keys.add(("Monthly", day.day))
+        # Monthly tasks on a later day of the month fall on the last day of shorter months
+        if (day + timedelta(days=1)).month != day.month:
+            keys.update(("Monthly", later) for later in range(day.day + 1, 32))
+    return keys
+
+# Dates in [start, end) on which a task due on first and repeating with recurrence falls
+def occurrences(first, recurrence, start, end):
+    if recurrence == "None":
+        if start <= first < end:
+            yield first
+        return
+    if recurrence in ("Daily", "Weekly"):
+        step = 1 if recurrence == "Daily" else 7
+        skip = max(0, -(-(start - first).days // step))
+        day = first + timedelta(days=skip * step)
+        while day < end:
+            yield day
+            day += timedelta(days=step)
+        return
+    if recurrence == "Monthly":
+        # Same day of the month, or the month's last day when it is shorter
+        months = max(0, (start.year - first.year) * 12 + start.month - first.month - 1)
+        while True:
+            year, month = divmod(first.month - 1 + months, 12)
+            year += first.year
+            day = date(year, month + 1, min(first.day, calendar.monthrange(year, month + 1)[1]))
+            if day >= end:
+                return
+            if day >= start:
+                yield day
+            months += 1
+    raise ValueError(f"Unknown recurrence {recurrence!r}")
+
+_stores = OrderedDict()
+_stores_lock = threading.Lock()
+
+def new_client_id():
+    return uuid.uuid4().hex
+
+def is_valid_client_id(client_id):
+    return bool(re.fullmatch(r"[A-Za-z0-9_-]{1,64}", client_id or ""))
+
+# Task database of a planner client; ids come from the page URL, so they are checked before use as a file name
+def client_store_path(client_id):
+    if not is_valid_client_id(client_id):
+        raise ValueError(f"Invalid planner client id {client_id!r}")
+    return os.path.join(CLIENT_STORE_DIR, client_id + ".sqlite")
+
+# Task store of one planner client (or the default store), loaded from disk on first use
+def get_task_store(client_id=None):
+    path = TASK_STORE_PATH if client_id is None else client_store_path(client_id)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = TaskStore(path)
+            while len(_stores) > MAX_OPEN_STORES:
+                _stores.popitem(last=False)
+        else:
+            _stores.move_to_end(path)
+        return store
@@ -0,0 +1,12 @@
+from book_search import BookSearchIndex
+
+TITLES = ["The Hobbit", "Theocritus: Idylls", "The Fellowship of the Ring", "Dune"]
+AUTHORS = ["J.R.R. Tolkien", "Theocritus", "J.R.R. Tolkien", "Frank Herbert"]
+
+def test_transposed_letters_still_match():
+    index = BookSearchIndex(TITLES, AUTHORS)
+    assert set(index.search("tolkein")) == {0, 2}
+
+def test_exact_token_outranks_its_prefix_expansions():
+    index = BookSearchIndex(TITLES, AUTHORS)
+    assert index.search("the")[:2] == [0, 2]
@@ -0,0 +1,81 @@
+import re
+
+# Characters str.splitlines() treats as line boundaries
+LINE_BOUNDARIES = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+
+LINE_BOUNDARY = re.compile("[" + LINE_BOUNDARIES + "]")
+
+# A line ending with one of these starts a new paragraph instead of continuing the last one
+SENTENCE_ENDINGS = (".", "!", "?")
+
+class TextCleaner:
+    """
+    Incremental version of the PDF text cleaning used by the Q&A and summarizer
+    pages. Feed it the text in any number of pieces (e.g. page by page) and it
+    returns the cleaned output as it becomes final. Only the unfinished line
+    and the current paragraph are buffered, and every character is handled a
+    constant number of times. The concatenated output is identical to
+    cleaning the whole text at once.
+    """
+
+    def __init__(self):
+        self.carry = []
+        self.paragraph = None
+        self.started = False
+
+    # Turn complete lines into finished paragraphs
+    def _take_line(self, line, output):
+        if not line.strip():
+            return
+        if self.paragraph is None or line.endswith(SENTENCE_ENDINGS):
+            self._flush(output)
+            self.paragraph = [line.strip()]
+        else:
+            self.paragraph.append(line.strip())
+
+    def _flush(self, output):
+        if self.paragraph is not None:
+            output.append(("\n\n" if self.started else "") + " ".join(self.paragraph))
+            self.started = True
+            self.paragraph = None
+
+    def feed(self, text):
+        if not LINE_BOUNDARY.search(text):
+            # Still inside the same line: buffer the piece without re-joining anything
+            self.carry.append(text)
+            return ""
+        self.carry.append(text)
+        pieces = "".join(self.carry).splitlines(keepends=True)
+        self.carry = []
+        last = pieces[-1]
+        # Hold back an unterminated line, and a lone "\r" that may be the first half of "\r\n"
+        if last[-1] not in LINE_BOUNDARIES or last.endswith("\r"):
+            self.carry.append(pieces.pop())
+        output = []
+        for piece in pieces:
+            end = -2 if piece.endswith("\r\n") else -1
+            self._take_line(piece[:end], output)
+        return "".join(output)
+
+    def finish(self):
+        output = []
+        for line in "".join(self.carry).splitlines():
+            self._take_line(line, output)
+        self.carry = []
+        self._flush(output)
+        return "".join(output)
+
+# Clean a stream of text pieces, yielding cleaned output as it is produced
+def iter_clean_text(pieces):
+    cleaner = TextCleaner()
+    for piece in pieces:
+        output = cleaner.feed(piece)
+        if output:
+            yield output
+    output = cleaner.finish()
+    if output:
+        yield output
+
+# Clean and format extracted PDF text: drop blank lines, join wrapped lines into paragraphs
+def clean_text(raw_text):
+    return "".join(iter_clean_text([raw_text]))
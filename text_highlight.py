@@ -0,0 +1,93 @@
+import re
+import bisect
+from functools import lru_cache
+
+# Sentence boundaries: whitespace after "." or "?", except after abbreviations like "e.g." or "Mr."
+SENTENCE_BOUNDARY = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s')
+
+WORD = re.compile(r"\w+")
+
+# Common words that carry no meaning on their own in a question
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each explain few for from further had
+has have having he her here hers herself him himself his how i if in into is it its itself just me
+more most my myself no nor not now of off on once only or other our ours ourselves out over own
+please same she should so some such tell than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what when where which while
+who whom why will with would you your yours yourself yourselves
+""".split())
+
+# Sentence start/end offsets of a document, computed once per distinct text
+@lru_cache(maxsize=16)
+def sentence_index(document_text):
+    starts = [0]
+    ends = []
+    for match in SENTENCE_BOUNDARY.finditer(document_text):
+        ends.append(match.start())
+        starts.append(match.end())
+    ends.append(len(document_text))
+    return starts, ends
+
+# Meaningful lowercase terms of a query, in order of first appearance
+def query_terms(user_query):
+    tokens = [token for token in WORD.findall(user_query.lower()) if len(token) > 1 or token.isdigit()]
+    terms = [token for token in tokens if token not in STOPWORDS]
+    return list(dict.fromkeys(terms or tokens))
+
+# One compiled pattern matching every term (and simple plurals) in a single scan
+@lru_cache(maxsize=256)
+def terms_pattern(terms):
+    alternation = "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(r"\b(?:" + alternation + r")(?:s|es)?\b", re.IGNORECASE)
+
+# Sentences containing query terms, best first, with every match wrapped in **bold**
+def rank_relevant_sentences(document_text, user_query, limit=None):
+    """
+    Returns (highlighted sentence, score) pairs. A sentence scores by how many
+    distinct query terms it contains, then by its total number of matches;
+    equal scores keep document order.
+    """
+    terms = query_terms(user_query)
+    if not terms or not document_text:
+        return []
+    starts, ends = sentence_index(document_text)
+    pattern = terms_pattern(tuple(terms))
+    term_of = {}
+    for term in terms:
+        for variant in (term, term + "s", term + "es"):
+            term_of.setdefault(variant, term)
+
+    # Group matches by the sentence they fall in; matches arrive in order, so walk forward
+    matches = {}
+    sentence = 0
+    last = len(starts) - 1
+    for match in pattern.finditer(document_text):
+        position = match.start()
+        if sentence < last and starts[sentence + 1] <= position:
+            sentence = bisect.bisect_right(starts, position, sentence) - 1
+        if match.end() <= ends[sentence]:
+            matches.setdefault(sentence, []).append(match)
+
+    ranked = []
+    for sentence, found in matches.items():
+        distinct = len({term_of.get(m.group(0).lower(), m.group(0).lower()) for m in found})
+        ranked.append((-distinct, -len(found), sentence))
+    ranked.sort()
+    if limit is not None:
+        ranked = ranked[:limit]
+
+    results = []
+    for distinct, count, sentence in ranked:
+        pieces, position = [], starts[sentence]
+        for match in matches[sentence]:
+            pieces.append(document_text[position:match.start()])
+            pieces.append(f"**{match.group(0)}**")
+            position = match.end()
+        pieces.append(document_text[position:ends[sentence]])
+        results.append(("".join(pieces), (-distinct, -count)))
+    return results
+
+# Relevant sentences of a text as one block, best first
+def highlight_relevant_text(document_text, user_query, limit=None):
+    return " ".join(sentence for sentence, _ in rank_relevant_sentences(document_text, user_query, limit))
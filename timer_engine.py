@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+
+# Where running timers are saved so a reconnecting browser picks its timer back up
+TIMER_STORE_PATH = os.path.join("timer_state", "timers.sqlite")
+
+# Saved timers untouched for this long are deleted
+TIMER_TTL_SECONDS = 7 * 24 * 3600
+
+FOCUS, SHORT_BREAK, LONG_BREAK = "Focus", "Short Break", "Long Break"
+
+# A stopped timer at the start of the first focus period
+def new_timer(work_minutes, short_break_minutes, long_break_minutes, total_sessions):
+    return {
+        "durations": {FOCUS: work_minutes * 60, SHORT_BREAK: short_break_minutes * 60,
+                      LONG_BREAK: long_break_minutes * 60},
+        "total_sessions": int(total_sessions),
+        "running": False,
+        "started_at": None,      # Wall-clock time the current running stretch began
+        "elapsed_before": 0.0,   # Seconds run before the current stretch (earlier stretches, before pauses)
+    }
+
+# The periods of a timer in order: Focus, Short Break, Focus, ..., Focus, Long Break
+def schedule(timer):
+    periods = []
+    for session in range(1, timer["total_sessions"] + 1):
+        periods.append((FOCUS, session))
+        periods.append((SHORT_BREAK if session < timer["total_sessions"] else LONG_BREAK, session))
+    return periods
+
+def elapsed(timer, now=None):
+    running_for = 0.0
+    if timer["running"] and timer["started_at"] is not None:
+        running_for = max(0.0, (time.time() if now is None else now) - timer["started_at"])
+    return timer["elapsed_before"] + running_for
+
+# Where a timer is at a given time, derived from its timestamps alone
+def timer_status(timer, now=None):
+    """
+    Returns mode, current_session, remaining seconds, sessions_completed and
+    finished. Nothing is counted down, so the result does not drift however
+    rarely it is computed, and any number of periods may pass between calls.
+    """
+    spent = elapsed(timer, now)
+    for position, (mode, session) in enumerate(schedule(timer)):
+        duration = timer["durations"][mode]
+        if spent < duration:
+            completed = session - 1 if mode == FOCUS else session
+            return {"mode": mode, "current_session": session, "remaining": duration - spent,
+                    "sessions_completed": completed, "finished": False}
+        spent -= duration
+    return {"mode": LONG_BREAK, "current_session": timer["total_sessions"], "remaining": 0.0,
+            "sessions_completed": timer["total_sessions"], "finished": True}
+
+def start(timer, now=None):
+    if not timer["running"]:
+        timer["running"] = True
+        timer["started_at"] = time.time() if now is None else now
+    return timer
+
+def pause(timer, now=None):
+    if timer["running"]:
+        timer["elapsed_before"] = elapsed(timer, now)
+        timer["running"] = False
+        timer["started_at"] = None
+    return timer
+
+class TimerStore:
+    """
+    SQLite table of timers keyed by a client id kept in the page URL. Safe to
+    share between threads; each call opens its own short-lived connection.
+    """
+
+    def __init__(self, path=TIMER_STORE_PATH, ttl=TIMER_TTL_SECONDS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS timers (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS timers_updated ON timers (updated)")
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def load(self, timer_id):
+        with self.connect() as conn:
+            row = conn.execute("SELECT state FROM timers WHERE id = ?", (timer_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def save(self, timer_id, timer):
+        now = time.time()
+        with self.connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO timers (id, state, updated) VALUES (?, ?, ?)",
+                         (timer_id, json.dumps(timer), now))
+            conn.execute("DELETE FROM timers WHERE updated < ?", (now - self.ttl,))
+
+    def delete(self, timer_id):
+        with self.connect() as conn:
+            conn.execute("DELETE FROM timers WHERE id = ?", (timer_id,))
+
+def new_timer_id():
+    return uuid.uuid4().hex
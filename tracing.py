@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import bisect
+import random
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# Share of top-level operations that are traced; the others cost one random() call and record nothing
+SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+# Finished traces kept in memory for the diagnostics page
+MAX_TRACES = 200
+
+# Upper bounds in seconds of the stage duration histogram exported to Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# When set, every finished trace is appended to this file as a JSON line
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")
+
+# When set, this file is rewritten in Prometheus text format after every trace (for a textfile collector)
+TRACE_METRICS_PATH = os.getenv("TRACE_METRICS_PATH")
+
+_current = contextvars.ContextVar("current_span", default=None)
+_UNSAMPLED = object()
+_traces = deque(maxlen=MAX_TRACES)
+_metrics = {}   # Stage name -> {"buckets", "count", "sum", "errors"}, for sampled stages
+_lock = threading.Lock()
+_trace_ids = itertools.count(1)
+
+class Span:
+    """
+    A running stage of a trace. Attributes added with set() are kept with the
+    stage, for example whether a result came from a cache.
+    """
+
+    __slots__ = ("trace", "index")
+
+    def __init__(self, trace, index):
+        self.trace = trace
+        self.index = index
+
+    def set(self, **attributes):
+        self.trace["spans"][self.index]["attributes"].update(attributes)
+
+class _NoSpan:
+    def set(self, **attributes):
+        pass
+
+_NO_SPAN = _NoSpan()
+
+def _open(name, attributes, start):
+    parent = _current.get()
+    if parent is None:
+        trace = {"trace_id": next(_trace_ids), "name": name, "started_at": time.time(), "origin": start, "spans": []}
+    else:
+        trace = parent.trace
+    trace["spans"].append({"name": name, "parent": None if parent is None else parent.index,
+                           "start_ms": round((start - trace["origin"]) * 1000, 3), "duration_ms": None,
+                           "attributes": dict(attributes), "error": None})
+    return Span(trace, len(trace["spans"]) - 1), parent is None
+
+def _close(current, seconds, root, error=None):
+    record = current.trace["spans"][current.index]
+    record["duration_ms"] = round(seconds * 1000, 3)
+    record["error"] = error
+    with _lock:
+        metric = _metrics.setdefault(record["name"], {"buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0, "errors": 0})
+        position = bisect.bisect_left(BUCKETS, seconds)
+        if position < len(BUCKETS):
+            metric["buckets"][position] += 1
+        metric["count"] += 1
+        metric["sum"] += seconds
+        metric["errors"] += error is not None
+        if root:
+            trace = current.trace
+            del trace["origin"]
+            trace["duration_ms"] = record["duration_ms"]
+            _traces.append(trace)
+    if root:
+        export_trace(current.trace)
+
+# Time a stage; nested spans become its children, and the outermost one finishes the trace
+@contextmanager
+def span(name, **attributes):
+    """
+    Whether a trace is sampled is decided once, by its outermost span, so a
+    trace is always complete. Spans only follow the current thread (and
+    anything started with its context), so work handed to a thread pool is
+    timed by the span around the hand-off.
+    """
+    parent = _current.get()
+    if parent is _UNSAMPLED:
+        yield _NO_SPAN
+        return
+    if parent is None and SAMPLE_RATE < 1 and random.random() >= SAMPLE_RATE:
+        token = _current.set(_UNSAMPLED)
+        try:
+            yield _NO_SPAN
+        finally:
+            _current.reset(token)
+        return
+    start = time.perf_counter()
+    current, root = _open(name, attributes, start)
+    token = _current.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as raised:
+        error = type(raised).__name__
+        raise
+    finally:
+        _current.reset(token)
+        _close(current, time.perf_counter() - start, root, error)
+
+# Record a stage that already happened and took `seconds`, ending now, under the current span
+def record_span(name, seconds, **attributes):
+    parent = _current.get()
+    if parent is _UNSAMPLED or (parent is None and SAMPLE_RATE < 1 and random.random() >= SAMPLE_RATE):
+        return
+    current, root = _open(name, attributes, time.perf_counter() - seconds)
+    _close(current, seconds, root)
+
+# Decorator form of span(), named after the function unless a name is given
+def traced(name=None):
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name or function.__name__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# Finished traces, newest first
+def recent_traces(limit=None):
+    with _lock:
+        traces = list(_traces)
+    traces.reverse()
+    return traces[:limit] if limit else traces
+
+# Count, latency percentiles and errors per stage over the given (or all recent) traces
+def stage_summary(traces=None):
+    durations, errors = {}, {}
+    for trace in recent_traces() if traces is None else traces:
+        for record in trace["spans"]:
+            durations.setdefault(record["name"], []).append(record["duration_ms"])
+            errors[record["name"]] = errors.get(record["name"], 0) + (record["error"] is not None)
+    summary = []
+    for name, values in durations.items():
+        values.sort()
+        summary.append({"stage": name, "count": len(values),
+                        "p50_ms": values[(len(values) - 1) // 2],
+                        "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))],
+                        "max_ms": values[-1], "total_ms": round(sum(values), 3), "errors": errors[name]})
+    summary.sort(key=lambda row: row["total_ms"], reverse=True)
+    return summary
+
+def traces_jsonl(limit=None):
+    return "".join(json.dumps(trace) + "\n" for trace in recent_traces(limit))
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Stage durations and errors since the process started, in the Prometheus text exposition format
+def prometheus_text():
+    with _lock:
+        metrics = {name: {**metric, "buckets": list(metric["buckets"])} for name, metric in sorted(_metrics.items())}
+    lines = ["# HELP study_stage_duration_seconds Duration of traced stages (sampled operations only).",
+             "# TYPE study_stage_duration_seconds histogram"]
+    for name, metric in metrics.items():
+        stage = _label(name)
+        for bound, count in zip(BUCKETS, itertools.accumulate(metric["buckets"])):
+            lines.append(f'study_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+        lines.append(f'study_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {metric["count"]}')
+        lines.append(f'study_stage_duration_seconds_sum{{stage="{stage}"}} {metric["sum"]:.6f}')
+        lines.append(f'study_stage_duration_seconds_count{{stage="{stage}"}} {metric["count"]}')
+    lines += ["# HELP study_stage_errors_total Traced stages that raised an exception.",
+              "# TYPE study_stage_errors_total counter"]
+    lines += [f'study_stage_errors_total{{stage="{_label(name)}"}} {metric["errors"]}' for name, metric in metrics.items()]
+    return "\n".join(lines) + "\n"
+
+# Write a finished trace to the configured JSON lines and metrics files; tracing never breaks a request
+def export_trace(trace):
+    try:
+        if TRACE_LOG_PATH:
+            with _lock, open(TRACE_LOG_PATH, "a", encoding="utf-8") as file:
+                file.write(json.dumps(trace) + "\n")
+        if TRACE_METRICS_PATH:
+            temp_path = f"{TRACE_METRICS_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                file.write(prometheus_text())
+            os.replace(temp_path, TRACE_METRICS_PATH)
+    except OSError:
+        pass